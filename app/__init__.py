@@ -2,9 +2,11 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from config import config
+from app.local_store import local_store
+from app.replica import RoutingSession
 import os
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 
 def create_app(config_name='development'):
@@ -18,6 +20,13 @@ def create_app(config_name='development'):
     login_manager.login_message = 'Please log in to access this page.'
     login_manager.login_message_category = 'info'
     
+    # Shared per-host cache/counter store
+    local_store.init_app(app)
+    
+    # Every worker caches the logistics rates; commits that change them invalidate the caches
+    from app.rate_table import RateTable
+    RateTable.watch(RoutingSession)
+    
     # Create upload folder
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
@@ -38,6 +47,10 @@ def create_app(config_name='development'):
     app.register_blueprint(driver_bp, url_prefix='/driver')
     app.register_blueprint(driver_enhanced_bp, url_prefix='/driver')  # Enhanced logistics features
     
+    # CLI commands (scheduled jobs)
+    from app.commands import register_commands
+    register_commands(app)
+    
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
@@ -0,0 +1,258 @@
+"""
+Analytics Service - Admin reporting queries
+Aggregates are computed in as few queries as possible and cached in the
+shared local store so every worker serves the same snapshot
+"""
+
+from app import db
+from app.models import User, Product, Order, OrderItem
+from app.models_analytics import DailySales, DailyVendorSales, DailyCategorySales
+from app.local_store import local_store
+from flask import current_app
+from datetime import datetime, date, timedelta
+import time
+
+
+class AnalyticsService:
+    """Aggregated statistics for the admin console"""
+    
+    DASHBOARD_CACHE_KEY = 'admin:dashboard'
+    ROLLUP_MEASURES = ('revenue', 'orders', 'units')
+    
+    @staticmethod
+    def _count_where(condition):
+        """SUM(CASE WHEN condition THEN 1 ELSE 0 END)"""
+        return db.func.coalesce(db.func.sum(db.case((condition, 1), else_=0)), 0)
+    
+    @staticmethod
+    def compute_dashboard_snapshot():
+        """Run the dashboard aggregates and return a JSON-serializable snapshot"""
+        started = time.perf_counter()
+        count_where = AnalyticsService._count_where
+        
+        users = db.session.query(
+            db.func.count(User.id),
+            count_where(User.user_type == 'vendor'),
+            count_where(User.user_type == 'retailer'),
+            count_where(User.user_type == 'company')
+        ).one()
+        
+        products = db.session.query(
+            db.func.count(Product.id),
+            count_where(Product.is_active == True),
+            count_where(Product.is_emergency == True)
+        ).one()
+        
+        orders = db.session.query(
+            db.func.count(Order.id),
+            count_where(Order.status == 'pending'),
+            count_where(Order.status == 'delivered'),
+            db.func.coalesce(db.func.sum(
+                db.case((Order.payment_status == 'paid', Order.total_amount), else_=0)
+            ), 0)
+        ).one()
+        
+        categories = db.session.query(
+            Product.category,
+            db.func.count(Product.id)
+        ).group_by(Product.category).all()
+        
+        recent_orders = db.session.query(
+            Order.order_id, Order.total_amount, Order.status, Order.created_at, User.name
+        ).join(User, Order.retailer_id == User.id)\
+         .order_by(Order.created_at.desc()).limit(10).all()
+        
+        return {
+            'total_users': users[0],
+            'vendors': users[1],
+            'retailers': users[2],
+            'companies': users[3],
+            'total_products': products[0],
+            'active_products': products[1],
+            'emergency_products': products[2],
+            'total_orders': orders[0],
+            'pending_orders': orders[1],
+            'completed_orders': orders[2],
+            'total_revenue': float(orders[3]),
+            'categories': [[category, count] for category, count in categories],
+            'recent_orders': [
+                {
+                    'order_id': order_id,
+                    'total_amount': total_amount,
+                    'status': status,
+                    'created_at': created_at.isoformat() if created_at else None,
+                    'retailer_name': retailer_name
+                }
+                for order_id, total_amount, status, created_at, retailer_name in recent_orders
+            ],
+            'computed_at': datetime.utcnow().isoformat(),
+            'compute_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+    
+    @staticmethod
+    def get_dashboard_snapshot(refresh=False):
+        """Cached dashboard snapshot, shared across workers for ADMIN_DASHBOARD_CACHE_SECONDS"""
+        if refresh:
+            local_store.delete(AnalyticsService.DASHBOARD_CACHE_KEY)
+        
+        return local_store.cached(
+            AnalyticsService.DASHBOARD_CACHE_KEY,
+            current_app.config['ADMIN_DASHBOARD_CACHE_SECONDS'],
+            AnalyticsService.compute_dashboard_snapshot
+        )
+    
+    # ------------------------------------------------------------------
+    # Daily rollups
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def _dialect_insert(model):
+        """INSERT construct with ON CONFLICT support for the active database"""
+        if db.session.get_bind().dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        return insert(model)
+    
+    @staticmethod
+    def _increment_rollup(model, key_columns, rows):
+        """Add rows' measures onto existing rollup rows, creating missing ones"""
+        if not rows:
+            return
+        
+        now = datetime.utcnow()
+        stmt = AnalyticsService._dialect_insert(model).values(
+            [dict(row, updated_at=now) for row in rows]
+        )
+        increments = {
+            measure: getattr(model, measure) + stmt.excluded[measure]
+            for measure in AnalyticsService.ROLLUP_MEASURES
+        }
+        increments['updated_at'] = stmt.excluded.updated_at
+        db.session.execute(stmt.on_conflict_do_update(index_elements=key_columns, set_=increments))
+    
+    @staticmethod
+    def record_paid_order(order, items):
+        """
+        Fold a newly paid order into the daily rollups
+        
+        Runs inside the payment transaction; `items` are the order's
+        already-loaded OrderItems (with products), so no extra reads happen.
+        """
+        day = (order.created_at or datetime.utcnow()).date()
+        vendors = {}
+        categories = {}
+        
+        for item in items:
+            product = item.product
+            for totals, key in ((vendors, product.vendor_id), (categories, product.category)):
+                entry = totals.setdefault(key, {'revenue': 0.0, 'orders': 1, 'units': 0})
+                entry['revenue'] += item.subtotal
+                entry['units'] += item.quantity
+        
+        AnalyticsService._increment_rollup(DailySales, ['day'], [{
+            'day': day,
+            'revenue': order.total_amount,
+            'orders': 1,
+            'units': sum(item.quantity for item in items)
+        }])
+        AnalyticsService._increment_rollup(DailyVendorSales, ['day', 'vendor_id'], [
+            dict(totals, day=day, vendor_id=vendor_id) for vendor_id, totals in vendors.items()
+        ])
+        AnalyticsService._increment_rollup(DailyCategorySales, ['day', 'category'], [
+            dict(totals, day=day, category=category) for category, totals in categories.items()
+        ])
+    
+    @staticmethod
+    def rebuild_rollups(since=None):
+        """
+        Batch backfill: recompute rollups from orders for days >= since (all history if None)
+        
+        Returns the number of rollup rows written per table.
+        """
+        order_day = db.func.date(Order.created_at)
+        paid = [Order.payment_status == 'paid']
+        if since:
+            paid.append(Order.created_at >= datetime.combine(since, datetime.min.time()))
+        
+        def as_date(value):
+            return value if isinstance(value, date) else datetime.strptime(value, '%Y-%m-%d').date()
+        
+        # Marketplace totals: revenue/orders from orders, units from their items
+        daily = {
+            as_date(day): {'day': as_date(day), 'revenue': revenue or 0, 'orders': orders, 'units': 0}
+            for day, revenue, orders in db.session.query(
+                order_day, db.func.sum(Order.total_amount), db.func.count(Order.id)
+            ).filter(*paid).group_by(order_day)
+        }
+        for day, units in db.session.query(order_day, db.func.sum(OrderItem.quantity))\
+                .join(Order, OrderItem.order_id == Order.id).filter(*paid).group_by(order_day):
+            daily[as_date(day)]['units'] = units or 0
+        
+        def item_rollup(dimension, name):
+            query = db.session.query(
+                order_day, dimension,
+                db.func.sum(OrderItem.subtotal),
+                db.func.count(db.distinct(OrderItem.order_id)),
+                db.func.sum(OrderItem.quantity)
+            ).select_from(OrderItem).join(Order, OrderItem.order_id == Order.id)\
+             .join(Product, OrderItem.product_id == Product.id)\
+             .filter(*paid).group_by(order_day, dimension)
+            return [
+                {'day': as_date(day), name: key, 'revenue': revenue or 0, 'orders': orders, 'units': units or 0}
+                for day, key, revenue, orders, units in query
+            ]
+        
+        vendor_rows = item_rollup(Product.vendor_id, 'vendor_id')
+        category_rows = item_rollup(Product.category, 'category')
+        
+        now = datetime.utcnow()
+        written = {}
+        try:
+            for model, rows in ((DailySales, list(daily.values())),
+                                (DailyVendorSales, vendor_rows),
+                                (DailyCategorySales, category_rows)):
+                stale = db.session.query(model)
+                if since:
+                    stale = stale.filter(model.day >= since)
+                stale.delete(synchronize_session=False)
+                
+                if rows:
+                    db.session.execute(db.insert(model), [dict(row, updated_at=now) for row in rows])
+                written[model.__tablename__] = len(rows)
+            
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        return written
+    
+    @staticmethod
+    def get_daily_revenue(days=30):
+        """(day, revenue) pairs for the last `days` days"""
+        start = datetime.utcnow().date() - timedelta(days=days)
+        return db.session.query(DailySales.day, DailySales.revenue)\
+            .filter(DailySales.day >= start).order_by(DailySales.day).all()
+    
+    @staticmethod
+    def get_top_vendors(limit=10):
+        """(vendor name, revenue) for the highest-grossing vendors"""
+        revenue = db.func.sum(DailyVendorSales.revenue).label('revenue')
+        return db.session.query(User.name, revenue)\
+            .join(User, User.id == DailyVendorSales.vendor_id)\
+            .group_by(User.id, User.name)\
+            .order_by(db.desc('revenue'))\
+            .limit(limit).all()
+    
+    @staticmethod
+    def get_category_sales(days=30):
+        """(category, revenue, orders, units) over the last `days` days"""
+        start = datetime.utcnow().date() - timedelta(days=days)
+        revenue = db.func.sum(DailyCategorySales.revenue).label('revenue')
+        return db.session.query(
+            DailyCategorySales.category, revenue,
+            db.func.sum(DailyCategorySales.orders), db.func.sum(DailyCategorySales.units)
+        ).filter(DailyCategorySales.day >= start)\
+         .group_by(DailyCategorySales.category)\
+         .order_by(db.desc('revenue')).all()
@@ -0,0 +1,160 @@
+"""
+Archive Service - Hot/cold archival of closed orders
+Moves old delivered/cancelled orders and their items, payments, tracking
+events and notifications to the archive database in batches
+"""
+
+from app import db
+from app.models import Order, OrderItem, Payment, DriverAssignment
+from app.models_logistics import (
+    DriverAssignmentEnhanced, DriverEarning, DeliveryTrackingEvent, DeliveryNotification
+)
+from app.models_archive import (
+    ArchivedOrder, ArchivedOrderItem, ArchivedPayment, ArchivedTrackingEvent, ArchivedNotification
+)
+from flask import current_app
+from datetime import datetime, timedelta
+
+
+class ArchiveService:
+    """Batch mover between the hot tables and the archive bind"""
+
+    # Rows hanging off an order, in the order they are deleted
+    ORDER_CHILDREN = (
+        (DeliveryTrackingEvent, ArchivedTrackingEvent),
+        (DeliveryNotification, ArchivedNotification),
+        (OrderItem, ArchivedOrderItem),
+        (Payment, ArchivedPayment),
+    )
+    # Logistics history archived on its own age, even while the order stays hot
+    LOGISTICS_TABLES = (
+        (DeliveryTrackingEvent, ArchivedTrackingEvent, DeliveryTrackingEvent.timestamp),
+        (DeliveryNotification, ArchivedNotification, DeliveryNotification.created_at),
+    )
+    # Driver-side rows that keep pointing at their order; such orders stay hot
+    ORDER_REFERENCES = (DriverAssignment, DriverAssignmentEnhanced, DriverEarning)
+
+    @staticmethod
+    def _below_max_id(model, max_ids):
+        """
+        Never archive a table's highest id
+
+        SQLite hands out max(id) + 1 for new rows, so deleting the top row
+        would let a new hot row reuse an id that already exists in the archive.
+        """
+        top = max_ids.get(model)
+        return model.id < top if top is not None else db.true()
+
+    @staticmethod
+    def _move(batches):
+        """
+        Copy [(hot model, archive model, ids)] to the archive, then delete the hot rows
+
+        The archive write is committed first and replaces any rows with the
+        same ids, so a batch interrupted between the two commits is simply
+        copied again on the next run. Batches are deleted in the given order.
+        """
+        batches = [(model, archive_model, ids) for model, archive_model, ids in batches if ids]
+        copies = [
+            (archive_model, ids, db.session.execute(
+                db.select(model.__table__).where(model.id.in_(ids))
+            ).mappings().all())
+            for model, archive_model, ids in batches
+        ]
+
+        archived_at = datetime.utcnow()
+        with db.engines['archive'].begin() as conn:
+            for archive_model, ids, rows in copies:
+                table = archive_model.__table__
+                conn.execute(db.delete(table).where(table.c.id.in_(ids)))
+                conn.execute(db.insert(table), [dict(row, archived_at=archived_at) for row in rows])
+
+        try:
+            for model, _archive_model, ids in batches:
+                db.session.execute(db.delete(model.__table__).where(model.id.in_(ids)))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        return {archive_model.__table__.name: len(rows) for archive_model, ids, rows in copies}
+
+    @staticmethod
+    def archive(older_than_days=None, batch_size=None):
+        """
+        Move closed orders and logistics rows older than the cutoff to the archive
+
+        Orders still referenced by driver assignments or earnings are left in
+        place (their tracking events and notifications are still archived).
+        Returns the number of rows archived per archive table.
+        """
+        config = current_app.config
+        older_than_days = older_than_days or config['ARCHIVE_AFTER_DAYS']
+        batch_size = batch_size or config['ARCHIVE_BATCH_SIZE']
+        cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+
+        hot_models = [Order] + [model for model, _archive_model in ArchiveService.ORDER_CHILDREN]
+        max_ids = {model: db.session.query(db.func.max(model.id)).scalar() for model in hot_models}
+
+        def below_max_id(model):
+            return ArchiveService._below_max_id(model, max_ids)
+
+        closed = [
+            Order.status.in_(config['ARCHIVE_ORDER_STATUSES']),
+            Order.created_at < cutoff
+        ]
+        totals = {}
+
+        def add(counts):
+            for table, count in counts.items():
+                totals[table] = totals.get(table, 0) + count
+
+        # Old tracking events/notifications of closed orders
+        closed_order_ids = db.select(Order.id).where(*closed)
+        for model, archive_model, timestamp in ArchiveService.LOGISTICS_TABLES:
+            while True:
+                ids = db.session.scalars(
+                    db.select(model.id).where(
+                        timestamp < cutoff, model.order_id.in_(closed_order_ids), below_max_id(model)
+                    ).order_by(model.id).limit(batch_size)
+                ).all()
+                if not ids:
+                    break
+                add(ArchiveService._move([(model, archive_model, ids)]))
+
+        # Closed orders with everything hanging off them
+        candidates = db.select(Order.id).where(*closed, below_max_id(Order))
+        for reference in ArchiveService.ORDER_REFERENCES:
+            candidates = candidates.where(~db.exists().where(reference.order_id == Order.id))
+        for model, _archive_model in ArchiveService.ORDER_CHILDREN:
+            if max_ids[model] is not None:
+                candidates = candidates.where(~db.exists().where(
+                    model.order_id == Order.id, model.id >= max_ids[model]
+                ))
+
+        while True:
+            order_ids = db.session.scalars(candidates.order_by(Order.id).limit(batch_size)).all()
+            if not order_ids:
+                break
+
+            batches = [
+                (model, archive_model, db.session.scalars(
+                    db.select(model.id).where(model.order_id.in_(order_ids))
+                ).all())
+                for model, archive_model in ArchiveService.ORDER_CHILDREN
+            ]
+            batches.append((Order, ArchivedOrder, order_ids))
+            add(ArchiveService._move(batches))
+
+        return totals
+
+    @staticmethod
+    def get_order(order_id):
+        """Order by primary key from the hot table, falling back to the archive"""
+        return db.session.get(Order, order_id) or db.session.get(ArchivedOrder, order_id)
+
+    @staticmethod
+    def archived_through():
+        """Creation date of the newest archived order, or None"""
+        newest = db.session.query(db.func.max(ArchivedOrder.created_at)).scalar()
+        return newest.date() if newest else None
@@ -0,0 +1,171 @@
+"""
+Cohort Service - Vectorized retailer cohort and retention analytics
+Groups retailers by the month of their first paid order and tracks how many
+come back in each following month, split by credit tier
+"""
+
+from app import db
+from app.models import Order, RetailerCredit
+from app.local_store import local_store
+from flask import current_app
+from datetime import datetime
+import numpy as np
+import time
+
+
+class CohortAnalysisService:
+    """Monthly cohort retention and repeat-purchase rates in one NumPy pass"""
+
+    CACHE_KEY = 'admin:cohorts'
+    TIER_ORDER = ('platinum', 'gold', 'silver', 'bronze')
+
+    @staticmethod
+    def _month_index(values):
+        """Datetimes -> months since 1970-01 as an int64 array"""
+        return np.array(values, dtype='datetime64[M]').astype(np.int64)
+
+    @staticmethod
+    def load_retailer_arrays(window_start):
+        """
+        First paid-order month and credit tier for retailers whose first
+        paid order falls on or after window_start, sorted by retailer id
+
+        Tier is the retailer's current tier; RetailerCredit keeps no history.
+        """
+        first_paid = db.func.min(Order.created_at)
+        tier = db.func.coalesce(RetailerCredit.credit_tier, 'bronze')
+        rows = db.session.query(Order.retailer_id, first_paid, tier)\
+            .outerjoin(RetailerCredit, RetailerCredit.retailer_id == Order.retailer_id)\
+            .filter(Order.payment_status == 'paid')\
+            .group_by(Order.retailer_id, tier)\
+            .having(first_paid >= window_start)\
+            .order_by(Order.retailer_id).all()
+
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), []
+
+        retailer_ids, first_orders, tiers = zip(*rows)
+        return (np.array(retailer_ids, dtype=np.int64),
+                CohortAnalysisService._month_index(first_orders),
+                list(tiers))
+
+    @staticmethod
+    def load_order_arrays(window_start):
+        """Retailer id and month of every paid order since window_start"""
+        rows = db.session.query(Order.retailer_id, Order.created_at)\
+            .filter(Order.payment_status == 'paid', Order.created_at >= window_start).all()
+
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        retailer_ids, created = zip(*rows)
+        return np.array(retailer_ids, dtype=np.int64), CohortAnalysisService._month_index(created)
+
+    @staticmethod
+    def cohort_matrices(first_month, tier_codes, order_retailer, order_month, start_month, months, n_tiers):
+        """
+        Active-retailer counts as a (tiers x cohorts x months-since-first-order) array
+
+        order_retailer indexes into the retailer arrays. A retailer counts
+        once per month however many orders it placed, so (retailer, age)
+        pairs are de-duplicated with np.unique before scattering.
+        """
+        age = order_month - first_month[order_retailer]
+        keep = (age >= 0) & (age < months)
+        pair = np.unique(order_retailer[keep] * months + age[keep])
+        retailer, age = pair // months, pair % months
+
+        active = np.zeros((n_tiers, months, months), dtype=np.int64)
+        np.add.at(active, (tier_codes[retailer], first_month[retailer] - start_month, age), 1)
+        return active
+
+    @staticmethod
+    def compute_cohorts(months=None):
+        """Build the cohort report for the last `months` calendar months"""
+        started = time.perf_counter()
+        months = months or current_app.config['COHORT_MONTHS']
+
+        current_month = CohortAnalysisService._month_index([datetime.utcnow()])[0]
+        start_month = current_month - months + 1
+        first_day = np.datetime64(int(start_month), 'M').astype(object)  # datetime.date, day 1
+        window_start = datetime.combine(first_day, datetime.min.time())
+
+        retailer_ids, first_month, tiers = CohortAnalysisService.load_retailer_arrays(window_start)
+        order_retailer_ids, order_month = CohortAnalysisService.load_order_arrays(window_start)
+
+        rank = {name: i for i, name in enumerate(CohortAnalysisService.TIER_ORDER)}
+        tier_names = sorted(set(tiers), key=lambda name: (rank.get(name, len(rank)), name))
+        tier_codes = np.array([tier_names.index(t) for t in tiers], dtype=np.int64)
+
+        # retailer_ids is sorted; orders of retailers from older cohorts drop out here
+        order_retailer = np.searchsorted(retailer_ids, order_retailer_ids)
+        known = np.zeros(len(order_retailer_ids), dtype=bool)
+        if len(retailer_ids):
+            found = np.minimum(order_retailer, len(retailer_ids) - 1)
+            known = (order_retailer < len(retailer_ids)) & (retailer_ids[found] == order_retailer_ids)
+        order_retailer, order_month = order_retailer[known], order_month[known]
+
+        active = CohortAnalysisService.cohort_matrices(
+            first_month, tier_codes, order_retailer, order_month, start_month, months, len(tier_names)
+        )
+
+        orders_per_retailer = np.bincount(order_retailer, minlength=len(retailer_ids))
+        retailers_per_tier = np.bincount(tier_codes, minlength=len(tier_names))
+        repeaters_per_tier = np.bincount(tier_codes, weights=orders_per_retailer >= 2, minlength=len(tier_names))
+        orders_per_tier = np.bincount(tier_codes, weights=orders_per_retailer, minlength=len(tier_names))
+
+        # Cohort c (0 = oldest) can only have been observed for months - c months
+        observed = np.arange(months)[None, :] < (months - np.arange(months))[:, None]
+        labels = [str(np.datetime64(int(start_month + c), 'M')) for c in range(months)]
+
+        def report(counts, retailers, repeaters, orders):
+            sizes = counts[:, 0]
+            retailers, repeaters, orders = int(retailers), float(repeaters), float(orders)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                retention = np.where(sizes[:, None] > 0, counts / sizes[:, None] * 100, 0.0)
+            return {
+                'retailers': retailers,
+                'repeat_rate': round(repeaters / retailers * 100, 1) if retailers else 0.0,
+                'orders_per_retailer': round(orders / retailers, 2) if retailers else 0.0,
+                'cohorts': [
+                    {
+                        'month': labels[c],
+                        'size': int(sizes[c]),
+                        'retention': [round(float(retention[c, a]), 1) for a in range(months) if observed[c, a]]
+                    }
+                    for c in range(months) if sizes[c]
+                ]
+            }
+
+        tiers_report = {
+            name: report(active[t], retailers_per_tier[t], repeaters_per_tier[t], orders_per_tier[t])
+            for t, name in enumerate(tier_names)
+        }
+
+        return {
+            'months': months,
+            'all': report(active.sum(axis=0), len(retailer_ids), repeaters_per_tier.sum(), orders_per_tier.sum()),
+            'tiers': tiers_report,
+            'tier_names': tier_names,
+            'computed_at': datetime.utcnow().isoformat(),
+            'compute_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+
+    @staticmethod
+    def refresh_cohorts(months=None):
+        """Recompute the report and store it for the admin cohort page"""
+        report = CohortAnalysisService.compute_cohorts(months)
+        local_store.set(CohortAnalysisService.CACHE_KEY, report, current_app.config['COHORT_CACHE_SECONDS'])
+        return report
+
+    @staticmethod
+    def get_cohorts(refresh=False):
+        """Cached cohort report; computed on demand if the nightly job hasn't run"""
+        if refresh:
+            return CohortAnalysisService.refresh_cohorts()
+
+        return local_store.cached(
+            CohortAnalysisService.CACHE_KEY,
+            current_app.config['COHORT_CACHE_SECONDS'],
+            CohortAnalysisService.compute_cohorts
+        )
@@ -0,0 +1,279 @@
+"""
+CLI Commands - Scheduled jobs and maintenance tasks
+Run with: flask --app run <command>
+"""
+
+from datetime import timedelta
+import click
+import time
+
+
+def register_commands(app):
+    """Attach all maintenance commands to the Flask CLI"""
+
+    @app.cli.command('upgrade-db')
+    def upgrade_db():
+        """Create missing tables, columns and indexes declared on the models"""
+        from app.schema import upgrade_schema
+
+        changes, skipped = upgrade_schema()
+        for change in changes:
+            click.echo(f"+ Added {change}")
+        for column in skipped:
+            click.echo(f"! Skipped column {column}: NOT NULL without a default, needs a manual migration")
+        click.echo(f"+ Schema up to date ({len(changes)} change(s))")
+
+    @app.cli.command('refresh-replica')
+    def refresh_replica():
+        """Copy the SQLite primary onto a SQLite READ_REPLICA_URL (local replica testing)"""
+        from app import db
+        from app.replica import REPLICA_BIND, LAG_CACHE_KEY
+        from app.local_store import local_store
+        import sqlite3
+
+        if REPLICA_BIND not in db.engines:
+            raise click.ClickException("READ_REPLICA_URL is not set")
+        primary, replica = db.engines[None], db.engines[REPLICA_BIND]
+        if primary.dialect.name != 'sqlite' or replica.dialect.name != 'sqlite':
+            raise click.ClickException("refresh-replica only copies SQLite files; use real replication for Postgres")
+
+        source = sqlite3.connect(primary.url.database)
+        target = sqlite3.connect(replica.url.database)
+        with target:
+            source.backup(target)
+        source.close()
+        target.close()
+        replica.dispose()
+        local_store.delete(LAG_CACHE_KEY)
+        click.echo(f"+ Copied {primary.url.database} -> {replica.url.database}")
+
+    @app.cli.command('audit-indexes')
+    @click.option('--verbose', is_flag=True, help='Print the full plan for every query')
+    def audit_indexes(verbose):
+        """EXPLAIN the registered hot queries and fail on full table scans"""
+        from app.schema import audit_hot_queries
+
+        flagged = 0
+        for name, plan, full_scans in audit_hot_queries():
+            if full_scans:
+                flagged += 1
+                problem = 'ERROR' if full_scans[0].startswith('ERROR') else 'FULL SCAN'
+                click.echo(f"x {name}: {problem}")
+                for line in full_scans:
+                    click.echo(f"      {line}")
+            else:
+                click.echo(f"+ {name}: ok")
+            if verbose:
+                for line in plan:
+                    click.echo(f"      | {line}")
+
+        if flagged:
+            raise click.ClickException(f"{flagged} hot query(s) failed or fall back to full table scans")
+
+    @app.cli.command('forecast-demand')
+    @click.option('--history-days', type=int, default=None, help='Days of order history to use')
+    @click.option('--alpha', type=click.FloatRange(0, 1, min_open=True), default=None,
+                  help='Exponential smoothing factor (0-1]')
+    def forecast_demand(history_days, alpha):
+        """Nightly job: recompute per-product demand forecasts"""
+        from app.forecast_service import DemandForecastService
+
+        started = time.perf_counter()
+        count = DemandForecastService.run_forecast(history_days=history_days, alpha=alpha)
+        click.echo(f"+ Forecasted {count} products in {time.perf_counter() - started:.2f}s")
+
+    @app.cli.command('learn-etas')
+    @click.option('--history-days', type=int, default=None, help='Days of deliveries to learn from (default: ETA_HISTORY_DAYS)')
+    def learn_etas(history_days):
+        """Nightly job: rebuild delivery travel-time tables from tracking events"""
+        from app.eta_service import EtaService
+
+        started = time.perf_counter()
+        summary = EtaService.build_tables(history_days=history_days)
+        click.echo(f"+ Learned {summary['cells']} hour-of-week ETA(s) and {summary['pairs']} area pair(s) "
+                   f"from {summary['used']}/{summary['trips']} trip(s) in {time.perf_counter() - started:.2f}s")
+
+    @app.cli.command('backfill-distances')
+    @click.option('--all', 'recompute', is_flag=True, help='Re-measure every delivered trip, not just those missing a distance')
+    @click.option('--batch-size', type=int, default=None, help='Trips per transaction (default: DISTANCE_BACKFILL_BATCH_SIZE)')
+    def backfill_distances(recompute, batch_size):
+        """Measure delivered trips' driven distance from their GPS traces"""
+        from app.distance_service import TripDistanceService
+
+        started = time.perf_counter()
+        summary = TripDistanceService.backfill(recompute=recompute, batch_size=batch_size)
+        click.echo(f"+ Measured {summary['measured']}/{summary['trips']} trip(s), {summary['km']} km "
+                   f"from {summary['points']} point(s) in {time.perf_counter() - started:.2f}s")
+
+    @app.cli.command('analyze-cohorts')
+    @click.option('--months', type=int, default=None, help='Number of monthly cohorts (default: COHORT_MONTHS)')
+    def analyze_cohorts(months):
+        """Nightly job: recompute retailer cohort retention for the admin page"""
+        from app.cohort_service import CohortAnalysisService
+
+        report = CohortAnalysisService.refresh_cohorts(months=months)
+        click.echo(f"+ {report['all']['retailers']} retailers in {len(report['all']['cohorts'])} cohort(s), "
+                   f"{len(report['tier_names'])} tier(s) in {report['compute_ms'] / 1000:.2f}s")
+
+    @app.cli.command('archive-orders')
+    @click.option('--older-than-days', type=int, default=None, help='Age cutoff (default: ARCHIVE_AFTER_DAYS)')
+    @click.option('--batch-size', type=int, default=None, help='Orders moved per transaction')
+    def archive_orders(older_than_days, batch_size):
+        """Move closed orders and old logistics rows to the archive database"""
+        from app.archive_service import ArchiveService
+
+        started = time.perf_counter()
+        moved = ArchiveService.archive(older_than_days=older_than_days, batch_size=batch_size)
+        for table, count in moved.items():
+            click.echo(f"+ {table}: {count} rows")
+        click.echo(f"+ Archived {sum(moved.values())} rows in {time.perf_counter() - started:.2f}s")
+
+    @app.cli.command('index-drivers')
+    def index_drivers():
+        """Rebuild the dispatch grid index (after changing DISPATCH_GRID_CELL_DEG or area centres)"""
+        from app.driver_service import DriverAssignmentService
+
+        located, unlocated = DriverAssignmentService.index_driver_positions()
+        click.echo(f"+ Indexed {located} driver(s)")
+        if unlocated:
+            click.echo(f"! {unlocated} driver(s) have no GPS fix and no known parking area centre")
+
+    @app.cli.command('reconcile-drivers')
+    @click.option('--watch', is_flag=True, help='Keep running, once every DRIVER_REGISTRY_RECONCILE_SECONDS')
+    def reconcile_drivers(watch):
+        """Rebuild the driver availability registry from the database"""
+        from app.driver_registry import DriverRegistry
+        from app import db
+
+        while True:
+            published, removed = DriverRegistry.reconcile()
+            click.echo(f"+ {published} available driver(s) registered, {removed} stale entry(s) removed")
+            if not watch:
+                break
+            db.session.remove()
+            time.sleep(app.config['DRIVER_REGISTRY_RECONCILE_SECONDS'])
+
+    @app.cli.command('sweep-offers')
+    @click.option('--watch', is_flag=True, help='Keep running, once every DISPATCH_SWEEP_SECONDS')
+    def sweep_offers(watch):
+        """Expire unaccepted offers and re-offer rejected/expired orders to the next best drivers"""
+        from app.reassignment_service import ReassignmentService
+        from app import db
+
+        while True:
+            result = ReassignmentService.sweep()
+            click.echo(f"+ {result['expired']} offer(s) expired, {result['reoffered']} re-offered, "
+                       f"{result['escalated']} escalated, {result['waiting']} still waiting for a driver")
+            if not watch:
+                break
+            db.session.remove()
+            time.sleep(app.config['DISPATCH_SWEEP_SECONDS'])
+
+    @app.cli.command('dispatch-orders')
+    @click.option('--max-orders', type=int, default=None, help='Orders per batch (default: DISPATCH_BATCH_MAX_ORDERS)')
+    @click.option('--watch', is_flag=True, help='Keep running, one batch every DISPATCH_BATCH_WINDOW_SECONDS')
+    @click.option('--trips', is_flag=True, help='Group orders into multi-drop trips instead of one order per driver')
+    def dispatch_orders(max_orders, watch, trips):
+        """Batch dispatch: match waiting paid orders to drivers in one optimal assignment"""
+        from app.dispatch_service import DispatchService
+        from app import db
+
+        while True:
+            started = time.perf_counter()
+            if trips:
+                result = DispatchService.dispatch_trips(max_orders=max_orders)
+                click.echo(f"+ Assigned {result['assigned']}/{result['pending']} waiting order(s) in "
+                           f"{result['trips']} trip(s), {result['km']} km planned "
+                           f"({result['solo_km']} km as single drops) in {time.perf_counter() - started:.2f}s")
+            else:
+                result = DispatchService.dispatch_batch(max_orders=max_orders)
+                click.echo(f"+ Assigned {result['assigned']}/{result['pending']} waiting order(s), "
+                           f"total score {result['total_score']} in {time.perf_counter() - started:.2f}s")
+            if not watch:
+                break
+            db.session.remove()
+            time.sleep(app.config['DISPATCH_BATCH_WINDOW_SECONDS'])
+
+    @app.cli.command('bench-scoring')
+    @click.option('--drivers', type=int, default=10000, help='Synthetic fleet size')
+    @click.option('--orders', type=int, default=50, help='Orders scored against the whole fleet')
+    @click.option('--seed', type=int, default=42)
+    def bench_scoring(drivers, orders, seed):
+        """Benchmark vectorized vs per-driver fitness scoring and check they agree"""
+        from app.driver_service import DriverAssignmentService
+        from app.dispatch_service import DispatchService
+        from app.models_logistics import DriverEnhanced
+        import numpy as np
+        import random
+
+        rng = random.Random(seed)
+        areas = ['Central Koyambedu', 'North Koyambedu', 'Anna Nagar', 'T Nagar', 'Porur', None]
+        fleet = []
+        for _ in range(drivers):
+            vehicle = rng.choice(list(DriverAssignmentService.VEHICLE_CAPACITY))
+            capacity = DriverAssignmentService.VEHICLE_CAPACITY[vehicle]
+            located = rng.random() < 0.8
+            fleet.append(DriverEnhanced(
+                vehicle_type=vehicle, vehicle_capacity_kg=capacity,
+                current_load_kg=rng.choice([0, rng.uniform(0, capacity)]),
+                rating=rng.choice([0, rng.uniform(1, 5)]),
+                parking_location=rng.choice(areas),
+                current_lat=13.0 + rng.random() * 0.15 if located else None,
+                current_lng=80.15 + rng.random() * 0.1 if located else None
+            ))
+        jobs = [(rng.uniform(1, 120), rng.choice(areas[:-1]), (13.0 + rng.random() * 0.15, 80.15 + rng.random() * 0.1))
+                for _ in range(orders)]
+
+        started = time.perf_counter()
+        arrays = DispatchService.driver_arrays(fleet)
+        load_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        vectorized = []
+        for weight, area, pickup in jobs:
+            distance = DispatchService.distances_to(arrays, pickup)
+            vectorized.append((distance, DispatchService.score_drivers(arrays, weight, area, distance)))
+        vector_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        mismatches = 0
+        for (weight, area, _pickup), (distance, scores) in zip(jobs, vectorized):
+            scalar = np.array([
+                DriverAssignmentService.calculate_fitness_score(
+                    driver, weight, area, None if np.isnan(distance[i]) else float(distance[i])
+                )
+                for i, driver in enumerate(fleet)
+            ], dtype=np.float64)
+            mismatches += int((scalar != scores).sum())
+        scalar_s = time.perf_counter() - started
+
+        scored = drivers * orders
+        click.echo(f"+ {drivers} drivers x {orders} orders")
+        click.echo(f"  array load:  {load_s * 1000:8.1f} ms (once per dispatch)")
+        click.echo(f"  vectorized:  {vector_s / orders * 1000:8.2f} ms/order  {scored / vector_s:12,.0f} drivers/s")
+        click.echo(f"  per-driver:  {scalar_s / orders * 1000:8.2f} ms/order  {scored / scalar_s:12,.0f} drivers/s")
+        click.echo(f"  speed-up:    {scalar_s / vector_s:8.1f}x")
+        if mismatches:
+            raise click.ClickException(f"{mismatches} score(s) differ between the two implementations")
+        click.echo("+ Scores identical")
+
+    @app.cli.command('rollup-sales')
+    @click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Only rebuild days on or after this date (default: all history)')
+    def rollup_sales(since):
+        """Backfill/rebuild the daily sales rollup tables from orders"""
+        from app.analytics_service import AnalyticsService
+        from app.archive_service import ArchiveService
+
+        since = since.date() if since else None
+        archived_through = ArchiveService.archived_through()
+        if archived_through and (since is None or since <= archived_through):
+            # Archived orders are gone from the orders table; keep their rollups as they are
+            since = archived_through + timedelta(days=1)
+            click.echo(f"+ Orders up to {archived_through} are archived, rebuilding from {since}")
+
+        started = time.perf_counter()
+        written = AnalyticsService.rebuild_rollups(since=since)
+        for table, count in written.items():
+            click.echo(f"+ {table}: {count} rows")
+        click.echo(f"+ Rollups rebuilt in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,422 @@
+"""
+Dispatch Service - Vectorized driver scoring and batch matching
+Scores every candidate driver for an order in one NumPy pass (exactly the
+same numbers as DriverAssignmentService.calculate_fitness_score) and
+assigns a whole batch of waiting orders with one min-cost matching
+"""
+
+from app import db
+from app.models import Order, OrderItem, DriverAssignment
+from app.models_logistics import (
+    DriverEnhanced, DriverAssignmentEnhanced, DeliveryTrackingEvent, DeliveryNotification
+)
+from app.driver_service import DriverAssignmentService
+from app.rate_table import RateTable
+from app.eta_service import EtaService
+from app.ops_metrics import OpsMetrics
+from app.driver_registry import DriverRegistry
+from app.geo import haversine_km_array
+from flask import current_app
+from datetime import datetime, timedelta
+import numpy as np
+
+
+class DispatchService:
+    """Bulk fitness scoring and batch order-to-driver matching"""
+
+    # Cost of an order/driver pair that can't work; larger than any sum of real costs
+    INFEASIBLE_COST = 1e6
+
+    @staticmethod
+    def driver_arrays(drivers):
+        """
+        Columnar view of the drivers' scoring inputs
+
+        Parking locations are interned to integer codes so the area-name
+        proximity rule only has to be evaluated once per distinct location.
+        """
+        codes = {}
+        parking_codes = [codes.setdefault(driver.parking_location, len(codes)) for driver in drivers]
+
+        return {
+            'capacity': np.array([driver.vehicle_capacity_kg for driver in drivers], dtype=np.float64),
+            'load': np.array([driver.current_load_kg or 0 for driver in drivers], dtype=np.float64),
+            'rating': np.array([driver.rating for driver in drivers], dtype=np.float64),
+            'lat': np.array([np.nan if driver.current_lat is None else driver.current_lat for driver in drivers],
+                            dtype=np.float64),
+            'lng': np.array([np.nan if driver.current_lng is None else driver.current_lng for driver in drivers],
+                            dtype=np.float64),
+            'parking_code': np.array(parking_codes, dtype=np.int64),
+            'parking_values': list(codes)
+        }
+
+    @staticmethod
+    def subset(arrays, index):
+        """driver_arrays restricted to the drivers at index"""
+        return {name: values[index] if isinstance(values, np.ndarray) else values for name, values in arrays.items()}
+
+    @staticmethod
+    def distances_to(arrays, point):
+        """Distance (km) from each driver to point; nan where the driver has no position"""
+        if point is None:
+            return np.full(len(arrays['capacity']), np.nan)
+        return haversine_km_array(arrays['lat'], arrays['lng'], point[0], point[1])
+
+    @staticmethod
+    def location_points(arrays, delivery_area, distance_km):
+        """Proximity component (25 max): distance bands where known, else the area-name rule"""
+        by_name = np.array([
+            25 if parking == delivery_area
+            else 20 if parking and delivery_area and parking[:5] == delivery_area[:5]
+            else 10
+            for parking in arrays['parking_values']
+        ], dtype=np.float64)
+        points = by_name[arrays['parking_code']] if len(by_name) else np.zeros(0)
+
+        known = ~np.isnan(distance_km)
+        by_distance = np.full(distance_km.shape, 10.0)
+        for max_km, band_points in reversed(DriverAssignmentService.PROXIMITY_BANDS):
+            by_distance[distance_km <= max_km] = band_points
+        return np.where(known, by_distance, points)
+
+    @staticmethod
+    def score_drivers(arrays, order_weight, delivery_area, distance_km=None):
+        """
+        Fitness scores (0-100, or -1 when the order doesn't fit) for every driver
+
+        Mirrors calculate_fitness_score operation for operation so the
+        floating-point results are identical.
+        """
+        capacity, load, rating = arrays['capacity'], arrays['load'], arrays['rating']
+        if distance_km is None:
+            distance_km = np.full(capacity.shape, np.nan)
+
+        available = capacity - load
+        feasible = available >= order_weight
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            utilization = (capacity - available + order_weight) / capacity
+        capacity_score = utilization * 30
+
+        location_score = DispatchService.location_points(arrays, delivery_area, distance_km)
+        rating_score = np.where(rating > 0, (rating / 5.0) * 25, 15)
+        load_score = np.select(
+            [(utilization >= 0.7) & (utilization <= 0.9),
+             ((utilization >= 0.5) & (utilization < 0.7)) | ((utilization > 0.9) & (utilization <= 1.0))],
+            [20, 15], default=10
+        )
+
+        total = capacity_score + location_score + rating_score + load_score
+        return np.where(feasible, np.minimum(100, total), -1)
+
+    @staticmethod
+    def min_cost_assignment(cost):
+        """
+        Optimal one-to-one assignment of rows to columns (Hungarian algorithm)
+
+        Shortest-augmenting-path form with row/column potentials, O(n^2 m)
+        with the inner loop over columns done in NumPy. Works on rectangular
+        matrices; returns [(row, col)] with every row of the smaller side
+        matched.
+        """
+        cost = np.asarray(cost, dtype=np.float64)
+        if cost.shape[0] > cost.shape[1]:
+            return [(row, col) for col, row in DispatchService.min_cost_assignment(cost.T)]
+
+        n, m = cost.shape
+        u = np.zeros(n + 1)
+        v = np.zeros(m + 1)
+        owner = np.zeros(m + 1, dtype=np.int64)  # owner[j]: 1-based row matched to column j, 0 = free
+        way = np.zeros(m + 1, dtype=np.int64)
+
+        for row in range(1, n + 1):
+            owner[0] = row
+            col = 0
+            minv = np.full(m + 1, np.inf)
+            used = np.zeros(m + 1, dtype=bool)
+            while True:
+                used[col] = True
+                current_row = owner[col]
+                free = ~used[1:]
+
+                reduced = cost[current_row - 1] - u[current_row] - v[1:]
+                better = free & (reduced < minv[1:])
+                minv[1:][better] = reduced[better]
+                way[1:][better] = col
+
+                candidates = np.where(free, minv[1:], np.inf)
+                next_col = int(candidates.argmin()) + 1
+                delta = candidates[next_col - 1]
+
+                matched = np.flatnonzero(used)
+                u[owner[matched]] += delta
+                v[matched] -= delta
+                minv[1:][free] -= delta
+
+                col = next_col
+                if owner[col] == 0:
+                    break
+
+            while col:
+                previous = way[col]
+                owner[col] = owner[previous]
+                col = previous
+
+        return [(int(owner[col]) - 1, col - 1) for col in range(1, m + 1) if owner[col]]
+
+    @staticmethod
+    def match_orders(arrays, jobs, excluded=None):
+        """
+        Best one-driver-per-order matching for a batch
+
+        jobs is [(order_weight, delivery_area, pickup_point)]; excluded, if
+        given, lists per job the driver indices it must not go to. Maximizes
+        the total fitness score over the orders that can be served. Only each
+        order's top len(jobs) drivers can appear in an optimal matching, so
+        the solver runs on that union of columns instead of the whole fleet.
+        Returns [(job index, driver index, score)].
+        """
+        if not jobs or not len(arrays['capacity']):
+            return []
+
+        scores = np.vstack([
+            DispatchService.score_drivers(arrays, weight, area, DispatchService.distances_to(arrays, pickup))
+            for weight, area, pickup in jobs
+        ])
+        for row, drivers in enumerate(excluded or ()):
+            scores[row, list(drivers)] = -1
+
+        keep = min(len(jobs), scores.shape[1])
+        top = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+        columns = np.unique(top[np.take_along_axis(scores, top, axis=1) >= 0])
+        if not len(columns):
+            return []
+
+        candidate_scores = scores[:, columns]
+        cost = np.where(candidate_scores >= 0, -candidate_scores, DispatchService.INFEASIBLE_COST)
+        return [
+            (row, int(columns[col]), float(candidate_scores[row, col]))
+            for row, col in DispatchService.min_cost_assignment(cost)
+            if candidate_scores[row, col] >= 0
+        ]
+
+    @staticmethod
+    def pending_orders(limit):
+        """Paid orders nobody has been assigned to yet, oldest first"""
+        return Order.query.filter(
+            Order.payment_status == 'paid',
+            Order.status.notin_(('delivered', 'cancelled')),
+            ~db.exists().where(DriverAssignmentEnhanced.order_id == Order.id),
+            ~db.exists().where(DriverAssignment.order_id == Order.id)
+        ).order_by(Order.created_at).limit(limit).all()
+
+    @staticmethod
+    def waiting_jobs(max_orders=None):
+        """
+        Waiting orders with their dispatch inputs
+
+        Every order is picked up at the market (DEFAULT_AREA) and delivered to
+        the area named by its delivery city when there is one. Returns
+        (orders, jobs, points): jobs[i] is (weight, delivery_area, pickup_point)
+        for orders[i] and points maps area names to their centres.
+        """
+        max_orders = max_orders or current_app.config['DISPATCH_BATCH_MAX_ORDERS']
+        orders = DispatchService.pending_orders(max_orders)
+        if not orders:
+            return [], [], {}
+
+        weights = dict(db.session.query(
+            OrderItem.order_id, db.func.sum(db.func.coalesce(OrderItem.weight, OrderItem.quantity))
+        ).filter(OrderItem.order_id.in_([order.id for order in orders])).group_by(OrderItem.order_id).all())
+
+        areas = {name.lower(): area for name, area in RateTable.current().active.items()}
+        points = {
+            area.area_name: (area.center_lat, area.center_lng)
+            for area in areas.values() if area.center_lat is not None and area.center_lng is not None
+        }
+        pickup_area = DriverAssignmentService.DEFAULT_AREA
+        pickup_point = points.get(pickup_area)
+
+        jobs = []
+        for order in orders:
+            area = areas.get((order.delivery_city or '').lower())
+            jobs.append((weights.get(order.id) or 0, area.area_name if area else pickup_area, pickup_point))
+
+        return orders, jobs, points
+
+    @staticmethod
+    def available_drivers():
+        """Drivers who can take a new order"""
+        return DriverEnhanced.query.filter(
+            DriverEnhanced.is_active == True,
+            DriverEnhanced.status.in_(DriverAssignmentService.AVAILABLE_STATUSES)
+        ).all()
+
+    @staticmethod
+    def save_assignments(planned, points):
+        """
+        Create assignments for [(order, driver, (weight, area, pickup), extra)] in one commit
+
+        extra holds attributes set on the assignment after it is built
+        (e.g. trip fields and a planned ETA). Returns the number created.
+        """
+        pickup_area = DriverAssignmentService.DEFAULT_AREA
+        try:
+            assignments = []
+            for order, driver, (weight, delivery_area, _pickup), extra in planned:
+                assignment = DriverAssignmentService.build_assignment(
+                    order, driver, weight, delivery_area, pickup_area, delivery_point=points.get(delivery_area)
+                )
+                if assignment is None:
+                    continue  # filled by a concurrent dispatch; the order waits for the next batch
+                for name, value in extra.items():
+                    setattr(assignment, name, value)
+                db.session.add(assignment)
+                assignments.append((assignment, order, driver, weight, delivery_area))
+            db.session.flush()
+
+            # Tracking events and notifications don't need their ids back: one executemany each
+            if assignments:
+                db.session.execute(db.insert(DeliveryTrackingEvent), [
+                    dict(assignment_id=assignment.id, driver_id=driver.id, order_id=order.id,
+                         event_type='assignment', event_description=f'Order assigned to driver {driver.name}')
+                    for assignment, order, driver, weight, delivery_area in assignments
+                ])
+                db.session.execute(db.insert(DeliveryNotification), [
+                    dict(order_id=order.id, assignment_id=assignment.id,
+                         recipient_type='driver', recipient_id=driver.user_id,
+                         notification_type='new_delivery_assignment', title='New Delivery Assignment',
+                         message=f'New order to deliver {weight}kg to {delivery_area}')
+                    for assignment, order, driver, weight, delivery_area in assignments
+                ])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if assignments:
+            OpsMetrics.record('assignments_created', len(assignments))
+            DriverRegistry.publish_ids({driver.id for _assignment, _order, driver, _weight, _area in assignments})
+        return len(assignments)
+
+    @staticmethod
+    def dispatch_batch(max_orders=None):
+        """
+        Assign the waiting paid orders in one optimal matching and one commit
+
+        Each driver takes at most one order per batch, as with one-at-a-time
+        dispatch (an assigned driver goes on delivery). Orders left over wait
+        for the next batch. Returns a summary dict.
+        """
+        orders, jobs, points = DispatchService.waiting_jobs(max_orders)
+        if not orders:
+            return {'pending': 0, 'assigned': 0, 'total_score': 0.0}
+
+        drivers = DispatchService.available_drivers()
+        matches = DispatchService.match_orders(DispatchService.driver_arrays(drivers), jobs)
+        assigned = DispatchService.save_assignments(
+            [(orders[job], drivers[driver], jobs[job], {}) for job, driver, _score in matches], points
+        )
+        return {
+            'pending': len(orders),
+            'assigned': assigned,
+            'total_score': round(sum(score for _job, _driver, score in matches), 1)
+        }
+
+    @staticmethod
+    def dispatch_trips(max_orders=None):
+        """
+        Plan multi-drop trips for the waiting orders and give each trip to one driver
+
+        Trips are planned for the largest free capacity among the remaining
+        drivers and matched to drivers on the trip's total weight; trips no
+        driver can carry are re-planned for the next capacity down. Each
+        assignment gets its trip id, stop number and a per-stop ETA: travel
+        at DISPATCH_AVG_SPEED_KMH plus DISPATCH_STOP_MINUTES per drop, but
+        never less than the learned pickup-to-drop time (EtaService, else
+        the area's delivery time) plus the time the earlier stops add (see
+        TripPlanner.stop_etas). Orders whose pickup
+        or drop point is unknown go out as single-stop trips. Returns a
+        summary dict.
+        """
+        from app.trip_planner import TripPlanner
+
+        config = current_app.config
+        orders, jobs, points = DispatchService.waiting_jobs(max_orders)
+        if not orders:
+            return {'pending': 0, 'assigned': 0, 'trips': 0, 'km': 0.0, 'solo_km': 0.0}
+
+        drivers = DispatchService.available_drivers()
+        arrays = DispatchService.driver_arrays(drivers)
+        free_capacity = arrays['capacity'] - arrays['load']
+        free_drivers = np.ones(len(drivers), dtype=bool)
+
+        routable = [i for i, (_weight, area, pickup) in enumerate(jobs) if pickup and area in points]
+        unroutable = sorted(set(range(len(jobs))) - set(routable))
+        trips = []  # (driver index, job indices in stop order, route, distance matrix)
+
+        while routable and free_drivers.any():
+            pickup = jobs[routable[0]][2]
+            planned, dist = TripPlanner.plan(
+                pickup, [points[jobs[i][1]] for i in routable], [jobs[i][0] for i in routable],
+                free_capacity[free_drivers].max(), config['DISPATCH_TRIP_MAX_STOPS']
+            )
+            candidates = np.flatnonzero(free_drivers)
+            matches = DispatchService.match_orders(
+                DispatchService.subset(arrays, candidates),
+                [(load, jobs[routable[route[0]]][1], pickup) for route, load, _km in planned]
+            )
+            if not matches:
+                break
+
+            for trip, driver, _score in matches:
+                route = planned[trip][0]
+                trips.append((int(candidates[driver]), [routable[stop] for stop in route], route, dist))
+                free_drivers[candidates[driver]] = False
+            taken = {job for _driver, trip_jobs, _route, _dist in trips for job in trip_jobs}
+            routable = [i for i in routable if i not in taken]
+
+        # Orders without coordinates: one per remaining driver, as in batch dispatch
+        if unroutable and free_drivers.any():
+            candidates = np.flatnonzero(free_drivers)
+            matches = DispatchService.match_orders(
+                DispatchService.subset(arrays, candidates), [jobs[i] for i in unroutable]
+            )
+            for job, driver, _score in matches:
+                trips.append((int(candidates[driver]), [unroutable[job]], None, None))
+
+        started = datetime.utcnow()
+        pickup_time = started + timedelta(minutes=15)
+        areas = RateTable.current().areas
+        pickup_area = DriverAssignmentService.DEFAULT_AREA
+        planned, km, solo_km = [], 0.0, 0.0
+        for number, (driver, trip_jobs, route, dist) in enumerate(trips, 1):
+            trip_id = f"TRIP-{started:%Y%m%d%H%M%S}-{number}"
+            etas = None
+            if route is not None:
+                etas = TripPlanner.stop_etas(
+                    route, dist, config['DISPATCH_AVG_SPEED_KMH'], config['DISPATCH_STOP_MINUTES'],
+                    direct_minutes=[
+                        EtaService.estimate_minutes(
+                            pickup_area, jobs[job][1], pickup_time, areas[jobs[job][1]].delivery_time_minutes or 0
+                        )
+                        for job in trip_jobs
+                    ]
+                )
+                km += TripPlanner.route_km(route, dist)
+                solo_km += sum(2 * dist[0, stop + 1] for stop in route)
+
+            for stop, job in enumerate(trip_jobs):
+                extra = {'trip_id': trip_id, 'trip_stop': stop + 1}
+                if etas:
+                    extra['scheduled_pickup_time'] = pickup_time
+                    extra['estimated_delivery_time'] = pickup_time + timedelta(minutes=etas[stop])
+                planned.append((orders[job], drivers[driver], jobs[job], extra))
+
+        return {
+            'pending': len(orders),
+            'assigned': DispatchService.save_assignments(planned, points),
+            'trips': len(trips),
+            'km': round(km, 1),
+            'solo_km': round(float(solo_km), 1)  # the same drops as one round trip each
+        }
@@ -0,0 +1,170 @@
+"""
+Trip Distance Service - Driven distance from GPS traces
+Each GPS fix a driver sends extends the traces of their active deliveries
+(actual_distance_km); a batch backfill recomputes past trips from their
+stored points. Both drop jitter and bad fixes with the same thresholds
+"""
+
+from app import db
+from app.models_logistics import DriverAssignmentEnhanced, DeliveryTrackingEvent
+from app.geo import haversine_km_array
+from flask import current_app
+import numpy as np
+
+
+class TripDistanceService:
+    """Vectorized haversine over tracking points"""
+
+    FIX_EVENT = 'gps_fix'  # tracking event holding one kept point of a trace
+    TRACKED_STATUSES = ('accepted', 'picked_up', 'in_transit')
+
+    @staticmethod
+    def keep_fixes(step_km, elapsed_seconds):
+        """
+        Which steps are real movement
+
+        A step shorter than GPS_MIN_MOVE_METERS is jitter while the driver is
+        stopped; one faster than GPS_MAX_SPEED_KMH is a bad fix. A step from
+        nowhere (nan: the trace's first point) is always kept.
+        """
+        config = current_app.config
+        speed_kmh = step_km / np.maximum(elapsed_seconds, 1) * 3600
+        first = np.isnan(step_km)
+        return first | ((step_km * 1000 >= config['GPS_MIN_MOVE_METERS']) & ~(speed_kmh > config['GPS_MAX_SPEED_KMH']))
+
+    @staticmethod
+    def record_fix(driver_id, lat, lng, at):
+        """
+        Add a GPS fix to the traces of the driver's active deliveries
+
+        Fixes the driver's traces don't keep (see keep_fixes) leave them
+        untouched; kept ones extend actual_distance_km, become the
+        assignment's current location and are stored as FIX_EVENT points.
+        Runs in the caller's transaction. Returns the number of traces extended.
+        """
+        table = DriverAssignmentEnhanced.__table__
+        active = db.session.execute(
+            db.select(
+                table.c.id, table.c.order_id, table.c.current_location_lat, table.c.current_location_lng,
+                table.c.last_fix_at
+            ).where(
+                table.c.driver_id == driver_id,
+                table.c.assignment_status.in_(TripDistanceService.TRACKED_STATUSES)
+            )
+        ).all()
+        if not active:
+            return 0
+
+        ids, order_ids, last_lat, last_lng, last_at = zip(*active)
+        step_km = haversine_km_array(np.array(last_lat, dtype=np.float64), np.array(last_lng, dtype=np.float64), lat, lng)
+        elapsed = np.array([(at - t).total_seconds() if t else np.nan for t in last_at], dtype=np.float64)
+        kept = np.flatnonzero(TripDistanceService.keep_fixes(step_km, elapsed))
+        if not len(kept):
+            return 0
+        step_km = np.nan_to_num(step_km)
+
+        # Added in SQL, so two workers handling fixes for the same trip don't overwrite each other's total
+        db.session.execute(
+            db.update(table).where(table.c.id == db.bindparam('assignment_id')).values(
+                actual_distance_km=db.func.coalesce(table.c.actual_distance_km, 0) + db.bindparam('km'),
+                current_location_lat=lat, current_location_lng=lng, last_fix_at=at
+            ),
+            [{'assignment_id': ids[i], 'km': float(step_km[i])} for i in kept]
+        )
+        db.session.execute(db.insert(DeliveryTrackingEvent), [
+            dict(assignment_id=ids[i], driver_id=driver_id, order_id=order_ids[i], event_type=TripDistanceService.FIX_EVENT,
+                 location_lat=lat, location_lng=lng, timestamp=at)
+            for i in kept
+        ])
+        return len(kept)
+
+    @staticmethod
+    def trace_km(trace, lat, lng, seconds, n_traces):
+        """
+        Length of many traces at once
+
+        Points are given as arrays sorted by trace index, then time. Lone
+        bad fixes (too fast to reach and too fast to leave) are dropped
+        first; then steps are summed where keep_fixes keeps them.
+        Returns an array of km per trace index.
+        """
+        def steps(trace, lat, lng, seconds):
+            same_trace = np.r_[False, trace[1:] == trace[:-1]]
+            step_km = np.r_[np.nan, haversine_km_array(lat[:-1], lng[:-1], lat[1:], lng[1:])]
+            elapsed = np.r_[np.nan, np.diff(seconds)]
+            return same_trace, np.where(same_trace, step_km, np.nan), elapsed
+
+        if not len(trace):
+            return np.zeros(n_traces)
+
+        same_trace, step_km, elapsed = steps(trace, lat, lng, seconds)
+        too_fast = same_trace & (step_km / np.maximum(elapsed, 1) * 3600 > current_app.config['GPS_MAX_SPEED_KMH'])
+        spike = too_fast & np.r_[too_fast[1:], False]
+        trace, lat, lng, seconds = trace[~spike], lat[~spike], lng[~spike], seconds[~spike]
+
+        same_trace, step_km, elapsed = steps(trace, lat, lng, seconds)
+        counted = same_trace & TripDistanceService.keep_fixes(step_km, elapsed)
+        return np.bincount(trace[counted], weights=step_km[counted], minlength=n_traces)
+
+    @staticmethod
+    def backfill(recompute=False, batch_size=None):
+        """
+        Compute actual_distance_km of delivered trips from their stored points
+
+        Uses every tracking event of the trip that has coordinates, so the
+        thresholds can be changed and past trips re-measured (recompute) and
+        totals from concurrent fixes are repaired. Only trips still missing
+        a distance otherwise. One transaction per batch of trips. Returns a
+        summary dict.
+        """
+        batch_size = batch_size or current_app.config['DISTANCE_BACKFILL_BATCH_SIZE']
+        event = DeliveryTrackingEvent
+        summary = {'trips': 0, 'measured': 0, 'points': 0, 'km': 0.0}
+
+        last_id = 0
+        while True:
+            query = db.select(DriverAssignmentEnhanced.id).where(
+                DriverAssignmentEnhanced.assignment_status == 'delivered',
+                DriverAssignmentEnhanced.id > last_id
+            )
+            if not recompute:
+                query = query.where(DriverAssignmentEnhanced.actual_distance_km.is_(None))
+            ids = db.session.scalars(query.order_by(DriverAssignmentEnhanced.id).limit(batch_size)).all()
+            if not ids:
+                break
+            last_id = ids[-1]
+            summary['trips'] += len(ids)
+
+            points = db.session.execute(
+                db.select(event.assignment_id, event.location_lat, event.location_lng, event.timestamp).where(
+                    event.assignment_id.in_(ids),
+                    event.location_lat.isnot(None),
+                    event.location_lng.isnot(None)
+                ).order_by(event.assignment_id, event.timestamp, event.id)
+            ).all()
+            if not points:
+                continue
+
+            assignment_ids, lats, lngs, timestamps = zip(*points)
+            traced, trace = np.unique(np.array(assignment_ids, dtype=np.int64), return_inverse=True)
+            seconds = np.array(timestamps, dtype='datetime64[ms]').astype(np.int64) / 1000
+            km = TripDistanceService.trace_km(
+                trace, np.array(lats, dtype=np.float64), np.array(lngs, dtype=np.float64), seconds, len(traced)
+            )
+
+            try:
+                db.session.execute(db.update(DriverAssignmentEnhanced), [
+                    {'id': int(assignment_id), 'actual_distance_km': round(float(distance), 3)}
+                    for assignment_id, distance in zip(traced, km)
+                ])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+            summary['measured'] += len(traced)
+            summary['points'] += len(points)
+            summary['km'] += float(km.sum())
+
+        summary['km'] = round(summary['km'], 1)
+        return summary
@@ -0,0 +1,109 @@
+"""
+Driver Registry - Dispatchable drivers kept in the shared local store
+One entry per available driver, keyed by dispatch grid cell, so the matcher
+reads its candidates without querying drivers_enhanced. Status transitions
+publish changes; a periodic reconcile rebuilds it from the database
+"""
+
+from app.local_store import local_store
+from collections import namedtuple
+from flask import current_app
+import time
+
+ENTRY_PREFIX = 'dispatch:driver:'  # dispatch:driver:<cell>:<driver id> -> entry
+CELL_PREFIX = 'dispatch:cell:'  # dispatch:cell:<driver id> -> cell the entry is filed under
+SYNCED_KEY = 'dispatch:registry_synced'
+NO_CELL = '-'  # drivers with no position in the grid yet
+
+# Scoring inputs of an available driver; same attribute names as DriverEnhanced
+AvailableDriver = namedtuple('AvailableDriver', (
+    'id', 'vehicle_capacity_kg', 'current_load_kg', 'rating', 'parking_location', 'current_lat', 'current_lng'
+))
+
+
+class DriverRegistry:
+    """Availability registry shared by all workers"""
+
+    @staticmethod
+    def _entry(driver):
+        from app.driver_service import DriverAssignmentService
+
+        if not driver.is_active or driver.status not in DriverAssignmentService.AVAILABLE_STATUSES:
+            return None
+        return [driver.id, driver.vehicle_capacity_kg, driver.current_load_kg or 0, driver.rating or 0,
+                driver.parking_location, driver.current_lat, driver.current_lng]
+
+    @staticmethod
+    def publish(*drivers):
+        """
+        Record drivers' current status, load and position
+
+        Call after the change is committed. Drivers that can't take orders
+        are removed; a driver who moved is re-filed under the new cell.
+        """
+        for driver in drivers:
+            entry = DriverRegistry._entry(driver)
+            cell = driver.geo_cell or NO_CELL
+            previous = local_store.get(f'{CELL_PREFIX}{driver.id}')
+            if previous and previous != cell:
+                local_store.delete(f'{ENTRY_PREFIX}{previous}:{driver.id}')
+
+            if entry:
+                local_store.set(f'{ENTRY_PREFIX}{cell}:{driver.id}', entry)
+                local_store.set(f'{CELL_PREFIX}{driver.id}', cell)
+            else:
+                local_store.delete(f'{ENTRY_PREFIX}{cell}:{driver.id}')
+                local_store.delete(f'{CELL_PREFIX}{driver.id}')
+
+    @staticmethod
+    def publish_ids(driver_ids):
+        """Re-read the given drivers (one query) and publish them"""
+        from app.models_logistics import DriverEnhanced
+
+        if driver_ids:
+            DriverRegistry.publish(*DriverEnhanced.query.filter(DriverEnhanced.id.in_(list(driver_ids))).all())
+
+    @staticmethod
+    def reconcile():
+        """
+        Rebuild the registry from the database
+
+        Run periodically (flask reconcile-drivers) to repair anything a
+        crashed request failed to publish. Returns (published, removed).
+        """
+        from app.models_logistics import DriverEnhanced
+
+        drivers = DriverEnhanced.query.all()
+        wanted = {}
+        for driver in drivers:
+            entry = DriverRegistry._entry(driver)
+            if entry:
+                wanted[f'{ENTRY_PREFIX}{driver.geo_cell or NO_CELL}:{driver.id}'] = (driver, entry)
+
+        stale = [key for key in local_store.get_many(ENTRY_PREFIX) if key not in wanted]
+        for key in stale:
+            local_store.delete(key)
+        for key, (driver, entry) in wanted.items():
+            local_store.set(key, entry)
+            local_store.set(f'{CELL_PREFIX}{driver.id}', driver.geo_cell or NO_CELL)
+
+        local_store.set(SYNCED_KEY, time.time(), ttl=current_app.config['DRIVER_REGISTRY_MAX_AGE_SECONDS'])
+        return len(wanted), len(stale)
+
+    @staticmethod
+    def is_ready():
+        """True while the last reconcile is recent enough for the registry to be trusted"""
+        return local_store.get(SYNCED_KEY) is not None
+
+    @staticmethod
+    def in_cells(cells):
+        """Available drivers filed under the given grid cells"""
+        found = []
+        for cell in cells:
+            found.extend(AvailableDriver(*entry) for entry in local_store.get_many(f'{ENTRY_PREFIX}{cell}:').values())
+        return found
+
+    @staticmethod
+    def all_available():
+        """Every available driver in the registry"""
+        return [AvailableDriver(*entry) for entry in local_store.get_many(ENTRY_PREFIX).values()]
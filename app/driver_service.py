@@ -8,8 +8,15 @@ from app.models import Order, User
 from app.models_logistics import (
     DriverEnhanced, DriverAssignmentEnhanced, DriverEarning,
     DeliveryTrackingEvent, DeliveryNotification, LogisticsCost,
-    DriverPerformanceMetrics
+    DriverPerformanceMetrics, DispatchAttempt
 )
+from app.ops_metrics import OpsMetrics
+from app.eta_service import EtaService
+from app.distance_service import TripDistanceService
+from app.rate_table import RateTable
+from app.driver_registry import DriverRegistry
+from app.geo import grid_cell, ring_cells
+from flask import current_app
 from datetime import datetime, timedelta
 import random
 
@@ -25,13 +32,24 @@ class DriverAssignmentService:
         'lorry': 500
     }
     
+    DEFAULT_AREA = 'Central Koyambedu'
+    AVAILABLE_STATUSES = ('available', 'on_break')
+    
+    # Distance to pickup (km) -> location points; mirrors same area / same zone / elsewhere
+    PROXIMITY_BANDS = ((2.0, 25), (5.0, 20))
+    
+    # Assignments still holding weight on the driver's vehicle
+    OPEN_STATUSES = ('assigned', 'accepted', 'picked_up', 'in_transit', 'out_for_delivery')
+    # Another dispatcher may fill the chosen driver first; try the next best this many times
+    RESERVE_ATTEMPTS = 3
+    
     @staticmethod
-    def calculate_fitness_score(driver, order_weight, delivery_area):
+    def calculate_fitness_score(driver, order_weight, delivery_area, distance_km=None):
         """
         Calculate driver fitness score (0-100)
         Components:
         - Vehicle capacity match: 30%
-        - Location proximity: 25%
+        - Location proximity: 25% (by distance to pickup when known, else by area name)
         - Driver rating: 25%
         - Current load optimization: 20%
         """
@@ -47,7 +65,13 @@ class DriverAssignmentService:
         capacity_score = capacity_utilization * 30
         
         # Component 2: Location Proximity (25 points max)
-        if driver.parking_location == delivery_area:
+        if distance_km is not None:
+            location_score = 10  # Beyond the last band
+            for max_km, points in DriverAssignmentService.PROXIMITY_BANDS:
+                if distance_km <= max_km:
+                    location_score = points
+                    break
+        elif driver.parking_location == delivery_area:
             location_score = 25  # Same area
         elif driver.parking_location and delivery_area and driver.parking_location[:5] == delivery_area[:5]:
             location_score = 20  # Same zone
@@ -70,46 +94,108 @@ class DriverAssignmentService:
         return min(100, total_score)
     
     @staticmethod
-    def find_best_driver(order_weight, delivery_area, max_wait_minutes=15):
+    def area_point(area_name):
+        """(lat, lng) centre of a delivery area, or None if unknown"""
+        if not area_name:
+            return None
+        area = RateTable.current().areas.get(area_name)
+        if area is None or area.center_lat is None or area.center_lng is None:
+            return None
+        return area.center_lat, area.center_lng
+    
+    @staticmethod
+    def has_room(driver, order_weight):
+        """Whether the driver's free capacity can carry order_weight"""
+        return driver.vehicle_capacity_kg - (driver.current_load_kg or 0) >= order_weight
+    
+    @staticmethod
+    def find_nearby_drivers(lat, lng, from_registry=False, order_weight=0, exclude_ids=()):
+        """
+        Available drivers around a point, searched in expanding grid rings
+        
+        Each ring is one indexed lookup on geo_cell (or a read of the driver
+        registry), and the search stops as soon as DISPATCH_MIN_CANDIDATES
+        drivers who could take the order (not excluded, with room for
+        order_weight) are found, so the work done depends on local density
+        rather than fleet size. Excluded drivers are left out of the result.
+        """
+        config = current_app.config
+        found = []
+        feasible = 0
+        for ring in range(config['DISPATCH_SEARCH_RINGS'] + 1):
+            cells = ring_cells(lat, lng, config['DISPATCH_GRID_CELL_DEG'], ring)
+            if from_registry:
+                drivers = DriverRegistry.in_cells(cells)
+            else:
+                drivers = DriverEnhanced.query.filter(
+                    DriverEnhanced.geo_cell.in_(cells),
+                    DriverEnhanced.is_active == True,
+                    DriverEnhanced.status.in_(DriverAssignmentService.AVAILABLE_STATUSES)
+                ).all()
+            drivers = [driver for driver in drivers if driver.id not in exclude_ids]
+            found.extend(drivers)
+            feasible += sum(1 for driver in drivers if DriverAssignmentService.has_room(driver, order_weight))
+            if feasible >= config['DISPATCH_MIN_CANDIDATES']:
+                break
+        return found
+    
+    @staticmethod
+    def find_best_driver(order_weight, delivery_area, pickup_point=None, exclude_ids=()):
         """
         Find the best available driver for the order
         
         Selection criteria:
         1. Status = 'available' or 'on_break'
-        2. Has sufficient capacity
-        3. Highest fitness score
+        2. Near the pickup point (grid ring search) when it is known
+        3. Has sufficient capacity
+        4. Highest fitness score
+        
+        When the rings hold nobody who can take the order, every available
+        driver is considered, including those with no position yet.
+        Candidates come from the driver registry while it is in sync, so
+        only the chosen driver is read from the database.
         """
         
-        available_drivers = DriverEnhanced.query.filter(
-            DriverEnhanced.is_active == True,
-            DriverEnhanced.status.in_(['available', 'on_break'])
-        ).all()
+        from_registry = DriverRegistry.is_ready()
+        available_drivers = None
+        if pickup_point:
+            available_drivers = DriverAssignmentService.find_nearby_drivers(
+                *pickup_point, from_registry=from_registry, order_weight=order_weight, exclude_ids=exclude_ids
+            )
+            if not any(DriverAssignmentService.has_room(driver, order_weight) for driver in available_drivers):
+                available_drivers = None
+        
+        if available_drivers is None:
+            if from_registry:
+                available_drivers = DriverRegistry.all_available()
+            else:
+                available_drivers = DriverEnhanced.query.filter(
+                    DriverEnhanced.is_active == True,
+                    DriverEnhanced.status.in_(DriverAssignmentService.AVAILABLE_STATUSES)
+                ).all()
+            if exclude_ids:
+                available_drivers = [driver for driver in available_drivers if driver.id not in exclude_ids]
         
         if not available_drivers:
             return None, "No drivers available at this time"
         
-        # Calculate fitness for each driver
-        candidates = []
-        for driver in available_drivers:
-            fitness_score = DriverAssignmentService.calculate_fitness_score(
-                driver, order_weight, delivery_area
-            )
-            
-            if fitness_score >= 0:  # Can take this order
-                candidates.append({
-                    'driver': driver,
-                    'fitness_score': fitness_score
-                })
+        # Score all candidates in one vectorized pass (same numbers as calculate_fitness_score)
+        from app.dispatch_service import DispatchService
+        arrays = DispatchService.driver_arrays(available_drivers)
+        scores = DispatchService.score_drivers(
+            arrays, order_weight, delivery_area, DispatchService.distances_to(arrays, pickup_point)
+        )
         
-        if not candidates:
+        if not (scores >= 0).any():
             return None, "No drivers with sufficient capacity"
         
-        # Sort by fitness score (highest first)
-        candidates.sort(key=lambda x: x['fitness_score'], reverse=True)
-        
-        best_driver = candidates[0]['driver']
+        # Highest fitness score; ties go to the first candidate found
+        best = int(scores.argmax())
+        best_driver = available_drivers[best]
+        if from_registry:
+            best_driver = db.session.get(DriverEnhanced, best_driver.id)
         
-        return best_driver, f"Driver {best_driver.name} selected (Score: {candidates[0]['fitness_score']:.1f}/100)"
+        return best_driver, f"Driver {best_driver.name} selected (Score: {scores[best]:.1f}/100)"
     
     @staticmethod
     def assign_driver_to_order(order_id, order_weight, delivery_area, pickup_location):
@@ -120,49 +206,32 @@ class DriverAssignmentService:
         try:
             order = Order.query.get_or_404(order_id)
             
-            # Find best driver
-            best_driver, message = DriverAssignmentService.find_best_driver(
-                order_weight, delivery_area
-            )
-            
-            if not best_driver:
-                return False, message
+            # Pickup point: the pickup area's centre, else the market's default area
+            pickup_point = DriverAssignmentService.area_point(pickup_location) or \
+                DriverAssignmentService.area_point(DriverAssignmentService.DEFAULT_AREA)
             
-            # Get logistics cost
-            logistics_cost = DriverAssignmentService.calculate_logistics_cost(
-                order_weight, delivery_area
-            )
-            
-            # Create assignment
-            assignment = DriverAssignmentEnhanced(
-                order_id=order_id,
-                driver_id=best_driver.id,
-                assignment_status='assigned',
-                assigned_at=datetime.utcnow(),
+            # Find best driver; if a concurrent dispatch fills them first, take the next best
+            assignment, tried = None, set()
+            while assignment is None:
+                if len(tried) >= DriverAssignmentService.RESERVE_ATTEMPTS:
+                    return False, "Drivers are being assigned concurrently, please retry"
+                
+                best_driver, message = DriverAssignmentService.find_best_driver(
+                    order_weight, delivery_area, pickup_point=pickup_point, exclude_ids=tried
+                )
                 
-                pickup_location=pickup_location,
-                delivery_location=order.delivery_address,
-                weight_assigned_kg=order_weight,
+                if not best_driver:
+                    return False, message
                 
-                logistics_cost_calculated=logistics_cost['total_cost'],
-                driver_earning=DriverAssignmentService.calculate_driver_earning(
-                    order_weight, logistics_cost['base_cost']
+                assignment = DriverAssignmentService.build_assignment(
+                    order, best_driver, order_weight, delivery_area, pickup_location
                 )
-            )
-            
-            # Calculate estimated times
-            assignment.scheduled_pickup_time = datetime.utcnow() + timedelta(minutes=15)
-            assignment.estimated_delivery_time = assignment.scheduled_pickup_time + timedelta(
-                minutes=logistics_cost['delivery_time_minutes']
-            )
-            
-            # Update driver status
-            best_driver.current_load_kg += order_weight
-            if best_driver.status == 'available':
-                best_driver.status = 'on_delivery'
+                tried.add(best_driver.id)
             
             db.session.add(assignment)
             db.session.commit()
+            OpsMetrics.record('assignments_created')
+            DriverRegistry.publish(best_driver)
             
             # Create tracking event
             DriverAssignmentService.create_tracking_event(
@@ -190,15 +259,188 @@ class DriverAssignmentService:
             db.session.rollback()
             return False, f"Error: {str(e)}"
     
+    @staticmethod
+    def build_assignment(order, driver, order_weight, delivery_area, pickup_location, delivery_point=None):
+        """
+        New (unsaved) assignment of order to driver, with cost, earning and ETAs
+        
+        Also reserves the order's weight on the driver; returns None if the
+        driver no longer has room. delivery_point may be passed in when the
+        caller has already resolved the area's centre.
+        """
+        if not DriverAssignmentService.reserve_capacity(driver, order_weight):
+            return None
+        
+        logistics_cost = DriverAssignmentService.calculate_logistics_cost(order_weight, delivery_area)
+        
+        assignment = DriverAssignmentEnhanced(
+            order_id=order.id,
+            driver_id=driver.id,
+            assignment_status='assigned',
+            assigned_at=datetime.utcnow(),
+            
+            pickup_location=pickup_location,
+            delivery_location=order.delivery_address,
+            delivery_area=delivery_area,
+            weight_assigned_kg=order_weight,
+            
+            logistics_cost_calculated=logistics_cost['total_cost'],
+            driver_earning=DriverAssignmentService.calculate_driver_earning(
+                order_weight, logistics_cost['base_cost']
+            )
+        )
+        
+        if delivery_point is None:
+            delivery_point = DriverAssignmentService.area_point(delivery_area)
+        if delivery_point:
+            assignment.delivery_location_lat, assignment.delivery_location_lng = delivery_point
+        
+        # Calculate estimated times: travel learned from past trips on this route at this hour,
+        # else the area's fixed delivery time
+        assignment.scheduled_pickup_time = datetime.utcnow() + timedelta(minutes=15)
+        assignment.estimated_delivery_time = assignment.scheduled_pickup_time + timedelta(
+            minutes=EtaService.estimate_minutes(
+                pickup_location, delivery_area, assignment.scheduled_pickup_time,
+                logistics_cost['delivery_time_minutes']
+            )
+        )
+        
+        # The driver has DISPATCH_ACCEPT_WINDOW_SECONDS to accept before the order is re-offered
+        assignment.offer_expires_at = assignment.assigned_at + timedelta(
+            seconds=current_app.config['DISPATCH_ACCEPT_WINDOW_SECONDS']
+        )
+        assignment.offer_attempts = 1
+        assignment.attempts.append(DispatchAttempt(order_id=order.id, driver_id=driver.id))
+        
+        return assignment
+    
+    @staticmethod
+    def reserve_capacity(driver, weight_kg):
+        """
+        Add weight_kg to the driver's load if it still fits
+        
+        The capacity check and the increment are a single conditional UPDATE,
+        so two dispatchers picking the same driver can't both fill the last
+        of the vehicle. Also puts an available driver on delivery. Returns
+        False, changing nothing, when the driver no longer has room or has
+        gone off duty since they were picked.
+        """
+        load = db.func.coalesce(DriverEnhanced.current_load_kg, 0)
+        result = db.session.execute(
+            db.update(DriverEnhanced).where(
+                DriverEnhanced.id == driver.id,
+                DriverEnhanced.is_active == True,
+                DriverEnhanced.status != 'off_duty',
+                DriverEnhanced.vehicle_capacity_kg - load >= weight_kg
+            ).values(
+                current_load_kg=load + weight_kg,
+                status=db.case((DriverEnhanced.status == 'available', 'on_delivery'), else_=DriverEnhanced.status)
+            ).execution_options(synchronize_session=False)
+        )
+        db.session.expire(driver, ['current_load_kg', 'status'])
+        return result.rowcount == 1
+    
+    @staticmethod
+    def release_capacity(driver, weight_kg):
+        """Take weight_kg off the driver's load in the database (never below zero)"""
+        DriverAssignmentService.release_capacity_many({driver.id: weight_kg})
+        db.session.expire(driver, ['current_load_kg', 'status'])
+    
+    @staticmethod
+    def release_capacity_many(weights):
+        """
+        Release {driver id: kg} in one UPDATE
+        
+        Loads never go below zero, and a driver left with nothing on board
+        is available again.
+        """
+        if not weights:
+            return
+        load = db.func.coalesce(DriverEnhanced.current_load_kg, 0)
+        released = db.case(weights, value=DriverEnhanced.id, else_=0)
+        db.session.execute(
+            db.update(DriverEnhanced).where(DriverEnhanced.id.in_(list(weights))).values(
+                current_load_kg=db.case((load > released, load - released), else_=0),
+                status=db.case(
+                    (db.and_(DriverEnhanced.status == 'on_delivery', load <= released), 'available'),
+                    else_=DriverEnhanced.status
+                )
+            ).execution_options(synchronize_session=False)
+        )
+    
+    @staticmethod
+    def close_attempts(assignment_ids, outcome, reason=None):
+        """Record how the open offers on these assignments ended"""
+        db.session.execute(
+            db.update(DispatchAttempt).where(
+                DispatchAttempt.assignment_id.in_(assignment_ids),
+                DispatchAttempt.outcome == 'offered'
+            ).values(outcome=outcome, reason=reason, responded_at=datetime.utcnow())
+        )
+    
+    @staticmethod
+    def reject_assignment(assignment_id, driver_user_id, reason):
+        """Driver turns down an assignment; the order is re-offered to the next best driver"""
+        try:
+            driver = DriverEnhanced.query.filter_by(user_id=driver_user_id).first()
+            if not driver:
+                return False, "Driver profile not found"
+            
+            assignment = DriverAssignmentEnhanced.query.get_or_404(assignment_id)
+            
+            if assignment.driver_id != driver.id:
+                return False, "Unauthorized"
+            
+            # Only once, even if the form is submitted twice
+            if not DriverAssignmentService.transition_assignment(
+                assignment, 'pending_reassignment', ('assigned', 'accepted')
+            ):
+                return False, "Assignment already processed"
+            assignment.cancellation_reason = reason
+            DriverAssignmentService.close_attempts([assignment.id], 'rejected', reason)
+            
+            # Release driver load
+            DriverAssignmentService.release_capacity(driver, assignment.weight_assigned_kg)
+            
+            db.session.commit()
+            OpsMetrics.record('assignments_rejected')
+            DriverRegistry.publish(driver)
+        
+        except Exception as e:
+            db.session.rollback()
+            return False, str(e)
+        
+        from app.reassignment_service import ReassignmentService
+        ReassignmentService.reoffer(assignment)
+        return True, f"Assignment rejected: {reason}"
+    
+    @staticmethod
+    def transition_assignment(assignment, new_status, from_statuses):
+        """
+        Move an assignment to new_status only if it is still in from_statuses
+        
+        Conditional UPDATE, so a double-submitted reject or delivery can't
+        release the same weight twice. Returns whether this call made the change.
+        """
+        result = db.session.execute(
+            db.update(DriverAssignmentEnhanced).where(
+                DriverAssignmentEnhanced.id == assignment.id,
+                DriverAssignmentEnhanced.assignment_status.in_(from_statuses)
+            ).values(assignment_status=new_status).execution_options(synchronize_session=False)
+        )
+        db.session.expire(assignment, ['assignment_status'])
+        return result.rowcount == 1
+    
     @staticmethod
     def calculate_logistics_cost(weight_kg, delivery_area):
-        """Calculate logistics cost based on weight and area"""
+        """Calculate logistics cost based on weight and area (from the in-process rate table)"""
         
-        logistics = LogisticsCost.query.filter_by(area_name=delivery_area, is_active=True).first()
+        rates = RateTable.current()
+        logistics = rates.active.get(delivery_area)
         
         if not logistics:
             # Fallback to default
-            logistics = LogisticsCost.query.filter_by(area_name='Central Koyambedu').first()
+            logistics = rates.default
             if not logistics:
                 # Use defaults
                 return {
@@ -243,16 +485,17 @@ class DriverAssignmentService:
             if assignment.driver_id != driver.id:
                 return False, "Unauthorized"
             
-            if assignment.assignment_status != 'assigned':
+            if not DriverAssignmentService.transition_assignment(assignment, 'accepted', ('assigned',)):
                 return False, "Assignment already processed"
             
-            assignment.assignment_status = 'accepted'
             assignment.accepted_at = datetime.utcnow()
+            DriverAssignmentService.close_attempts([assignment.id], 'accepted')
             
             driver.status = 'on_delivery'
             driver.last_active = datetime.utcnow()
             
             db.session.commit()
+            DriverRegistry.publish(driver)
             
             # Create tracking event
             DriverAssignmentService.create_tracking_event(
@@ -317,7 +560,11 @@ class DriverAssignmentService:
             if assignment.driver_id != driver.id:
                 return False, "Unauthorized"
             
-            assignment.assignment_status = 'delivered'
+            if not DriverAssignmentService.transition_assignment(
+                assignment, 'delivered', DriverAssignmentService.OPEN_STATUSES
+            ):
+                return False, "Assignment already processed"
+            
             assignment.actual_delivery_time = datetime.utcnow()
             if photos:
                 assignment.delivery_photo_url = photos
@@ -330,8 +577,8 @@ class DriverAssignmentService:
                 delay_minutes = (assignment.actual_delivery_time - assignment.estimated_delivery_time).total_seconds() / 60
             
             # Update driver
-            driver.current_load_kg -= assignment.weight_assigned_kg
-            driver.status = 'available'
+            # Back to available only once nothing is left on board (other drops of a trip)
+            DriverAssignmentService.release_capacity(driver, assignment.weight_assigned_kg)
             driver.total_deliveries += 1
             driver.successful_deliveries += 1
             driver.last_active = datetime.utcnow()
@@ -363,6 +610,8 @@ class DriverAssignmentService:
             
             db.session.add(earnings)
             db.session.commit()
+            OpsMetrics.record('deliveries_completed')
+            DriverRegistry.publish(driver)
             
             # Create tracking event
             DriverAssignmentService.create_tracking_event(
@@ -390,6 +639,63 @@ class DriverAssignmentService:
             db.session.rollback()
             return False, str(e)
     
+    @staticmethod
+    def update_driver_location(driver_user_id, lat, lng):
+        """Store a driver's GPS fix, re-bucket them and update their active deliveries"""
+        try:
+            driver = DriverEnhanced.query.filter_by(user_id=driver_user_id).first()
+            if not driver:
+                return False, "Driver profile not found"
+            
+            now = datetime.utcnow()
+            driver.set_position(lat, lng, current_app.config['DISPATCH_GRID_CELL_DEG'])
+            driver.last_active = now
+            
+            # Extend the GPS traces (and driven distance) of the driver's active deliveries
+            TripDistanceService.record_fix(driver.id, lat, lng, now)
+            
+            db.session.commit()
+            DriverRegistry.publish(driver)
+            return True, "Location updated"
+        
+        except Exception as e:
+            db.session.rollback()
+            return False, str(e)
+    
+    @staticmethod
+    def index_driver_positions():
+        """
+        Re-bucket every driver in the dispatch grid
+        
+        Drivers without a GPS fix are filed under their parking area's
+        centre; only their grid cell is set, so they still have no position
+        (scoring falls back to the area name) and a later run follows the
+        centre if it moves. Returns (located, unlocated) counts.
+        """
+        cell_deg = current_app.config['DISPATCH_GRID_CELL_DEG']
+        centres = {
+            area.area_name: (area.center_lat, area.center_lng)
+            for area in LogisticsCost.query.filter(LogisticsCost.center_lat.isnot(None)).all()
+        }
+        
+        located = unlocated = 0
+        for driver in DriverEnhanced.query.all():
+            if driver.current_lat is not None and driver.current_lng is not None:
+                position = (driver.current_lat, driver.current_lng)
+            else:
+                position = centres.get(driver.parking_location)
+            
+            if position:
+                driver.geo_cell = grid_cell(position[0], position[1], cell_deg)
+                located += 1
+            else:
+                driver.geo_cell = None
+                unlocated += 1
+        
+        db.session.commit()
+        DriverRegistry.reconcile()
+        return located, unlocated
+    
     @staticmethod
     def create_tracking_event(assignment_id, driver_id, order_id, event_type, event_description, location=None):
         """Create a delivery tracking event"""
@@ -0,0 +1,193 @@
+"""
+ETA Service - Learned delivery travel times
+Nightly job that turns pickup and delivered tracking events into travel-time
+tables per (pickup area, delivery area, hour of the week); assignment reads
+them from an in-process copy instead of the area's fixed delivery time
+"""
+
+from app import db
+from app.models_logistics import DriverAssignmentEnhanced, DeliveryTrackingEvent, DeliveryEta, LogisticsCost
+from app.geo import haversine_km_array
+from flask import current_app
+from datetime import datetime, timedelta
+import numpy as np
+import time
+
+HOURS_PER_WEEK = 7 * 24
+
+# This worker's copy of the tables: (monotonic load time, {(pickup, delivery, hour_of_week): minutes})
+_tables = (None, {})
+
+
+class EtaService:
+    """Travel-time tables learned from completed deliveries"""
+
+    @staticmethod
+    def hour_of_week(timestamps):
+        """UTC datetimes -> hour of the week (0 = Monday 00:00) as an int64 array"""
+        hours = np.array(timestamps, dtype='datetime64[h]').astype(np.int64)
+        return ((hours // 24 + 3) % 7) * 24 + hours % 24  # 1970-01-01 was a Thursday
+
+    @staticmethod
+    def load_trips(history_days):
+        """
+        Pickup area, drop point and pickup/delivered times of recent deliveries
+
+        One row per assignment that has both a pickup_at_vendor and a
+        delivered event in the window and a known drop point.
+        """
+        since = datetime.utcnow() - timedelta(days=history_days)
+        event = DeliveryTrackingEvent
+        picked_up_at = db.func.min(db.case((event.event_type == 'pickup_at_vendor', event.timestamp)))
+        delivered_at = db.func.max(db.case((event.event_type == 'delivered', event.timestamp)))
+
+        return db.session.query(
+            DriverAssignmentEnhanced.pickup_location,
+            DriverAssignmentEnhanced.delivery_location_lat,
+            DriverAssignmentEnhanced.delivery_location_lng,
+            picked_up_at,
+            delivered_at
+        ).join(event, event.assignment_id == DriverAssignmentEnhanced.id).filter(
+            event.event_type.in_(('pickup_at_vendor', 'delivered')),
+            event.timestamp >= since,
+            DriverAssignmentEnhanced.delivery_location_lat.isnot(None),
+            DriverAssignmentEnhanced.delivery_location_lng.isnot(None)
+        ).group_by(DriverAssignmentEnhanced.id).having(
+            picked_up_at.isnot(None), delivered_at.isnot(None)
+        ).all()
+
+    @staticmethod
+    def group_quantiles(groups, values, quantiles):
+        """
+        Per-group quantiles of values with one sort
+
+        groups are int codes. Returns (group codes, counts, one array per
+        quantile), interpolated linearly like np.quantile.
+        """
+        order = np.lexsort((values, groups))
+        groups, values = groups[order], values[order]
+        keys, starts, counts = np.unique(groups, return_index=True, return_counts=True)
+
+        results = []
+        for quantile in quantiles:
+            position = quantile * (counts - 1)
+            low = np.floor(position).astype(np.int64)
+            high = np.minimum(low + 1, counts - 1)
+            results.append(values[starts + low] + (values[starts + high] - values[starts + low]) * (position - low))
+        return keys, counts, results
+
+    @staticmethod
+    def build_tables(history_days=None):
+        """
+        Recompute the travel-time tables and replace the stored ones
+
+        A trip's drop area is the area whose centre is nearest its drop
+        point; its hour is the hour of the week it was picked up. Each
+        (pair, hour) cell with at least ETA_MIN_SAMPLES trips gets a row,
+        and so does each pair over all hours (hour_of_week ALL_HOURS).
+        Returns a summary dict.
+        """
+        config = current_app.config
+        history_days = history_days or config['ETA_HISTORY_DAYS']
+        min_samples = config['ETA_MIN_SAMPLES']
+
+        areas = LogisticsCost.query.filter(
+            LogisticsCost.is_active == True, LogisticsCost.center_lat.isnot(None), LogisticsCost.center_lng.isnot(None)
+        ).order_by(LogisticsCost.id).all()
+        trips = EtaService.load_trips(history_days)
+        summary = {'trips': len(trips), 'used': 0, 'cells': 0, 'pairs': 0}
+
+        rows = []
+        if trips and areas:
+            pickup_names, drop_lat, drop_lng, picked_up_at, delivered_at = zip(*trips)
+            minutes = (np.array(delivered_at, dtype='datetime64[s]') - np.array(picked_up_at, dtype='datetime64[s]'))\
+                .astype(np.float64) / 60
+            kept = (minutes > 0) & (minutes <= config['ETA_MAX_MINUTES'])
+
+            # Drop area: nearest centre, one (trips x areas) distance matrix
+            centres = np.array([(area.center_lat, area.center_lng) for area in areas], dtype=np.float64)
+            drop_area = haversine_km_array(
+                np.array(drop_lat, dtype=np.float64)[:, None], np.array(drop_lng, dtype=np.float64)[:, None],
+                centres[None, :, 0], centres[None, :, 1]
+            ).argmin(axis=1)
+
+            # Pickups are recorded by area name; names that aren't areas keep their own code
+            canonical = {area.area_name.lower(): area.area_name for area in areas}
+            pickup_labels = sorted({canonical.get(name.lower(), name) for name in pickup_names})
+            pickup_code = {label: i for i, label in enumerate(pickup_labels)}
+            pickup_area = np.array([pickup_code[canonical.get(name.lower(), name)] for name in pickup_names], dtype=np.int64)
+
+            pair = (pickup_area * len(areas) + drop_area)[kept]
+            hour = EtaService.hour_of_week(picked_up_at)[kept]
+            minutes = minutes[kept]
+            summary['used'] = len(minutes)
+
+            computed_at = datetime.utcnow()
+            quantiles = (config['ETA_QUANTILE'], 0.5)
+            for codes, by_hour in ((pair * HOURS_PER_WEEK + hour, True), (pair, False)):
+                keys, counts, (promised, median) = EtaService.group_quantiles(codes, minutes, quantiles)
+                for i in np.flatnonzero(counts >= min_samples):
+                    pair_key, hour_of_week = divmod(int(keys[i]), HOURS_PER_WEEK) if by_hour \
+                        else (int(keys[i]), DeliveryEta.ALL_HOURS)
+                    pickup_index, drop_index = divmod(pair_key, len(areas))
+                    rows.append({
+                        'pickup_area': pickup_labels[pickup_index],
+                        'delivery_area': areas[drop_index].area_name,
+                        'hour_of_week': hour_of_week,
+                        'minutes': round(float(promised[i]), 1),
+                        'median_minutes': round(float(median[i]), 1),
+                        'samples': int(counts[i]),
+                        'computed_at': computed_at
+                    })
+
+        summary['pairs'] = sum(1 for row in rows if row['hour_of_week'] == DeliveryEta.ALL_HOURS)
+        summary['cells'] = len(rows) - summary['pairs']
+
+        try:
+            db.session.query(DeliveryEta).delete(synchronize_session=False)
+            if rows:
+                db.session.execute(db.insert(DeliveryEta), rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        EtaService.clear_cache()
+        return summary
+
+    @staticmethod
+    def clear_cache():
+        """Make this worker reload the tables on the next lookup"""
+        global _tables
+        _tables = (None, {})
+
+    @staticmethod
+    def tables():
+        """This worker's copy of the tables, reloaded (one query) every ETA_CACHE_SECONDS"""
+        global _tables
+        loaded_at, minutes = _tables
+        if loaded_at is None or time.monotonic() - loaded_at > current_app.config['ETA_CACHE_SECONDS']:
+            minutes = {
+                (pickup.lower(), delivery.lower(), hour): value
+                for pickup, delivery, hour, value in db.session.query(
+                    DeliveryEta.pickup_area, DeliveryEta.delivery_area, DeliveryEta.hour_of_week, DeliveryEta.minutes
+                )
+            }
+            _tables = (time.monotonic(), minutes)
+        return minutes
+
+    @staticmethod
+    def estimate_minutes(pickup_area, delivery_area, pickup_time, default):
+        """
+        Pickup-to-drop minutes for a trip starting at pickup_time
+
+        The learned time for that hour of the week, else for the area pair
+        over all hours, else default (the area's fixed delivery time).
+        """
+        tables = EtaService.tables()
+        pair = ((pickup_area or '').lower(), (delivery_area or '').lower())
+        hour = pickup_time.weekday() * 24 + pickup_time.hour
+        minutes = tables.get(pair + (hour,))
+        if minutes is None:
+            minutes = tables.get(pair + (DeliveryEta.ALL_HOURS,), default)
+        return minutes
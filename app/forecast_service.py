@@ -0,0 +1,165 @@
+"""
+Demand Forecast Service - Vectorized per-product demand forecasting
+Nightly job that turns OrderItem history into suggested stock levels
+"""
+
+from app import db
+from app.models import Product, Order, OrderItem, DemandForecast
+from datetime import datetime, timedelta
+from flask import current_app
+import numpy as np
+
+
+class DemandForecastService:
+    """Bulk demand forecasting over all products in one NumPy pass"""
+
+    @staticmethod
+    def load_product_arrays():
+        """Load product ids, vendors, stock and days-to-expiry as arrays"""
+        rows = db.session.query(
+            Product.id, Product.vendor_id, Product.quantity, Product.expiry_date
+        ).order_by(Product.id).all()
+
+        if not rows:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty, np.zeros(0)
+
+        product_ids, vendor_ids, quantities, expiry_dates = zip(*rows)
+
+        today = np.datetime64(datetime.utcnow().date(), 'D')
+        expiry = np.array([d if d else 'NaT' for d in expiry_dates], dtype='datetime64[D]')
+        days_to_expiry = (expiry - today).astype('float64')  # NaT -> nan
+
+        return (np.array(product_ids, dtype=np.int64),
+                np.array(vendor_ids, dtype=np.int64),
+                np.array(quantities, dtype=np.int64),
+                days_to_expiry)
+
+    @staticmethod
+    def load_demand_matrix(product_ids, history_days, end_date=None):
+        """
+        Build a (products x days) matrix of units sold on paid orders
+
+        Aggregation to one row per product-day happens in SQL, the
+        scatter into the matrix happens in NumPy.
+        """
+        end_date = end_date or datetime.utcnow().date()
+        start_date = end_date - timedelta(days=history_days)
+
+        order_day = db.func.date(Order.created_at)
+        rows = db.session.query(
+            OrderItem.product_id,
+            order_day,
+            db.func.sum(OrderItem.quantity)
+        ).join(Order, OrderItem.order_id == Order.id).filter(
+            Order.payment_status == 'paid',
+            Order.created_at >= datetime.combine(start_date, datetime.min.time()),
+            Order.created_at < datetime.combine(end_date, datetime.min.time())
+        ).group_by(OrderItem.product_id, order_day).all()
+
+        matrix = np.zeros((len(product_ids), history_days), dtype=np.float64)
+        if not rows:
+            return matrix
+
+        sold_product_ids, sold_days, sold_units = zip(*rows)
+        sold_product_ids = np.array(sold_product_ids, dtype=np.int64)
+        day_index = (np.array(sold_days, dtype='datetime64[D]') - np.datetime64(start_date, 'D')).astype(np.int64)
+
+        # product_ids is sorted, so searchsorted maps ids to matrix rows
+        row_index = np.searchsorted(product_ids, sold_product_ids)
+        known = (row_index < len(product_ids)) & (product_ids[np.minimum(row_index, len(product_ids) - 1)] == sold_product_ids)
+
+        np.add.at(matrix, (row_index[known], day_index[known]), np.array(sold_units, dtype=np.float64)[known])
+        return matrix
+
+    @staticmethod
+    def exponential_smoothing(matrix, alpha):
+        """
+        Simple exponential smoothing for every row at once
+
+        The recursive level l_t = a*x_t + (1-a)*l_(t-1), seeded with the
+        first observation, unrolls to a fixed weight vector, so the whole
+        forecast is a single matrix-vector product.
+        """
+        n_days = matrix.shape[1]
+        if n_days == 0:
+            return np.zeros(matrix.shape[0])
+
+        age = np.arange(n_days - 1, -1, -1)  # 0 for the most recent day
+        weights = alpha * (1 - alpha) ** age
+        weights[0] = (1 - alpha) ** (n_days - 1)  # seed weight for the first observation
+        return matrix @ weights
+
+    @staticmethod
+    def suggest_stock(forecast, demand_std, days_to_expiry, cover_days, safety_z):
+        """
+        Suggested stock = forecast demand over the cover window plus safety stock
+
+        Perishables never get a cover window longer than their remaining
+        shelf life, so we don't recommend stock that will expire unsold.
+        """
+        cover = np.full(forecast.shape, float(cover_days))
+        perishable = ~np.isnan(days_to_expiry)
+        cover[perishable] = np.clip(days_to_expiry[perishable], 0, cover_days)
+
+        suggested = forecast * cover + safety_z * demand_std * np.sqrt(cover)
+        return np.ceil(suggested).astype(np.int64), cover.astype(np.int64)
+
+    @staticmethod
+    def run_forecast(history_days=None, alpha=None, cover_days=None, safety_z=None):
+        """Compute forecasts for all products and replace the stored snapshot"""
+        config = current_app.config
+        history_days = history_days or config['FORECAST_HISTORY_DAYS']
+        alpha = config['FORECAST_SMOOTHING_ALPHA'] if alpha is None else alpha
+        if not 0 < alpha <= 1:
+            raise ValueError(f"Smoothing factor must be in (0, 1], got {alpha}")
+        cover_days = cover_days or config['FORECAST_COVER_DAYS']
+        safety_z = safety_z if safety_z is not None else config['FORECAST_SAFETY_Z']
+
+        product_ids, vendor_ids, quantities, days_to_expiry = DemandForecastService.load_product_arrays()
+        matrix = DemandForecastService.load_demand_matrix(product_ids, history_days)
+
+        average = matrix.mean(axis=1) if history_days else np.zeros(len(product_ids))
+        std = matrix.std(axis=1) if history_days else np.zeros(len(product_ids))
+        forecast = DemandForecastService.exponential_smoothing(matrix, alpha)
+        suggested, cover = DemandForecastService.suggest_stock(
+            forecast, std, days_to_expiry, cover_days, safety_z
+        )
+
+        computed_at = datetime.utcnow()
+        rows = [
+            {
+                'product_id': int(product_ids[i]),
+                'vendor_id': int(vendor_ids[i]),
+                'average_daily_demand': float(average[i]),
+                'forecast_daily_demand': float(forecast[i]),
+                'demand_std': float(std[i]),
+                'cover_days': int(cover[i]),
+                'suggested_stock': int(suggested[i]),
+                'history_days': history_days,
+                'computed_at': computed_at
+            }
+            for i in range(len(product_ids))
+        ]
+
+        try:
+            db.session.query(DemandForecast).delete(synchronize_session=False)
+            if rows:
+                db.session.execute(db.insert(DemandForecast), rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        return len(rows)
+
+    @staticmethod
+    def get_vendor_suggestions(vendor_id, limit=10):
+        """Vendor's products whose stock is furthest from the suggested level"""
+        gap = Product.quantity - DemandForecast.suggested_stock
+        return db.session.query(Product, DemandForecast).join(
+            DemandForecast, DemandForecast.product_id == Product.id
+        ).filter(
+            DemandForecast.vendor_id == vendor_id,
+            Product.is_active == True
+        ).order_by(db.func.abs(gap).desc()).limit(limit).all()
@@ -0,0 +1,50 @@
+"""
+Geo Helpers - Distances and the grid bucket index used for driver matching
+Positions are bucketed into square lat/lng cells; a search around a point
+walks outward ring by ring so it only ever touches nearby cells
+"""
+
+import math
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometres"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def grid_cell(lat, lng, cell_deg):
+    """Grid bucket key ('row:col') for a position"""
+    return f'{math.floor(lat / cell_deg)}:{math.floor(lng / cell_deg)}'
+
+
+def ring_cells(lat, lng, cell_deg, ring):
+    """
+    Cell keys exactly `ring` cells away (Chebyshev distance) from the point's cell
+
+    Ring 0 is the point's own cell, ring 1 the 8 cells around it, and so on.
+    """
+    row, col = math.floor(lat / cell_deg), math.floor(lng / cell_deg)
+    if ring == 0:
+        return [f'{row}:{col}']
+
+    cells = []
+    for d in range(-ring, ring + 1):
+        cells.append(f'{row - ring}:{col + d}')
+        cells.append(f'{row + ring}:{col + d}')
+    for d in range(-ring + 1, ring):
+        cells.append(f'{row + d}:{col - ring}')
+        cells.append(f'{row + d}:{col + ring}')
+    return cells
+
+
+def haversine_km_array(lat1, lng1, lat2, lng2):
+    """Vectorized haversine over NumPy arrays (or scalars broadcast against them)"""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
@@ -0,0 +1,102 @@
+"""
+Local Store - Small key/value store shared by all workers on one host
+Backed by a SQLite file so gunicorn workers see the same cache and counters
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class LocalStore:
+    """JSON key/value store with TTLs and atomic counters"""
+
+    def __init__(self, app=None):
+        self.path = None
+        self._local = threading.local()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.path = app.config.get('LOCAL_STORE_PATH') or os.path.join(app.instance_path, 'local_store.db')
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        conn = self._connect()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS kv ('
+            ' key TEXT PRIMARY KEY,'
+            ' value TEXT,'
+            ' expires_at REAL)'
+        )
+        self.purge_expired()
+        app.extensions['local_store'] = self
+
+    def _connect(self):
+        """One connection per thread, reopened after fork (gunicorn preload)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid() or self._local.path != self.path:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            self._local.path = self.path
+        return conn
+
+    def get(self, key, default=None):
+        row = self._connect().execute(
+            'SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+            (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        self._connect().execute(
+            'INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at',
+            (key, json.dumps(value), expires_at)
+        )
+
+    def delete(self, key):
+        self._connect().execute('DELETE FROM kv WHERE key = ?', (key,))
+
+    def incr(self, key, amount=1, ttl=None):
+        """Atomically add to a numeric value; expired values restart from zero"""
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        row = self._connect().execute(
+            'INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET '
+            ' value = CASE WHEN kv.expires_at IS NOT NULL AND kv.expires_at <= ? '
+            '  THEN excluded.value ELSE kv.value + excluded.value END,'
+            ' expires_at = CASE WHEN kv.expires_at IS NOT NULL AND kv.expires_at <= ? '
+            '  THEN excluded.expires_at ELSE kv.expires_at END '
+            'RETURNING value',
+            (key, amount, expires_at, now, now)
+        ).fetchone()
+        return json.loads(str(row[0]))
+
+    def get_many(self, prefix):
+        """All live values whose key starts with prefix, as a dict"""
+        rows = self._connect().execute(
+            "SELECT key, value FROM kv WHERE key >= ? AND key < ? AND (expires_at IS NULL OR expires_at > ?)",
+            (prefix, prefix + '\uffff', time.time())
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def cached(self, key, ttl, compute):
+        """Return the cached value for key, computing and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value, ttl)
+        return value
+
+    def purge_expired(self):
+        self._connect().execute('DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),))
+
+
+local_store = LocalStore()
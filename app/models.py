@@ -6,6 +6,9 @@ import json
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_type_active', 'user_type', 'is_active'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -48,6 +51,14 @@ class User(UserMixin, db.Model):
 
 class Product(db.Model):
     __tablename__ = 'products'
+    __table_args__ = (
+        # Vendor catalog listing: filter by owner/status, then category, expiry or recency
+        db.Index('ix_products_vendor_active_category', 'vendor_id', 'is_active', 'category'),
+        db.Index('ix_products_vendor_active_expiry', 'vendor_id', 'is_active', 'expiry_date'),
+        db.Index('ix_products_vendor_active_created', 'vendor_id', 'is_active', 'created_at'),
+        # Marketplace browse: active products by category
+        db.Index('ix_products_active_category', 'is_active', 'category'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     vendor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -70,6 +81,10 @@ class Product(db.Model):
     is_emergency = db.Column(db.Boolean, default=False)
     discount_percentage = db.Column(db.Float, default=0)
     
+    # Low-stock alerts
+    low_stock_threshold = db.Column(db.Integer)  # None = use LOW_STOCK_THRESHOLD
+    low_stock_alerted = db.Column(db.Boolean, default=False)  # alert sent since last restock
+    
     # Status
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -95,12 +110,41 @@ class Product(db.Model):
         
         return True, "Valid"
     
+    def effective_low_stock_threshold(self, default_threshold):
+        """Per-product threshold, falling back to the marketplace default"""
+        return self.low_stock_threshold if self.low_stock_threshold is not None else default_threshold
+    
+    def deduct_stock(self, quantity, default_threshold):
+        """
+        Deduct sold quantity and evaluate the low-stock threshold
+        
+        Returns True only when stock first drops to or below the threshold;
+        further sales stay silent until the product is restocked.
+        """
+        self.quantity -= quantity
+        
+        if self.low_stock_alerted or self.quantity > self.effective_low_stock_threshold(default_threshold):
+            return False
+        
+        self.low_stock_alerted = True
+        return True
+    
+    def refresh_low_stock_alert(self, default_threshold):
+        """Re-arm the low-stock alert once stock is back above the threshold"""
+        if self.quantity > self.effective_low_stock_threshold(default_threshold):
+            self.low_stock_alerted = False
+    
     def __repr__(self):
         return f'<Product {self.product_name}>'
 
 
 class Order(db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        db.Index('ix_orders_status_created', 'status', 'created_at'),
+        db.Index('ix_orders_payment_status_created', 'payment_status', 'created_at'),
+        db.Index('ix_orders_retailer_created', 'retailer_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.String(50), unique=True, nullable=False, index=True)
@@ -134,8 +178,8 @@ class OrderItem(db.Model):
     __tablename__ = 'order_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, index=True)
     
     quantity = db.Column(db.Integer, nullable=False)
     weight = db.Column(db.Float)  # for weight-based MOQ
@@ -289,3 +333,31 @@ class Driver(db.Model):
     
     def __repr__(self):
         return f'<Driver {self.id}>'
+
+
+class DemandForecast(db.Model):
+    """Nightly per-product demand forecast and suggested stock level"""
+    __tablename__ = 'demand_forecasts'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, unique=True)
+    vendor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    
+    # Demand (units per day)
+    average_daily_demand = db.Column(db.Float, default=0)
+    forecast_daily_demand = db.Column(db.Float, default=0)
+    demand_std = db.Column(db.Float, default=0)
+    
+    # Recommendation
+    cover_days = db.Column(db.Integer)  # days of stock the suggestion covers
+    suggested_stock = db.Column(db.Integer, default=0)
+    
+    # Timestamps
+    history_days = db.Column(db.Integer)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    product = db.relationship('Product', backref=db.backref('demand_forecast', uselist=False, cascade='all, delete-orphan'))
+    
+    def __repr__(self):
+        return f'<DemandForecast Product:{self.product_id} {self.forecast_daily_demand:.1f}/day>'
@@ -0,0 +1,67 @@
+"""
+Analytics Models for FreshConnect Marketplace
+Daily rollup tables maintained on payment and rebuilt by the rollup-sales job
+"""
+
+from app import db
+from datetime import datetime
+
+
+class DailySales(db.Model):
+    """Marketplace-wide paid sales per day"""
+    __tablename__ = 'daily_sales'
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, unique=True)
+
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DailySales {self.day}>'
+
+
+class DailyVendorSales(db.Model):
+    """Paid sales per vendor per day (vendor's own line items only)"""
+    __tablename__ = 'daily_vendor_sales'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'vendor_id', name='uq_daily_vendor_sales_day_vendor'),
+        db.Index('ix_daily_vendor_sales_vendor_day', 'vendor_id', 'day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    vendor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DailyVendorSales {self.day} Vendor:{self.vendor_id}>'
+
+
+class DailyCategorySales(db.Model):
+    """Paid sales per product category per day"""
+    __tablename__ = 'daily_category_sales'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'category', name='uq_daily_category_sales_day_category'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    category = db.Column(db.String(100), nullable=False)
+
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DailyCategorySales {self.day} {self.category}>'
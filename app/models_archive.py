@@ -0,0 +1,74 @@
+"""
+Archive Models for FreshConnect Marketplace
+Cold copies of closed orders and their logistics history, stored on the
+'archive' bind (a separate database, see ARCHIVE_DATABASE_URL)
+"""
+
+from app import db
+from app.models import Order, OrderItem, Payment, User, Product
+from app.models_logistics import DeliveryTrackingEvent, DeliveryNotification
+from datetime import datetime
+
+
+def _archive_table(source, *indexed):
+    """
+    Mirror a hot table's columns on the archive bind
+
+    Foreign keys and unique constraints are dropped (the rows they point
+    at live in another database); ids are kept so archived rows can be
+    found by the same id the hot row had.
+    """
+    columns = [
+        db.Column(column.name, column.type, primary_key=column.primary_key,
+                  nullable=column.nullable, index=column.name in indexed)
+        for column in source.columns
+    ]
+    columns.append(db.Column('archived_at', db.DateTime, default=datetime.utcnow))
+    return db.Table(f'archived_{source.name}', *columns, bind_key='archive')
+
+
+class ArchivedOrder(db.Model):
+    """Closed order moved out of the hot orders table"""
+    __table__ = _archive_table(Order.__table__, 'order_id', 'retailer_id')
+
+    items = db.relationship('ArchivedOrderItem', viewonly=True, order_by='ArchivedOrderItem.id',
+                            primaryjoin='ArchivedOrder.id == foreign(ArchivedOrderItem.order_id)')
+    payment = db.relationship('ArchivedPayment', viewonly=True, uselist=False,
+                              primaryjoin='ArchivedOrder.id == foreign(ArchivedPayment.order_id)')
+    # Users stay in the main database; loaded lazily through their own bind
+    retailer = db.relationship(User, viewonly=True,
+                               primaryjoin='foreign(ArchivedOrder.retailer_id) == User.id')
+
+    def __repr__(self):
+        return f'<ArchivedOrder {self.order_id}>'
+
+
+class ArchivedOrderItem(db.Model):
+    __table__ = _archive_table(OrderItem.__table__, 'order_id')
+
+    product = db.relationship(Product, viewonly=True,
+                              primaryjoin='foreign(ArchivedOrderItem.product_id) == Product.id')
+
+    def __repr__(self):
+        return f'<ArchivedOrderItem {self.id}>'
+
+
+class ArchivedPayment(db.Model):
+    __table__ = _archive_table(Payment.__table__, 'order_id')
+
+    def __repr__(self):
+        return f'<ArchivedPayment {self.transaction_id}>'
+
+
+class ArchivedTrackingEvent(db.Model):
+    __table__ = _archive_table(DeliveryTrackingEvent.__table__, 'order_id', 'assignment_id')
+
+    def __repr__(self):
+        return f'<ArchivedTrackingEvent {self.event_type}>'
+
+
+class ArchivedNotification(db.Model):
+    __table__ = _archive_table(DeliveryNotification.__table__, 'order_id')
+
+    def __repr__(self):
+        return f'<ArchivedNotification {self.notification_type}>'
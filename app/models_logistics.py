@@ -4,6 +4,7 @@ Complete implementation of driver management, delivery tracking, and logistics s
 """
 
 from app import db
+from app.geo import grid_cell
 from datetime import datetime, timedelta
 import json
 
@@ -24,6 +25,10 @@ class LogisticsCost(db.Model):
     max_weight_kg = db.Column(db.Integer)
     delivery_time_minutes = db.Column(db.Integer, default=45)
     
+    # Area centre (pickup/drop point for dispatch when no exact position is known)
+    center_lat = db.Column(db.Float)
+    center_lng = db.Column(db.Float)
+    
     # Status
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -41,6 +46,9 @@ class LogisticsCost(db.Model):
 class DriverEnhanced(db.Model):
     """Enhanced driver model with complete logistics features"""
     __tablename__ = 'drivers_enhanced'
+    __table_args__ = (
+        db.Index('ix_drivers_enhanced_cell_status', 'geo_cell', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, unique=True)
@@ -62,6 +70,12 @@ class DriverEnhanced(db.Model):
     current_location = db.Column(db.String(200))
     current_load_kg = db.Column(db.Float, default=0)
     
+    # Last known position (GPS, or parking area centre) and its dispatch grid cell
+    current_lat = db.Column(db.Float)
+    current_lng = db.Column(db.Float)
+    location_updated_at = db.Column(db.DateTime)
+    geo_cell = db.Column(db.String(32))
+    
     # Status
     status = db.Column(db.String(50), default='off_duty')  # off_duty, available, on_delivery, on_break
     last_active = db.Column(db.DateTime)
@@ -110,6 +124,13 @@ class DriverEnhanced(db.Model):
             return 100.0
         return (self.successful_deliveries / self.total_deliveries) * 100
     
+    def set_position(self, lat, lng, cell_deg):
+        """Record the driver's position and re-bucket them in the dispatch grid"""
+        self.current_lat = lat
+        self.current_lng = lng
+        self.location_updated_at = datetime.utcnow()
+        self.geo_cell = grid_cell(lat, lng, cell_deg)
+    
     def can_take_order(self, weight_kg):
         """Check if driver can take an order of given weight"""
         return (self.is_active and 
@@ -123,6 +144,10 @@ class DriverEnhanced(db.Model):
 class DriverAssignmentEnhanced(db.Model):
     """Enhanced driver assignment with complete tracking"""
     __tablename__ = 'driver_assignments_enhanced'
+    __table_args__ = (
+        # Acceptance-timeout sweep: offers still waiting past their window
+        db.Index('ix_driver_assignments_enhanced_status_offer', 'assignment_status', 'offer_expires_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, unique=True, index=True)
@@ -130,7 +155,16 @@ class DriverAssignmentEnhanced(db.Model):
     
     # Status
     assignment_status = db.Column(db.String(50), default='assigned', index=True)
-    # assigned, accepted, picked_up, in_transit, out_for_delivery, delivered, cancelled
+    # assigned, accepted, picked_up, in_transit, out_for_delivery, delivered, cancelled,
+    # pending_reassignment (rejected/timed out, waiting for the next driver), escalated
+    
+    # Offer to the current driver; re-offered to the next best driver if not accepted in time
+    offer_expires_at = db.Column(db.DateTime)
+    offer_attempts = db.Column(db.Integer, default=1)
+    
+    # Multi-drop trip (planned by batch dispatch); stops are numbered in delivery order
+    trip_id = db.Column(db.String(40), index=True)
+    trip_stop = db.Column(db.Integer)
     
     # Scheduling
     assigned_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -143,15 +177,17 @@ class DriverAssignmentEnhanced(db.Model):
     # Locations
     pickup_location = db.Column(db.String(300), nullable=False)
     delivery_location = db.Column(db.String(300), nullable=False)
-    current_location_lat = db.Column(db.Float)
+    delivery_area = db.Column(db.String(100))  # LogisticsCost area the order was scored and priced for
+    current_location_lat = db.Column(db.Float)  # last kept GPS fix
     current_location_lng = db.Column(db.Float)
+    last_fix_at = db.Column(db.DateTime)
     delivery_location_lat = db.Column(db.Float)
     delivery_location_lng = db.Column(db.Float)
     
     # Load Information
     weight_assigned_kg = db.Column(db.Float, nullable=False)
     weight_delivered_kg = db.Column(db.Float)
-    actual_distance_km = db.Column(db.Float)
+    actual_distance_km = db.Column(db.Float)  # along the GPS trace (TripDistanceService)
     
     # Ratings & Feedback
     retailer_rating_to_driver = db.Column(db.Integer)  # 1-5
@@ -182,6 +218,8 @@ class DriverAssignmentEnhanced(db.Model):
     order = db.relationship('Order', backref='assignment_enhanced', foreign_keys=[order_id])
     tracking_events = db.relationship('DeliveryTrackingEvent', backref='assignment', lazy='dynamic')
     earning_record = db.relationship('DriverEarning', backref='assignment', uselist=False)
+    attempts = db.relationship('DispatchAttempt', backref='assignment', lazy='dynamic',
+                               order_by='DispatchAttempt.offered_at')
     
     @property
     def is_delayed(self):
@@ -209,6 +247,47 @@ class DriverAssignmentEnhanced(db.Model):
         return f'<DriverAssignmentEnhanced Order:{self.order_id}>'
 
 
+class DispatchAttempt(db.Model):
+    """One offer of an order to a driver, and how it ended"""
+    __tablename__ = 'dispatch_attempts'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    assignment_id = db.Column(db.Integer, db.ForeignKey('driver_assignments_enhanced.id'), nullable=False, index=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    driver_id = db.Column(db.Integer, db.ForeignKey('drivers_enhanced.id'), nullable=False)
+    
+    offered_at = db.Column(db.DateTime, default=datetime.utcnow)
+    responded_at = db.Column(db.DateTime)
+    outcome = db.Column(db.String(20), default='offered')  # offered, accepted, rejected, expired
+    reason = db.Column(db.String(200))
+    
+    def __repr__(self):
+        return f'<DispatchAttempt Order:{self.order_id} Driver:{self.driver_id} {self.outcome}>'
+
+
+class DeliveryEta(db.Model):
+    """Learned pickup-to-drop travel time for an area pair and hour of the week (nightly job)"""
+    __tablename__ = 'delivery_etas'
+    __table_args__ = (
+        db.UniqueConstraint('pickup_area', 'delivery_area', 'hour_of_week', name='uq_delivery_etas_pair_hour'),
+    )
+    
+    ALL_HOURS = -1  # hour_of_week of the row pooling every hour of the pair
+    
+    id = db.Column(db.Integer, primary_key=True)
+    pickup_area = db.Column(db.String(100), nullable=False)
+    delivery_area = db.Column(db.String(100), nullable=False)
+    hour_of_week = db.Column(db.Integer, nullable=False)  # 0 = Monday 00:00-01:00 UTC ... 167
+    
+    minutes = db.Column(db.Float, nullable=False)  # ETA_QUANTILE of the observed trips
+    median_minutes = db.Column(db.Float)
+    samples = db.Column(db.Integer, default=0)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<DeliveryEta {self.pickup_area}->{self.delivery_area} h{self.hour_of_week} {self.minutes:.0f}min>'
+
+
 class DriverEarning(db.Model):
     """Driver earnings with detailed breakdown"""
     __tablename__ = 'driver_earnings'
@@ -247,9 +326,10 @@ class DriverEarning(db.Model):
     
     def calculate_total(self):
         """Calculate total earning"""
-        self.total_earning = (self.base_earning + self.on_time_bonus + 
-                            self.quality_bonus - self.cancellation_deduction - 
-                            self.late_delivery_deduction)
+        # Column defaults only apply on insert, so unset components are still None here
+        self.total_earning = ((self.base_earning or 0) + (self.on_time_bonus or 0) + 
+                            (self.quality_bonus or 0) - (self.cancellation_deduction or 0) - 
+                            (self.late_delivery_deduction or 0))
         return self.total_earning
     
     def __repr__(self):
@@ -291,6 +371,9 @@ class DeliveryTrackingEvent(db.Model):
 class DeliveryNotification(db.Model):
     """Notifications for retailers, vendors, and drivers"""
     __tablename__ = 'delivery_notifications'
+    __table_args__ = (
+        db.Index('ix_delivery_notifications_recipient_unread', 'recipient_type', 'recipient_id', 'is_read'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
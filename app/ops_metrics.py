@@ -0,0 +1,100 @@
+"""
+Operational Metrics - Live counters and sliding-window rates
+Counters live in the shared local store so every gunicorn worker adds to
+(and reads) the same numbers without touching the main database
+"""
+
+from app.local_store import local_store
+from flask import current_app
+import sqlite3
+import time
+
+
+class OpsMetrics:
+    """Event counters with per-minute buckets for sliding-window rates"""
+
+    EVENTS = (
+        'orders_created',
+        'payments_succeeded',
+        'payments_failed',
+        'assignments_created',
+        'assignments_rejected',
+        'assignments_expired',
+        'assignments_escalated',
+        'deliveries_completed'
+    )
+    RATE_WINDOWS = (1, 5, 15, 60)  # minutes
+    SUMMARY_WINDOW = 15  # minutes; the dashboard headline, if OPS_METRICS_WINDOW_MINUTES keeps that much
+
+    @staticmethod
+    def record(event, amount=1):
+        """Count an event; never lets a metrics hiccup break the request"""
+        minute = int(time.time() // 60)
+        window = current_app.config['OPS_METRICS_WINDOW_MINUTES']
+        try:
+            local_store.incr(f'ops:total:{event}', amount)
+            local_store.incr(f'ops:minute:{event}:{minute}', amount, ttl=(window + 1) * 60)
+        except sqlite3.Error as e:
+            current_app.logger.warning('ops metric %s not recorded: %s', event, e)
+
+    @staticmethod
+    def drivers_by_status():
+        """Driver counts per status, cached briefly so polling stays off the DB"""
+        from app import db
+        from app.models_logistics import DriverEnhanced
+
+        def count():
+            rows = db.session.query(
+                DriverEnhanced.status, db.func.count(DriverEnhanced.id)
+            ).filter(DriverEnhanced.is_active == True).group_by(DriverEnhanced.status).all()
+            return {status: total for status, total in rows}
+
+        return local_store.cached('ops:drivers_by_status', current_app.config['OPS_DRIVER_COUNT_CACHE_SECONDS'], count)
+
+    @staticmethod
+    def snapshot():
+        """Totals, per-window counts and per-minute rates for every event"""
+        now_minute = int(time.time() // 60)
+        window = current_app.config['OPS_METRICS_WINDOW_MINUTES']
+        values = local_store.get_many('ops:')
+
+        metrics = {}
+        for event in OpsMetrics.EVENTS:
+            buckets = {}
+            prefix = f'ops:minute:{event}:'
+            for key, value in values.items():
+                if key.startswith(prefix):
+                    buckets[int(key[len(prefix):])] = value
+
+            windows = {}
+            for minutes in OpsMetrics.RATE_WINDOWS:
+                if minutes > window:
+                    continue
+                # Current minute is partial, so a window of N covers N-1 full minutes plus now
+                count = sum(v for m, v in buckets.items() if now_minute - m < minutes)
+                windows[f'{minutes}m'] = {'count': count, 'per_minute': round(count / minutes, 2)}
+
+            metrics[event] = {'total': values.get(f'ops:total:{event}', 0), 'windows': windows}
+
+        # Longest reported window up to SUMMARY_WINDOW (the minute buckets may not reach back that far)
+        summary_window = '{}m'.format(max(
+            (m for m in OpsMetrics.RATE_WINDOWS if m <= min(window, OpsMetrics.SUMMARY_WINDOW)),
+            default=OpsMetrics.RATE_WINDOWS[0]
+        ))
+        for event in metrics.values():
+            event['windows'].setdefault(summary_window, {'count': 0, 'per_minute': 0.0})
+
+        drivers = OpsMetrics.drivers_by_status()
+        failed = metrics['payments_failed']['windows'][summary_window]['count']
+        attempts = metrics['payments_succeeded']['windows'][summary_window]['count'] + failed
+
+        return {
+            'generated_at': time.time(),
+            'events': metrics,
+            'summary_window': summary_window,
+            'payment_failure_rate': round(failed / attempts, 3) if attempts else 0.0,
+            'drivers': {
+                'by_status': drivers,
+                'online': sum(n for status, n in drivers.items() if status != 'off_duty')
+            }
+        }
@@ -0,0 +1,119 @@
+"""
+Rate Table - Logistics rates cached in every worker
+logistics_costs is small, so each process keeps a copy and quotes costs
+without a query. Commits that change LogisticsCost bump a version in the
+shared local store and every worker reloads on its next check
+"""
+
+from app.local_store import local_store
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy import event
+import time
+
+VERSION_KEY = 'logistics:rates_version'
+CHANGED_FLAG = 'logistics_rates_changed'  # session.info: this transaction wrote LogisticsCost
+
+# One delivery area's rates; same attribute names as LogisticsCost
+AreaRate = namedtuple('AreaRate', (
+    'area_name', 'base_rate_per_kg', 'area_multiplier', 'minimum_charge', 'delivery_time_minutes',
+    'center_lat', 'center_lng', 'is_active'
+))
+
+# areas: every area by name; active: the ones quoting; default: DEFAULT_AREA's rates (or None)
+Rates = namedtuple('Rates', ('areas', 'active', 'default'))
+
+# This worker's copy: (version, monotonic load time, monotonic time of the last version check, Rates)
+_table = None
+
+
+class RateTable:
+    """Versioned in-process copy of logistics_costs"""
+
+    @staticmethod
+    def load():
+        """Read the whole table (one query)"""
+        from app.models_logistics import LogisticsCost
+        from app.driver_service import DriverAssignmentService
+
+        areas = {
+            area.area_name: AreaRate(
+                area.area_name, area.base_rate_per_kg, area.area_multiplier, area.minimum_charge,
+                area.delivery_time_minutes, area.center_lat, area.center_lng, area.is_active
+            )
+            for area in LogisticsCost.query.all()
+        }
+        return Rates(
+            areas=areas,
+            active={name: area for name, area in areas.items() if area.is_active},
+            default=areas.get(DriverAssignmentService.DEFAULT_AREA)
+        )
+
+    @staticmethod
+    def current():
+        """
+        This worker's rates
+
+        The shared version is checked at most every RATE_TABLE_CHECK_SECONDS
+        and the copy reloaded when it changed (or is older than
+        RATE_TABLE_MAX_AGE_SECONDS, for edits made on another host).
+        """
+        global _table
+        config = current_app.config
+        now = time.monotonic()
+        if _table is not None:
+            version, loaded_at, checked_at, rates = _table
+            if now - checked_at < config['RATE_TABLE_CHECK_SECONDS']:
+                return rates
+            if now - loaded_at < config['RATE_TABLE_MAX_AGE_SECONDS'] and local_store.get(VERSION_KEY, 0) == version:
+                _table = (version, loaded_at, now, rates)
+                return rates
+
+        # Version first: an edit committed while loading triggers another reload at the next check
+        version = local_store.get(VERSION_KEY, 0)
+        rates = RateTable.load()
+        _table = (version, now, now, rates)
+        return rates
+
+    @staticmethod
+    def invalidate():
+        """Make every worker on this host reload the rates"""
+        global _table
+        local_store.incr(VERSION_KEY)
+        _table = None
+
+    @staticmethod
+    def watch(session_class):
+        """Invalidate the rates after any commit that changed LogisticsCost rows"""
+        if event.contains(session_class, 'after_commit', _after_commit):
+            return
+        event.listen(session_class, 'after_flush', _after_flush)
+        event.listen(session_class, 'do_orm_execute', _on_orm_execute)
+        event.listen(session_class, 'after_commit', _after_commit)
+        event.listen(session_class, 'after_rollback', _after_rollback)
+
+
+def _after_flush(session, flush_context):
+    from app.models_logistics import LogisticsCost
+
+    if any(isinstance(obj, LogisticsCost) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info[CHANGED_FLAG] = True
+
+
+def _on_orm_execute(orm_execute_state):
+    """Bulk query(LogisticsCost).update()/delete() skip the flush"""
+    from app.models_logistics import LogisticsCost
+
+    if (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert) and any(
+        mapper.class_ is LogisticsCost for mapper in orm_execute_state.all_mappers
+    ):
+        orm_execute_state.session.info[CHANGED_FLAG] = True
+
+
+def _after_commit(session):
+    if session.info.pop(CHANGED_FLAG, False):
+        RateTable.invalidate()
+
+
+def _after_rollback(session):
+    session.info.pop(CHANGED_FLAG, None)
@@ -0,0 +1,246 @@
+"""
+Reassignment Service - Re-offer rejected and unaccepted orders
+Orders a driver turned down, or didn't accept within the acceptance window,
+go to the next best driver who hasn't been offered them yet; after
+DISPATCH_MAX_ATTEMPTS offers they are escalated to the admins
+"""
+
+from app import db
+from app.models import User
+from app.models_logistics import (
+    DriverAssignmentEnhanced, DispatchAttempt, DeliveryTrackingEvent, DeliveryNotification
+)
+from app.driver_service import DriverAssignmentService
+from app.dispatch_service import DispatchService
+from app.driver_registry import DriverRegistry
+from app.rate_table import RateTable
+from app.ops_metrics import OpsMetrics
+from flask import current_app
+from datetime import datetime, timedelta
+
+
+class ReassignmentService:
+    """Acceptance timeouts, re-offers and escalation"""
+
+    @staticmethod
+    def _offer(assignment, driver):
+        """Point the assignment at a new driver (whose capacity is already reserved)"""
+        now = datetime.utcnow()
+        assignment.driver_id = driver.id
+        assignment.assignment_status = 'assigned'
+        assignment.assigned_at = now
+        assignment.accepted_at = None
+        assignment.offer_expires_at = now + timedelta(seconds=current_app.config['DISPATCH_ACCEPT_WINDOW_SECONDS'])
+        assignment.offer_attempts = (assignment.offer_attempts or 1) + 1
+        assignment.attempts.append(DispatchAttempt(order_id=assignment.order_id, driver_id=driver.id))
+
+    @staticmethod
+    def _escalate(assignments):
+        """Give up on automatic dispatch for these assignments and tell the admins"""
+        if not assignments:
+            return
+        admin_ids = db.session.scalars(db.select(User.id).where(User.user_type == 'admin')).all()
+        for assignment in assignments:
+            assignment.assignment_status = 'escalated'
+        if admin_ids:
+            db.session.execute(db.insert(DeliveryNotification), [
+                dict(order_id=assignment.order_id, assignment_id=assignment.id,
+                     recipient_type='admin', recipient_id=admin_id,
+                     notification_type='dispatch_escalated', title='Order needs manual dispatch',
+                     message=f'No driver accepted order #{assignment.order_id} after {assignment.offer_attempts} offer(s)')
+                for assignment in assignments for admin_id in admin_ids
+            ])
+
+    @staticmethod
+    def _delivery_area(assignment):
+        """Area the order is delivered to; older assignments get it from the order's city, as dispatch does"""
+        if assignment.delivery_area:
+            return assignment.delivery_area
+        city = (assignment.order.delivery_city or '').lower()
+        for name in RateTable.current().active:
+            if name.lower() == city:
+                return name
+        return DriverAssignmentService.DEFAULT_AREA
+
+    @staticmethod
+    def reoffer(assignment):
+        """
+        Offer one pending assignment to the next best driver right away
+
+        Leaves it pending (for the next sweep) when nobody suitable is free.
+        Returns (offered, message).
+        """
+        try:
+            if (assignment.offer_attempts or 1) >= current_app.config['DISPATCH_MAX_ATTEMPTS']:
+                ReassignmentService._escalate([assignment])
+                db.session.commit()
+                OpsMetrics.record('assignments_escalated')
+                return False, "Escalated to admins"
+
+            tried = {attempt.driver_id for attempt in assignment.attempts}
+            pickup_point = DriverAssignmentService.area_point(assignment.pickup_location) or \
+                DriverAssignmentService.area_point(DriverAssignmentService.DEFAULT_AREA)
+
+            for _attempt in range(DriverAssignmentService.RESERVE_ATTEMPTS):
+                driver, message = DriverAssignmentService.find_best_driver(
+                    assignment.weight_assigned_kg, ReassignmentService._delivery_area(assignment),
+                    pickup_point=pickup_point, exclude_ids=tried
+                )
+                if not driver:
+                    return False, message
+                if DriverAssignmentService.reserve_capacity(driver, assignment.weight_assigned_kg):
+                    break
+                tried.add(driver.id)
+            else:
+                return False, "Drivers are being assigned concurrently"
+
+            ReassignmentService._offer(assignment, driver)
+            db.session.commit()
+            DriverRegistry.publish(driver)
+
+        except Exception as e:
+            db.session.rollback()
+            return False, str(e)
+
+        DriverAssignmentService.create_tracking_event(
+            assignment_id=assignment.id,
+            driver_id=driver.id,
+            order_id=assignment.order_id,
+            event_type='reassigned',
+            event_description=f'Order re-offered to driver {driver.name}'
+        )
+        DriverAssignmentService.create_notification(
+            order_id=assignment.order_id,
+            assignment_id=assignment.id,
+            recipient_type='driver',
+            recipient_id=driver.user_id,
+            notification_type='new_delivery_assignment',
+            title='New Delivery Assignment',
+            message=f'New order to deliver {assignment.weight_assigned_kg}kg'
+        )
+        return True, f"Re-offered to driver {driver.name}"
+
+    @staticmethod
+    def expire_offers():
+        """
+        Take back every offer not accepted within its window, in one pass
+
+        One UPDATE claims all expired offers, one releases the drivers'
+        capacity and one closes their attempts. Returns the number expired.
+        """
+        now = datetime.utcnow()
+        try:
+            expired = db.session.execute(
+                db.update(DriverAssignmentEnhanced).where(
+                    DriverAssignmentEnhanced.assignment_status == 'assigned',
+                    DriverAssignmentEnhanced.offer_expires_at < now
+                ).values(
+                    assignment_status='pending_reassignment', cancellation_reason='Not accepted in time'
+                ).returning(
+                    DriverAssignmentEnhanced.id, DriverAssignmentEnhanced.driver_id,
+                    DriverAssignmentEnhanced.order_id, DriverAssignmentEnhanced.weight_assigned_kg
+                ).execution_options(synchronize_session=False)
+            ).all()
+            if not expired:
+                db.session.rollback()
+                return 0
+
+            released = {}
+            for _id, driver_id, _order_id, weight in expired:
+                released[driver_id] = released.get(driver_id, 0) + weight
+            DriverAssignmentService.release_capacity_many(released)
+            DriverAssignmentService.close_attempts([row.id for row in expired], 'expired')
+            db.session.execute(db.insert(DeliveryTrackingEvent), [
+                dict(assignment_id=row.id, driver_id=row.driver_id, order_id=row.order_id,
+                     event_type='offer_expired', event_description='Driver did not accept in time')
+                for row in expired
+            ])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        OpsMetrics.record('assignments_expired', len(expired))
+        DriverRegistry.publish_ids(set(released))
+        return len(expired)
+
+    @staticmethod
+    def reoffer_pending(limit=None):
+        """
+        Re-offer every pending assignment in one batch matching
+
+        Each order is kept away from drivers it was already offered to.
+        Returns (reoffered, escalated, still waiting).
+        """
+        config = current_app.config
+        pending = DriverAssignmentEnhanced.query.filter_by(
+            assignment_status='pending_reassignment'
+        ).order_by(DriverAssignmentEnhanced.assigned_at).limit(limit or config['DISPATCH_BATCH_MAX_ORDERS']).all()
+        if not pending:
+            return 0, 0, 0
+
+        exhausted = [a for a in pending if (a.offer_attempts or 1) >= config['DISPATCH_MAX_ATTEMPTS']]
+        pending = [a for a in pending if (a.offer_attempts or 1) < config['DISPATCH_MAX_ATTEMPTS']]
+
+        tried = {}
+        if pending:
+            for assignment_id, driver_id in db.session.execute(
+                db.select(DispatchAttempt.assignment_id, DispatchAttempt.driver_id)
+                .where(DispatchAttempt.assignment_id.in_([a.id for a in pending]))
+            ):
+                tried.setdefault(assignment_id, set()).add(driver_id)
+
+        drivers = DispatchService.available_drivers() if pending else []
+        position = {driver.id: i for i, driver in enumerate(drivers)}
+        default_point = DriverAssignmentService.area_point(DriverAssignmentService.DEFAULT_AREA)
+        points = {}
+        for assignment in pending:
+            if assignment.pickup_location not in points:
+                points[assignment.pickup_location] = \
+                    DriverAssignmentService.area_point(assignment.pickup_location) or default_point
+
+        matches = DispatchService.match_orders(
+            DispatchService.driver_arrays(drivers),
+            [(a.weight_assigned_kg, ReassignmentService._delivery_area(a), points[a.pickup_location]) for a in pending],
+            excluded=[[position[d] for d in tried.get(a.id, ()) if d in position] for a in pending]
+        )
+
+        try:
+            offered = []
+            for job, driver_index, _score in matches:
+                assignment, driver = pending[job], drivers[driver_index]
+                if DriverAssignmentService.reserve_capacity(driver, assignment.weight_assigned_kg):
+                    ReassignmentService._offer(assignment, driver)
+                    offered.append((assignment, driver))
+            ReassignmentService._escalate(exhausted)
+            db.session.flush()
+
+            if offered:
+                db.session.execute(db.insert(DeliveryTrackingEvent), [
+                    dict(assignment_id=assignment.id, driver_id=driver.id, order_id=assignment.order_id,
+                         event_type='reassigned', event_description=f'Order re-offered to driver {driver.name}')
+                    for assignment, driver in offered
+                ])
+                db.session.execute(db.insert(DeliveryNotification), [
+                    dict(order_id=assignment.order_id, assignment_id=assignment.id,
+                         recipient_type='driver', recipient_id=driver.user_id,
+                         notification_type='new_delivery_assignment', title='New Delivery Assignment',
+                         message=f'New order to deliver {assignment.weight_assigned_kg}kg')
+                    for assignment, driver in offered
+                ])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if exhausted:
+            OpsMetrics.record('assignments_escalated', len(exhausted))
+        DriverRegistry.publish_ids({driver.id for _assignment, driver in offered})
+        return len(offered), len(exhausted), len(pending) - len(offered)
+
+    @staticmethod
+    def sweep():
+        """Scheduled dispatch loop: expire stale offers, then re-offer everything pending"""
+        expired = ReassignmentService.expire_offers()
+        reoffered, escalated, waiting = ReassignmentService.reoffer_pending()
+        return {'expired': expired, 'reoffered': reoffered, 'escalated': escalated, 'waiting': waiting}
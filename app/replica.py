@@ -0,0 +1,114 @@
+"""
+Read Replica Routing - Send reporting reads to the 'reader' bind
+Requests marked with @read_replica (or code inside `with use_replica():`)
+run their SELECTs on READ_REPLICA_URL while it is within the lag tolerance;
+writes and flushes always go to the primary
+"""
+
+from app.local_store import local_store
+from contextlib import contextmanager
+from flask import current_app, g
+from flask_sqlalchemy.session import Session
+from functools import wraps
+import os
+import time
+
+REPLICA_BIND = 'reader'
+LAG_CACHE_KEY = 'replica:lag'
+
+
+class RoutingSession(Session):
+    """db.session that routes default-bind reads to the replica when asked to"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+        if bind is None and not self._flushing and not getattr(clause, 'is_dml', False) \
+                and g and g.get('use_replica') and engine is self._db.engines.get(None):
+            return replica_engine() or engine
+
+        return engine
+
+
+def measure_lag(engine, primary):
+    """
+    Seconds the replica is behind the primary
+
+    PostgreSQL standbys report their replay position; a standby that has
+    replayed everything it received counts as current. For a copied SQLite
+    file the lag is how much older the copy is than the primary file.
+    A database that isn't a standby (e.g. a second local Postgres) is 0.
+    """
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as conn:
+            return float(conn.exec_driver_sql(
+                'SELECT COALESCE(CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END, 0)'
+            ).scalar())
+
+    if engine.dialect.name == 'sqlite' and primary.dialect.name == 'sqlite':
+        return max(0.0, os.path.getmtime(primary.url.database) - os.path.getmtime(engine.url.database))
+
+    return 0.0
+
+
+def replica_status():
+    """{'lag': seconds or None, 'error': message or None}, cached for REPLICA_LAG_CHECK_SECONDS"""
+    from app import db
+
+    def check():
+        try:
+            return {'lag': measure_lag(db.engines[REPLICA_BIND], db.engines[None]), 'error': None, 'checked_at': time.time()}
+        except Exception as e:  # unreachable replica, missing file, ...
+            return {'lag': None, 'error': str(e), 'checked_at': time.time()}
+
+    return local_store.cached(LAG_CACHE_KEY, current_app.config['REPLICA_LAG_CHECK_SECONDS'], check)
+
+
+def replica_engine():
+    """
+    The replica engine if one is configured and healthy, else None
+
+    Decided once per request (or use_replica block) so every query in it
+    sees the same database.
+    """
+    if 'replica_engine' not in g:
+        from app import db
+
+        engine = None
+        if REPLICA_BIND in db.engines:
+            status = replica_status()
+            if status['error']:
+                current_app.logger.warning('read replica unavailable, using primary: %s', status['error'])
+            elif status['lag'] > current_app.config['REPLICA_MAX_LAG_SECONDS']:
+                current_app.logger.info('read replica %.1fs behind, using primary', status['lag'])
+            else:
+                engine = db.engines[REPLICA_BIND]
+        g.replica_engine = engine
+
+    return g.replica_engine
+
+
+@contextmanager
+def use_replica():
+    """Route reads inside the block to the replica"""
+    previous = g.get('use_replica', False)
+    g.use_replica = True
+    try:
+        yield
+    finally:
+        g.use_replica = previous
+
+
+def read_replica(f):
+    """
+    Serve a read-only view from the replica
+
+    The flag stays set for the rest of the request so streamed responses,
+    whose queries run after the view returns, read from the replica too.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.use_replica = True
+        return f(*args, **kwargs)
+    return decorated_function
@@ -1,69 +1,67 @@
-from flask import render_template, redirect, url_for, flash, request
+from flask import render_template, redirect, url_for, flash, request, current_app, jsonify
 from flask_login import current_user, login_required
+from sqlalchemy.orm import joinedload
 from app.routes import admin_bp
-from app.models import User, Product, Order, Payment
+from app.models import User, Product, Order, OrderItem, Payment
 from app.decorators import admin_required
+from app.analytics_service import AnalyticsService
+from app.cohort_service import CohortAnalysisService
+from app.ops_metrics import OpsMetrics
+from app.replica import read_replica
+from app.utils import keyset_paginate, export_response, like_contains
 from app import db
+from datetime import datetime, timedelta
 
 @admin_bp.route('/dashboard')
 @login_required
 @admin_required
+@read_replica
 def dashboard():
     """Admin dashboard"""
-    # Get statistics
-    total_users = User.query.count()
-    vendors = User.query.filter_by(user_type='vendor').count()
-    retailers = User.query.filter_by(user_type='retailer').count()
-    companies = User.query.filter_by(user_type='company').count()
-    
-    total_products = Product.query.count()
-    active_products = Product.query.filter_by(is_active=True).count()
-    emergency_products = Product.query.filter_by(is_emergency=True).count()
-    
-    total_orders = Order.query.count()
-    pending_orders = Order.query.filter_by(status='pending').count()
-    completed_orders = Order.query.filter_by(status='delivered').count()
-    
-    # Revenue
-    total_revenue = db.session.query(db.func.sum(Order.total_amount)).filter_by(payment_status='paid').scalar() or 0
-    
-    # Products by category
-    categories = db.session.query(
-        Product.category,
-        db.func.count(Product.id)
-    ).group_by(Product.category).all()
-    
-    # Recent orders
-    recent_orders = Order.query.order_by(Order.created_at.desc()).limit(10).all()
-    
-    return render_template('admin/dashboard.html',
-                         total_users=total_users,
-                         vendors=vendors,
-                         retailers=retailers,
-                         companies=companies,
-                         total_products=total_products,
-                         active_products=active_products,
-                         emergency_products=emergency_products,
-                         total_orders=total_orders,
-                         pending_orders=pending_orders,
-                         completed_orders=completed_orders,
-                         total_revenue=total_revenue,
-                         categories=categories,
-                         recent_orders=recent_orders)
+    snapshot = AnalyticsService.get_dashboard_snapshot(refresh=request.args.get('refresh') == '1')
+    return render_template('admin/dashboard.html', **snapshot)
+
+@admin_bp.route('/ops/metrics')
+@login_required
+@admin_required
+@read_replica
+def ops_metrics():
+    """Live operational counters as JSON (polled by the dashboard widget)"""
+    return jsonify(OpsMetrics.snapshot())
 
 @admin_bp.route('/users')
 @login_required
 @admin_required
+@read_replica
 def users():
     """Manage users"""
     user_type = request.args.get('type', 'all')
+    status = request.args.get('status', 'all')
+    search = request.args.get('search', '')
+    
+    query = User.query
     
-    if user_type == 'all':
-        users = User.query.all()
-    else:
-        users = User.query.filter_by(user_type=user_type).all()
+    if user_type != 'all':
+        query = query.filter(User.user_type == user_type)
     
-    return render_template('admin/users.html', users=users, user_type=user_type)
+    if status == 'active':
+        query = query.filter(User.is_active == True)
+    elif status == 'inactive':
+        query = query.filter(User.is_active == False)
+    
+    if search:
+        query = query.filter(db.or_(like_contains(User.name, search), like_contains(User.email, search)))
+    
+    page = keyset_paginate(query, [User.id],
+                           after=request.args.get('after'),
+                           before=request.args.get('before'),
+                           per_page=current_app.config['ITEMS_PER_PAGE'])
+    
+    return render_template('admin/users.html',
+                         users=page.items,
+                         page=page,
+                         user_type=user_type,
+                         filters={'type': user_type, 'status': status, 'search': search})
 
 @admin_bp.route('/users/<int:user_id>/toggle-status', methods=['POST'])
 @login_required
@@ -81,54 +79,193 @@ def toggle_user_status(user_id):
 @admin_bp.route('/products')
 @login_required
 @admin_required
+@read_replica
 def products():
     """Manage products"""
-    products = Product.query.all()
-    return render_template('admin/products.html', products=products)
+    category = request.args.get('category', '')
+    status = request.args.get('status', 'all')
+    search = request.args.get('search', '')
+    emergency = request.args.get('emergency') == '1'
+    
+    query = Product.query.options(joinedload(Product.vendor))
+    
+    if status == 'active':
+        query = query.filter(Product.is_active == True)
+    elif status == 'inactive':
+        query = query.filter(Product.is_active == False)
+    
+    if category:
+        query = query.filter(Product.category == category)
+    
+    if emergency:
+        query = query.filter(Product.is_emergency == True)
+    
+    if search:
+        query = query.filter(like_contains(Product.product_name, search))
+    
+    page = keyset_paginate(query, [Product.id],
+                           after=request.args.get('after'),
+                           before=request.args.get('before'),
+                           per_page=current_app.config['ITEMS_PER_PAGE'])
+    
+    # Read fresh (a covering-index scan) so a new category shows up as soon as it's added
+    categories = db.session.scalars(db.select(Product.category).distinct().order_by(Product.category)).all()
+    
+    return render_template('admin/products.html',
+                         products=page.items,
+                         page=page,
+                         categories=categories,
+                         filters={'category': category, 'status': status, 'search': search,
+                                  'emergency': '1' if emergency else ''})
 
 @admin_bp.route('/orders')
 @login_required
 @admin_required
+@read_replica
 def orders():
     """Manage orders"""
     status = request.args.get('status', 'all')
+    payment_status = request.args.get('payment_status', 'all')
+    search = request.args.get('search', '')
+    date_from = request.args.get('date_from', '')
+    date_to = request.args.get('date_to', '')
+    
+    query = Order.query.options(joinedload(Order.retailer))
+    
+    if status != 'all':
+        query = query.filter(Order.status == status)
+    
+    if payment_status != 'all':
+        query = query.filter(Order.payment_status == payment_status)
     
-    if status == 'all':
-        orders = Order.query.order_by(Order.created_at.desc()).all()
-    else:
-        orders = Order.query.filter_by(status=status).order_by(Order.created_at.desc()).all()
+    if search:
+        query = query.filter(like_contains(Order.order_id, search))
     
-    return render_template('admin/orders.html', orders=orders, status_filter=status)
+    try:
+        if date_from:
+            query = query.filter(Order.created_at >= datetime.strptime(date_from, '%Y-%m-%d'))
+        if date_to:
+            query = query.filter(Order.created_at < datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1))
+    except ValueError:
+        flash('Invalid date filter, expected YYYY-MM-DD', 'warning')
+    
+    page = keyset_paginate(query, [Order.created_at, Order.id],
+                           after=request.args.get('after'),
+                           before=request.args.get('before'),
+                           per_page=current_app.config['ITEMS_PER_PAGE'])
+    
+    # Item counts for this page from one grouped query
+    item_counts = {}
+    if page.items:
+        item_counts = dict(db.session.query(
+            OrderItem.order_id, db.func.count(OrderItem.id)
+        ).filter(
+            OrderItem.order_id.in_([order.id for order in page.items])
+        ).group_by(OrderItem.order_id).all())
+    
+    return render_template('admin/orders.html',
+                         orders=page.items,
+                         page=page,
+                         item_counts=item_counts,
+                         status_filter=status,
+                         filters={'status': status, 'payment_status': payment_status, 'search': search,
+                                  'date_from': date_from, 'date_to': date_to})
 
 @admin_bp.route('/analytics')
 @login_required
 @admin_required
+@read_replica
 def analytics():
     """View analytics"""
-    # Revenue over time (last 30 days)
-    from datetime import datetime, timedelta
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    
-    daily_revenue = db.session.query(
-        db.func.date(Order.created_at).label('date'),
-        db.func.sum(Order.total_amount).label('revenue')
-    ).filter(
-        Order.payment_status == 'paid',
-        Order.created_at >= thirty_days_ago
-    ).group_by(db.func.date(Order.created_at)).all()
-    
-    # Top vendors by revenue
-    top_vendors = db.session.query(
-        User.name,
-        db.func.sum(OrderItem.subtotal).label('revenue')
-    ).join(Product, User.id == Product.vendor_id)\
-     .join(OrderItem, Product.id == OrderItem.product_id)\
-     .join(Order, OrderItem.order_id == Order.id)\
-     .filter(Order.payment_status == 'paid')\
-     .group_by(User.id)\
-     .order_by(db.desc('revenue'))\
-     .limit(10).all()
+    # All figures come from the daily rollup tables (see AnalyticsService.rebuild_rollups)
+    daily_revenue = AnalyticsService.get_daily_revenue(days=30)
+    top_vendors = AnalyticsService.get_top_vendors(limit=10)
+    category_sales = AnalyticsService.get_category_sales(days=30)
     
     return render_template('admin/analytics.html',
                          daily_revenue=daily_revenue,
-                         top_vendors=top_vendors)
+                         top_vendors=top_vendors,
+                         category_sales=category_sales)
+
+@admin_bp.route('/analytics/cohorts')
+@login_required
+@admin_required
+@read_replica
+def cohorts():
+    """Monthly retailer cohort retention by credit tier"""
+    report = CohortAnalysisService.get_cohorts(refresh=request.args.get('refresh') == '1')
+    tier = request.args.get('tier', 'all')
+    if tier != 'all' and tier not in report['tiers']:
+        tier = 'all'
+    
+    return render_template('admin/cohorts.html',
+                         report=report,
+                         tier=tier,
+                         selected=report['all'] if tier == 'all' else report['tiers'][tier])
+
+ORDER_EXPORT_COLUMNS = ['order_id', 'created_at', 'status', 'payment_status', 'retailer_id',
+                        'total_amount', 'delivery_city', 'delivery_pincode', 'confirmed_at', 'delivered_at',
+                        'transaction_id', 'payment_method', 'payment_result', 'payment_amount', 'paid_at']
+ORDER_ITEM_EXPORT_COLUMNS = ['product_id', 'product_name', 'quantity', 'weight', 'price_at_purchase', 'subtotal']
+
+def nest_order_items(rows):
+    """Collapse consecutive order/item join rows into one row per order with an items list"""
+    order_width = len(ORDER_EXPORT_COLUMNS)
+    current_key, current_row, items = None, None, []
+    
+    for row in rows:
+        key = row[0]
+        if key != current_key:
+            if current_row is not None:
+                yield current_row + (items,)
+            current_key, current_row, items = key, tuple(row[:order_width]), []
+        if row[order_width] is not None:
+            items.append(dict(zip(ORDER_ITEM_EXPORT_COLUMNS, row[order_width:])))
+    
+    if current_row is not None:
+        yield current_row + (items,)
+
+@admin_bp.route('/orders/export')
+@login_required
+@admin_required
+@read_replica
+def export_orders():
+    """Stream the order book with items and payments as CSV or NDJSON"""
+    export_format = request.args.get('format', 'csv')
+    status = request.args.get('status', 'all')
+    payment_status = request.args.get('payment_status', 'all')
+    date_from = request.args.get('date_from', '')
+    date_to = request.args.get('date_to', '')
+    
+    query = db.session.query(
+        Order.order_id, Order.created_at, Order.status, Order.payment_status, Order.retailer_id,
+        Order.total_amount, Order.delivery_city, Order.delivery_pincode, Order.confirmed_at, Order.delivered_at,
+        Payment.transaction_id, Payment.payment_method, Payment.payment_status, Payment.amount, Payment.completed_at,
+        OrderItem.product_id, Product.product_name, OrderItem.quantity, OrderItem.weight,
+        OrderItem.price_at_purchase, OrderItem.subtotal
+    ).outerjoin(Payment, Payment.order_id == Order.id)\
+     .outerjoin(OrderItem, OrderItem.order_id == Order.id)\
+     .outerjoin(Product, OrderItem.product_id == Product.id)
+    
+    if status != 'all':
+        query = query.filter(Order.status == status)
+    
+    if payment_status != 'all':
+        query = query.filter(Order.payment_status == payment_status)
+    
+    try:
+        if date_from:
+            query = query.filter(Order.created_at >= datetime.strptime(date_from, '%Y-%m-%d'))
+        if date_to:
+            query = query.filter(Order.created_at < datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1))
+    except ValueError:
+        flash('Invalid date filter, expected YYYY-MM-DD', 'warning')
+        return redirect(url_for('admin.orders'))
+    
+    # Ordered by order so each order's item rows arrive together
+    rows = query.order_by(Order.id, OrderItem.id).yield_per(current_app.config['EXPORT_BATCH_SIZE'])
+    
+    filename = f"orders_{datetime.utcnow().strftime('%Y%m%d')}"
+    if export_format == 'ndjson':
+        return export_response(nest_order_items(rows), ORDER_EXPORT_COLUMNS + ['items'], 'ndjson', filename)
+    return export_response(rows, ORDER_EXPORT_COLUMNS + ORDER_ITEM_EXPORT_COLUMNS, 'csv', filename)
@@ -13,6 +13,8 @@ from app.models_logistics import (
     DeliveryTrackingEvent, DeliveryNotification, DriverPerformanceMetrics
 )
 from app.driver_service import DriverAssignmentService
+from app.driver_registry import DriverRegistry
+from app.distance_service import TripDistanceService
 from app import db
 from datetime import datetime, timedelta
 
@@ -142,9 +144,10 @@ def assignment_details(assignment_id):
         flash('Access denied', 'danger')
         return redirect(url_for('driver_enhanced.assignments_enhanced'))
     
-    # Get tracking events
-    tracking_events = DeliveryTrackingEvent.query.filter_by(
-        assignment_id=assignment_id
+    # Get tracking events (not the GPS trace points)
+    tracking_events = DeliveryTrackingEvent.query.filter(
+        DeliveryTrackingEvent.assignment_id == assignment_id,
+        DeliveryTrackingEvent.event_type != TripDistanceService.FIX_EVENT
     ).order_by(DeliveryTrackingEvent.timestamp.desc()).all()
     
     return render_template('driver/assignment_details.html',
@@ -177,23 +180,13 @@ def reject_assignment(assignment_id):
     
     reason = request.form.get('reason', 'Driver not available')
     
-    driver = DriverEnhanced.query.filter_by(user_id=current_user.id).first()
-    assignment = DriverAssignmentEnhanced.query.get_or_404(assignment_id)
-    
-    if assignment.driver_id != driver.id:
-        flash('Access denied', 'danger')
-        return redirect(url_for('driver_enhanced.assignments_enhanced'))
-    
-    # Reject assignment
-    assignment.assignment_status = 'cancelled'
-    assignment.cancellation_reason = reason
-    
-    # Release driver load
-    driver.current_load_kg -= assignment.weight_assigned_kg
+    success, message = DriverAssignmentService.reject_assignment(assignment_id, current_user.id, reason)
     
-    db.session.commit()
+    if success:
+        flash(message, 'info')
+    else:
+        flash(message, 'danger')
     
-    flash(f'Assignment rejected: {reason}', 'info')
     return redirect(url_for('driver_enhanced.assignments_enhanced'))
 
 
@@ -248,6 +241,25 @@ def mark_in_transit(assignment_id):
     return jsonify({'success': True, 'message': 'Status updated to in transit'})
 
 
+@driver_enhanced_bp.route('/location', methods=['POST'])
+@login_required
+@driver_required
+def update_location():
+    """Driver app reports its current GPS position"""
+    
+    data = request.get_json(silent=True) or request.form
+    try:
+        lat, lng = float(data['lat']), float(data['lng'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'lat and lng are required'}), 400
+    
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return jsonify({'success': False, 'message': 'Invalid coordinates'}), 400
+    
+    success, message = DriverAssignmentService.update_driver_location(current_user.id, lat, lng)
+    return jsonify({'success': success, 'message': message}), 200 if success else 400
+
+
 @driver_enhanced_bp.route('/assignments/<int:assignment_id>/near-delivery', methods=['POST'])
 @login_required
 @driver_required
@@ -497,6 +509,7 @@ def toggle_status():
     
     driver.last_active = datetime.utcnow()
     db.session.commit()
+    DriverRegistry.publish(driver)
     
     return redirect(url_for('driver_enhanced.dashboard_enhanced'))
 
@@ -516,6 +529,7 @@ def take_break():
     driver.status = 'on_break'
     driver.last_active = datetime.utcnow()
     db.session.commit()
+    DriverRegistry.publish(driver)
     
     flash('You are now ON BREAK', 'info')
     return redirect(url_for('driver_enhanced.dashboard_enhanced'))
@@ -1,9 +1,13 @@
-from flask import render_template, redirect, url_for, flash, request, session, jsonify
+from flask import render_template, redirect, url_for, flash, request, session, jsonify, current_app, abort
 from flask_login import current_user, login_required
 from app.routes import retailer_bp
 from app.models import Product, Order, OrderItem, Payment, RetailerCredit
 from app.decorators import retailer_required
-from app.utils import generate_order_id, generate_transaction_id, validate_card_number
+from app.utils import generate_order_id, generate_transaction_id, validate_card_number, like_contains
+from app.models_logistics import DeliveryNotification
+from app.analytics_service import AnalyticsService
+from app.archive_service import ArchiveService
+from app.ops_metrics import OpsMetrics
 from app import db
 from datetime import datetime
 
@@ -45,7 +49,7 @@ def browse():
         query = query.filter_by(category=category)
     
     if search:
-        query = query.filter(Product.product_name.like(f'%{search}%'))
+        query = query.filter(like_contains(Product.product_name, search))
     
     products = query.paginate(page=page, per_page=20, error_out=False)
     categories = db.session.query(Product.category).distinct().all()
@@ -183,6 +187,7 @@ def checkout():
                 db.session.add(order_item)
             
             db.session.commit()
+            OpsMetrics.record('orders_created')
             
             # Clear cart
             session.pop('cart', None)
@@ -203,6 +208,19 @@ def checkout():
     
     return render_template('retailer/checkout.html', cart=cart, total=total)
 
+def low_stock_notification(order, product, default_threshold):
+    """Build (but don't commit) a low-stock alert for the product's vendor"""
+    threshold = product.effective_low_stock_threshold(default_threshold)
+    return DeliveryNotification(
+        order_id=order.id,
+        recipient_type='vendor',
+        recipient_id=product.vendor_id,
+        notification_type='low_stock_alert',
+        title=f'Low stock: {product.product_name}',
+        message=f'Only {product.quantity} {product.unit} left (alert threshold {threshold} {product.unit})',
+        action_url=url_for('vendor.edit_product', product_id=product.id)
+    )
+
 @retailer_bp.route('/payment/<int:order_id>', methods=['GET', 'POST'])
 @login_required
 @retailer_required
@@ -243,10 +261,16 @@ def payment(order_id):
                 order.status = 'confirmed'
                 order.confirmed_at = datetime.utcnow()
                 
-                # Deduct inventory
-                for item in order.items:
+                # Deduct inventory, queueing low-stock alerts as thresholds are crossed
+                items = order.items.all()
+                low_stock = current_app.config['LOW_STOCK_THRESHOLD']
+                for item in items:
                     product = item.product
-                    product.quantity -= item.quantity
+                    if product.deduct_stock(item.quantity, low_stock):
+                        db.session.add(low_stock_notification(order, product, low_stock))
+                
+                # Fold into the daily sales rollups
+                AnalyticsService.record_paid_order(order, items)
                 
                 # Update credit score
                 credit = RetailerCredit.query.filter_by(retailer_id=current_user.id).first()
@@ -259,6 +283,7 @@ def payment(order_id):
             
             db.session.add(payment)
             db.session.commit()
+            OpsMetrics.record('payments_succeeded' if payment_success else 'payments_failed')
             
             if payment_success:
                 return redirect(url_for('retailer.order_detail', order_id=order.id))
@@ -284,7 +309,10 @@ def orders():
 @retailer_required
 def order_detail(order_id):
     """View order details"""
-    order = Order.query.get_or_404(order_id)
+    # Old closed orders live in the archive database
+    order = ArchiveService.get_order(order_id)
+    if order is None:
+        abort(404)
     
     # Check ownership
     if order.retailer_id != current_user.id:
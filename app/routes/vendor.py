@@ -1,11 +1,15 @@
-from flask import render_template, redirect, url_for, flash, request
+from flask import render_template, redirect, url_for, flash, request, current_app
 from flask_login import current_user, login_required
+from sqlalchemy.orm import joinedload, contains_eager
 from app.routes import vendor_bp
 from app.models import Product, Order, OrderItem
 from app.decorators import vendor_required
-from app.utils import save_product_image, delete_product_image, calculate_days_to_expiry, get_discount_percentage
+from app.forecast_service import DemandForecastService
+from app.models_logistics import DeliveryNotification
+from app.replica import read_replica
+from app.utils import save_product_image, delete_product_image, calculate_days_to_expiry, get_discount_percentage, export_response, like_contains
 from app import db
-from datetime import datetime
+from datetime import datetime, timedelta
 
 @vendor_bp.route('/dashboard')
 @login_required
@@ -27,19 +31,119 @@ def dashboard():
     total_revenue = sum(item.subtotal for order in orders if order.payment_status == 'paid' 
                        for item in order.items if item.product.vendor_id == current_user.id)
     
+    # Restock suggestions from the nightly demand forecast
+    stock_suggestions = DemandForecastService.get_vendor_suggestions(current_user.id)
+    
+    # Unread low-stock alerts
+    low_stock_alerts = DeliveryNotification.query.filter_by(
+        recipient_type='vendor',
+        recipient_id=current_user.id,
+        notification_type='low_stock_alert',
+        is_read=False
+    ).order_by(DeliveryNotification.created_at.desc()).limit(10).all()
+    
     return render_template('vendor/dashboard.html',
                          products=products,
                          active_product_count=len(active_products),
                          pending_order_count=len(pending_orders),
-                         total_revenue=total_revenue)
+                         total_revenue=total_revenue,
+                         stock_suggestions=stock_suggestions,
+                         low_stock_alerts=low_stock_alerts)
+
+PRODUCT_SORT_COLUMNS = {
+    'name': Product.product_name,
+    'category': Product.category,
+    'price': Product.price,
+    'stock': Product.quantity,
+    'expiry': Product.expiry_date,
+    'created': Product.created_at
+}
+
+@vendor_bp.route('/alerts/<int:notification_id>/dismiss', methods=['POST'])
+@login_required
+@vendor_required
+def dismiss_alert(notification_id):
+    """Mark a vendor alert as read"""
+    notification = DeliveryNotification.query.get_or_404(notification_id)
+    
+    if notification.recipient_type != 'vendor' or notification.recipient_id != current_user.id:
+        flash('Access denied', 'danger')
+        return redirect(url_for('vendor.dashboard'))
+    
+    notification.is_read = True
+    notification.read_at = datetime.utcnow()
+    db.session.commit()
+    
+    return redirect(url_for('vendor.dashboard'))
 
 @vendor_bp.route('/products')
 @login_required
 @vendor_required
 def products():
     """List vendor's products"""
-    products = Product.query.filter_by(vendor_id=current_user.id).all()
-    return render_template('vendor/products.html', products=products)
+    search = request.args.get('search', '')
+    category = request.args.get('category', '')
+    status = request.args.get('status', 'all')  # all, active, inactive
+    expiry = request.args.get('expiry', 'all')  # all, expiring, expired, none
+    stock = request.args.get('stock', 'all')  # all, in_stock, low, out
+    sort = request.args.get('sort', 'created')
+    direction = request.args.get('dir', 'desc')
+    page = request.args.get('page', 1, type=int)
+    
+    query = Product.query.filter(Product.vendor_id == current_user.id)
+    
+    if status == 'active':
+        query = query.filter(Product.is_active == True)
+    elif status == 'inactive':
+        query = query.filter(Product.is_active == False)
+    
+    if category:
+        query = query.filter(Product.category == category)
+    
+    if search:
+        query = query.filter(like_contains(Product.product_name, search))
+    
+    today = datetime.utcnow().date()
+    if expiry == 'expiring':
+        query = query.filter(Product.expiry_date >= today, Product.expiry_date <= today + timedelta(days=3))
+    elif expiry == 'expired':
+        query = query.filter(Product.expiry_date < today)
+    elif expiry == 'none':
+        query = query.filter(Product.expiry_date.is_(None))
+    
+    low_stock = db.func.coalesce(Product.low_stock_threshold, current_app.config['LOW_STOCK_THRESHOLD'])
+    if stock == 'out':
+        query = query.filter(Product.quantity <= 0)
+    elif stock == 'low':
+        query = query.filter(Product.quantity > 0, Product.quantity <= low_stock)
+    elif stock == 'in_stock':
+        query = query.filter(Product.quantity > low_stock)
+    
+    if sort not in PRODUCT_SORT_COLUMNS:
+        sort = 'created'
+    if direction not in ('asc', 'desc'):
+        direction = 'desc'
+    sort_column = PRODUCT_SORT_COLUMNS[sort]
+    query = query.order_by(sort_column.asc() if direction == 'asc' else sort_column.desc(), Product.id.desc())
+    
+    products = query.paginate(page=page, per_page=current_app.config['ITEMS_PER_PAGE'], error_out=False)
+    
+    categories = db.session.query(Product.category).filter(
+        Product.vendor_id == current_user.id
+    ).distinct().order_by(Product.category).all()
+    
+    return render_template('vendor/products.html',
+                         products=products,
+                         categories=[c[0] for c in categories],
+                         filters={
+                             'search': search,
+                             'category': category,
+                             'status': status,
+                             'expiry': expiry,
+                             'stock': stock,
+                             'sort': sort,
+                             'dir': direction
+                         })
 
 @vendor_bp.route('/products/add', methods=['GET', 'POST'])
 @login_required
@@ -62,6 +166,9 @@ def add_product():
             minimum_quantity = int(request.form.get('minimum_quantity', 0)) if moq_enabled else None
             minimum_weight = float(request.form.get('minimum_weight', 0)) if moq_enabled else None
             
+            low_stock_threshold = request.form.get('low_stock_threshold')
+            low_stock_threshold = int(low_stock_threshold) if low_stock_threshold else None
+            
             # Handle image upload
             image = request.files.get('image')
             image_filename = save_product_image(image, current_user.id) if image else None
@@ -84,6 +191,8 @@ def add_product():
                 moq_type=moq_type,
                 minimum_quantity=minimum_quantity,
                 minimum_weight=minimum_weight,
+                low_stock_threshold=low_stock_threshold,
+                low_stock_alerted=False,
                 is_active=True
             )
             
@@ -137,6 +246,11 @@ def edit_product(product_id):
             product.minimum_quantity = int(request.form.get('minimum_quantity', 0)) if product.moq_enabled else None
             product.minimum_weight = float(request.form.get('minimum_weight', 0)) if product.moq_enabled else None
             
+            # Low-stock alert threshold (re-arms the alert once restocked)
+            low_stock_threshold = request.form.get('low_stock_threshold')
+            product.low_stock_threshold = int(low_stock_threshold) if low_stock_threshold else None
+            product.refresh_low_stock_alert(current_app.config['LOW_STOCK_THRESHOLD'])
+            
             # Handle image update
             image = request.files.get('image')
             if image:
@@ -197,9 +311,85 @@ def delete_product(product_id):
 @vendor_required
 def orders():
     """View vendor's orders"""
-    # Get orders containing vendor's products
-    orders = db.session.query(Order).join(OrderItem).join(Product).filter(
+    status = request.args.get('status', 'all')
+    date_from = request.args.get('date_from', '')
+    date_to = request.args.get('date_to', '')
+    page = request.args.get('page', 1, type=int)
+    
+    # Orders containing at least one of the vendor's products
+    vendor_order_ids = db.session.query(OrderItem.order_id).join(Product).filter(
         Product.vendor_id == current_user.id
-    ).distinct().all()
+    )
+    
+    query = Order.query.filter(Order.id.in_(vendor_order_ids))
+    
+    if status != 'all':
+        query = query.filter(Order.status == status)
+    
+    try:
+        if date_from:
+            query = query.filter(Order.created_at >= datetime.strptime(date_from, '%Y-%m-%d'))
+        if date_to:
+            query = query.filter(Order.created_at < datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1))
+    except ValueError:
+        flash('Invalid date filter, expected YYYY-MM-DD', 'warning')
+    
+    orders = query.options(joinedload(Order.retailer))\
+                  .order_by(Order.created_at.desc(), Order.id.desc())\
+                  .paginate(page=page, per_page=current_app.config['ITEMS_PER_PAGE'], error_out=False)
+    
+    # Vendor's own line items for this page, loaded in a single query
+    vendor_items = {order.id: [] for order in orders.items}
+    if vendor_items:
+        items = OrderItem.query.join(OrderItem.product).filter(
+            OrderItem.order_id.in_(list(vendor_items)),
+            Product.vendor_id == current_user.id
+        ).options(contains_eager(OrderItem.product)).order_by(OrderItem.id).all()
+        
+        for item in items:
+            vendor_items[item.order_id].append(item)
+    
+    return render_template('vendor/orders.html',
+                         orders=orders,
+                         vendor_items=vendor_items,
+                         status_filter=status,
+                         date_from=date_from,
+                         date_to=date_to)
+
+@vendor_bp.route('/orders/export')
+@login_required
+@vendor_required
+@read_replica
+def export_sales():
+    """Stream the vendor's full sales history as CSV or NDJSON"""
+    export_format = request.args.get('format', 'csv')
+    date_from = request.args.get('date_from', '')
+    date_to = request.args.get('date_to', '')
+    
+    columns = ['order_id', 'order_date', 'order_status', 'payment_status', 'retailer_id',
+               'product_id', 'product_name', 'category', 'quantity', 'weight',
+               'price_at_purchase', 'subtotal']
+    
+    query = db.session.query(
+        Order.order_id, Order.created_at, Order.status, Order.payment_status, Order.retailer_id,
+        Product.id, Product.product_name, Product.category, OrderItem.quantity, OrderItem.weight,
+        OrderItem.price_at_purchase, OrderItem.subtotal
+    ).select_from(OrderItem).join(Product, OrderItem.product_id == Product.id)\
+     .join(Order, OrderItem.order_id == Order.id)\
+     .filter(Product.vendor_id == current_user.id)
+    
+    try:
+        if date_from:
+            query = query.filter(Order.created_at >= datetime.strptime(date_from, '%Y-%m-%d'))
+        if date_to:
+            query = query.filter(Order.created_at < datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1))
+    except ValueError:
+        flash('Invalid date filter, expected YYYY-MM-DD', 'warning')
+        return redirect(url_for('vendor.orders'))
+    
+    # yield_per streams rows from a server-side cursor instead of buffering them all
+    rows = query.order_by(Order.created_at, OrderItem.id)\
+                .yield_per(current_app.config['EXPORT_BATCH_SIZE'])
     
-    return render_template('vendor/orders.html', orders=orders)
+    filename = f"sales_{current_user.id}_{datetime.utcnow().strftime('%Y%m%d')}"
+    return export_response(rows, columns, export_format, filename)
@@ -0,0 +1,249 @@
+"""
+Schema Management - Additive migrations and index-usage audit
+db.create_all() only creates missing tables; upgrade_schema() also adds
+columns and indexes declared on the models to tables that already exist
+"""
+
+from app import db
+from datetime import datetime, timedelta
+import sqlalchemy as sa
+
+
+def _import_models():
+    """Make sure every model module is registered on the metadata"""
+    from app import models, models_logistics, models_analytics, models_archive  # noqa: F401
+
+
+def upgrade_schema():
+    """
+    Bring an existing database up to the models, additively
+
+    Creates missing tables, adds missing columns and creates any declared
+    index that doesn't exist yet, on every bind. A missing NOT NULL column
+    is only added when it has a scalar or server default to fill existing
+    rows; otherwise it is skipped and reported as needing a manual
+    migration. Never drops or alters existing columns. Returns
+    (changes made, columns needing a manual migration).
+    """
+    _import_models()
+    changes, skipped = [], []
+
+    db.create_all()
+    for bind_key, metadata in db.metadatas.items():
+        bind_changes, bind_skipped = _upgrade_bind(db.engines[bind_key], metadata)
+        changes.extend(bind_changes)
+        skipped.extend(bind_skipped)
+
+    return changes, skipped
+
+
+def _upgrade_bind(engine, metadata):
+    """Add missing columns (see upgrade_schema) and indexes for one bind's tables"""
+    changes, skipped = [], []
+    inspector = sa.inspect(engine)
+
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            existing_columns = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+
+                if column.server_default is not None:
+                    default = conn.dialect.ddl_compiler(conn.dialect, None).get_column_default_string(column)
+                elif column.default is not None and column.default.is_scalar:
+                    default = _literal(column.default.arg, conn.dialect)
+                else:
+                    default = None  # none, or computed in Python (e.g. datetime.utcnow): existing rows get NULL
+
+                if not column.nullable and default is None:
+                    # Existing rows need a value the database can't supply; adding it nullable would drop NOT NULL
+                    skipped.append(f'{table.name}.{column.name}')
+                    continue
+
+                column_type = column.type.compile(dialect=conn.dialect)
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                if default is not None:
+                    ddl += f' DEFAULT {default}'
+                if not column.nullable:
+                    ddl += ' NOT NULL'
+                conn.exec_driver_sql(ddl)
+                changes.append(f'column {table.name}.{column.name}')
+
+            existing_indexes = {i['name'] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(conn, checkfirst=True)
+                    changes.append(f'index {index.name}')
+
+    return changes, skipped
+
+
+def _literal(value, dialect):
+    """Render a scalar column default as SQL"""
+    if isinstance(value, bool):
+        if dialect.name == 'sqlite':
+            return '1' if value else '0'
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+# ============================================================================
+# HOT QUERY REGISTRY & INDEX AUDIT
+# ============================================================================
+
+HOT_QUERIES = {}
+
+
+def hot_query(name):
+    """Register a function returning a representative select() for the audit"""
+    def decorator(f):
+        HOT_QUERIES[name] = f
+        return f
+    return decorator
+
+
+@hot_query('admin orders by status')
+def _orders_by_status():
+    from app.models import Order
+    return sa.select(Order).where(Order.status == 'pending').order_by(Order.created_at.desc()).limit(20)
+
+
+@hot_query('admin orders by payment status')
+def _orders_by_payment_status():
+    from app.models import Order
+    return sa.select(Order).where(
+        Order.payment_status == 'paid',
+        Order.created_at >= datetime.utcnow() - timedelta(days=30)
+    ).order_by(Order.created_at.desc()).limit(20)
+
+
+@hot_query('retailer order history')
+def _retailer_orders():
+    from app.models import Order
+    return sa.select(Order).where(Order.retailer_id == 1).order_by(Order.created_at.desc())
+
+
+@hot_query('vendor order ids')
+def _vendor_order_ids():
+    from app.models import OrderItem, Product
+    return sa.select(OrderItem.order_id).join(Product, OrderItem.product_id == Product.id).where(Product.vendor_id == 1)
+
+
+@hot_query('order items by order')
+def _order_items():
+    from app.models import OrderItem
+    return sa.select(OrderItem).where(OrderItem.order_id.in_([1, 2, 3]))
+
+
+@hot_query('browse active products by category')
+def _browse_products():
+    from app.models import Product
+    return sa.select(Product).where(Product.is_active == True, Product.category == 'Vegetables').limit(20)
+
+
+@hot_query('vendor product catalog')
+def _vendor_products():
+    from app.models import Product
+    return sa.select(Product).where(Product.vendor_id == 1, Product.is_active == True)\
+        .order_by(Product.created_at.desc()).limit(20)
+
+
+@hot_query('admin users by type')
+def _users_by_type():
+    from app.models import User
+    return sa.select(User).where(User.user_type == 'vendor', User.is_active == True)
+
+
+@hot_query('unread notifications')
+def _unread_notifications():
+    from app.models_logistics import DeliveryNotification
+    return sa.select(DeliveryNotification).where(
+        DeliveryNotification.recipient_type == 'driver',
+        DeliveryNotification.recipient_id == 1,
+        DeliveryNotification.is_read == False
+    )
+
+
+@hot_query('driver active assignments')
+def _driver_assignments():
+    from app.models_logistics import DriverAssignmentEnhanced
+    return sa.select(DriverAssignmentEnhanced).where(
+        DriverAssignmentEnhanced.driver_id == 1,
+        DriverAssignmentEnhanced.assignment_status.in_(['accepted', 'picked_up', 'in_transit'])
+    )
+
+
+@hot_query('dispatch ring search')
+def _drivers_in_cells():
+    from app.models_logistics import DriverEnhanced
+    return sa.select(DriverEnhanced).where(
+        DriverEnhanced.geo_cell.in_(['653:4009', '653:4010']),
+        DriverEnhanced.is_active == True,
+        DriverEnhanced.status.in_(['available', 'on_break'])
+    )
+
+
+@hot_query('dispatch pending orders')
+def _pending_orders():
+    from app.models import Order
+    from app.models_logistics import DriverAssignmentEnhanced
+    return sa.select(Order.id).where(
+        Order.payment_status == 'paid',
+        ~sa.exists().where(DriverAssignmentEnhanced.order_id == Order.id)
+    ).order_by(Order.created_at).limit(200)
+
+
+@hot_query('expired dispatch offers')
+def _expired_offers():
+    from app.models_logistics import DriverAssignmentEnhanced
+    return sa.select(DriverAssignmentEnhanced.id).where(
+        DriverAssignmentEnhanced.assignment_status == 'assigned',
+        DriverAssignmentEnhanced.offer_expires_at < datetime.utcnow()
+    )
+
+
+def explain(stmt):
+    """Return the database's plan for stmt as a list of text lines"""
+    engine = db.engine
+    compiled = stmt.compile(dialect=engine.dialect, compile_kwargs={'render_postcompile': True})
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+
+    if engine.dialect.name == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    else:
+        prefix = 'EXPLAIN '
+
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(prefix + str(compiled), params).fetchall()
+
+    # SQLite: (id, parent, notused, detail); PostgreSQL: (QUERY PLAN,)
+    return [row[-1] for row in rows]
+
+
+def is_full_scan(plan_line):
+    """True for a plan step that reads a whole table without an index"""
+    line = plan_line.strip()
+    if line.startswith('SCAN ') and 'USING' not in line:
+        return 'CONSTANT ROW' not in line
+    return 'Seq Scan on' in line
+
+
+def audit_hot_queries():
+    """Explain every registered hot query; returns [(name, plan, full_scans)]"""
+    _import_models()
+    results = []
+    for name, build in HOT_QUERIES.items():
+        try:
+            plan = explain(build())
+        except sa.exc.DBAPIError as e:
+            # Usually a schema behind the models; `flask upgrade-db` fixes it
+            problem = [f'ERROR: {e.orig}']
+            results.append((name, problem, problem))
+            continue
+        results.append((name, plan, [line for line in plan if is_full_scan(line)]))
+    return results
@@ -0,0 +1,133 @@
+"""
+Trip Planner - Multi-drop routing under vehicle capacity
+Groups orders leaving the same pickup point into trips with the Clarke-Wright
+savings heuristic, improves each trip's stop order with 2-opt and works out
+per-stop ETAs
+"""
+
+from app.geo import haversine_km_array
+import numpy as np
+
+
+class TripPlanner:
+    """Capacity-constrained vehicle routing from a single pickup point"""
+
+    @staticmethod
+    def distance_matrix(points):
+        """Pairwise great-circle distances (km) between [(lat, lng)] points"""
+        coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return haversine_km_array(coords[:, None, 0], coords[:, None, 1], coords[None, :, 0], coords[None, :, 1])
+
+    @staticmethod
+    def savings_routes(dist, demands, capacity, max_stops):
+        """
+        Group stops into routes with the Clarke-Wright savings heuristic
+
+        dist is the distance matrix with the pickup point at index 0 and
+        stop i at index i + 1. Starts with one route per stop and keeps
+        joining the two routes whose merge saves the most distance
+        (d(0,i) + d(0,j) - d(i,j)) while the load stays within capacity and
+        the route within max_stops. Stops heavier than capacity are left out.
+        Returns routes as lists of stop indices.
+        """
+        demands = np.asarray(demands, dtype=np.float64)
+        servable = [i for i in range(len(demands)) if demands[i] <= capacity]
+        routes = {i: [i] for i in servable}
+        loads = {i: demands[i] for i in servable}
+        route_of = {i: i for i in servable}
+
+        if len(servable) > 1:
+            nodes = np.array(servable)
+            first, second = np.triu_indices(len(nodes), 1)
+            i_nodes, j_nodes = nodes[first], nodes[second]
+            savings = dist[0, i_nodes + 1] + dist[0, j_nodes + 1] - dist[i_nodes + 1, j_nodes + 1]
+            order = np.argsort(-savings, kind='stable')
+
+            for pair in order[savings[order] > 0]:
+                i, j = int(i_nodes[pair]), int(j_nodes[pair])
+                ri, rj = route_of[i], route_of[j]
+                if ri == rj or loads[ri] + loads[rj] > capacity or len(routes[ri]) + len(routes[rj]) > max_stops:
+                    continue
+
+                # Only route ends can be joined: make i the tail of one route and j the head of the other
+                a, b = routes[ri], routes[rj]
+                if a[-1] != i:
+                    if a[0] != i:
+                        continue
+                    a.reverse()
+                if b[0] != j:
+                    if b[-1] != j:
+                        continue
+                    b.reverse()
+
+                routes[ri] = a + b
+                loads[ri] += loads.pop(rj)
+                del routes[rj]
+                for stop in b:
+                    route_of[stop] = ri
+
+        return list(routes.values())
+
+    @staticmethod
+    def two_opt(route, dist):
+        """Reorder a route's stops with 2-opt until no segment reversal shortens the round trip"""
+        tour = [0] + [stop + 1 for stop in route] + [0]
+        improved = True
+        while improved:
+            improved = False
+            for i in range(1, len(tour) - 2):
+                for k in range(i + 1, len(tour) - 1):
+                    a, b, c, e = tour[i - 1], tour[i], tour[k], tour[k + 1]
+                    if dist[a, c] + dist[b, e] - dist[a, b] - dist[c, e] < -1e-9:
+                        tour[i:k + 1] = tour[i:k + 1][::-1]
+                        improved = True
+        return [node - 1 for node in tour[1:-1]]
+
+    @staticmethod
+    def route_km(route, dist):
+        """Round-trip length of a route (pickup -> stops -> pickup) in km"""
+        tour = [0] + [stop + 1 for stop in route] + [0]
+        return float(sum(dist[a, b] for a, b in zip(tour, tour[1:])))
+
+    @staticmethod
+    def stop_etas(route, dist, speed_kmh, stop_minutes, direct_minutes=None):
+        """
+        Minutes from leaving the pickup point until each stop's drop is done
+
+        Straight-line travel at speed_kmh is optimistic on real roads.
+        direct_minutes, one per stop of the route, is how long a delivery
+        straight from the pickup to that stop is expected to take; when
+        given, each stop's ETA is at least that plus the time the earlier
+        stops add to the route (and never earlier than the previous stop's
+        ETA plus the leg between them).
+        """
+        def leg(a, b):
+            return dist[a, b] / speed_kmh * 60 + stop_minutes
+
+        etas = []
+        minutes, planned, here = 0.0, 0.0, 0
+        for position, stop in enumerate(route):
+            planned += leg(here, stop + 1)
+            minutes += leg(here, stop + 1)
+            if direct_minutes is not None:
+                detour = planned - leg(0, stop + 1)
+                minutes = max(minutes, direct_minutes[position] + detour)
+            etas.append(minutes)
+            here = stop + 1
+        return etas
+
+    @staticmethod
+    def plan(pickup_point, drop_points, demands, capacity, max_stops):
+        """
+        Trips for drops leaving pickup_point: [(stops, load_kg, km)]
+
+        Stops are indices into drop_points, in delivery order.
+        """
+        if not len(drop_points):
+            return [], None
+        dist = TripPlanner.distance_matrix([pickup_point] + list(drop_points))
+        trips = []
+        for route in TripPlanner.savings_routes(dist, demands, capacity, max_stops):
+            route = TripPlanner.two_opt(route, dist)
+            trips.append((route, float(sum(demands[stop] for stop in route)), TripPlanner.route_km(route, dist)))
+        return trips, dist
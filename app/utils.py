@@ -1,8 +1,13 @@
 import os
 from werkzeug.utils import secure_filename
-from datetime import datetime
-from flask import current_app
+from datetime import datetime, date
+from flask import current_app, Response, stream_with_context
+from sqlalchemy import tuple_
 import uuid
+import base64
+import csv
+import io
+import json
 
 def allowed_file(filename):
     """Check if file has allowed extension"""
@@ -80,3 +85,124 @@ def validate_card_number(card_number):
         return last_digit % 2 == 0  # Even = success
     except:
         return False
+
+def stream_export(rows, columns, export_format='csv', chunk_size=500):
+    """
+    Yield CSV or NDJSON chunks for an iterable of row tuples
+
+    Rows are consumed lazily and written out every `chunk_size` rows, so
+    memory stays flat however large the export is.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if export_format == 'csv' else None
+    
+    def serialize(value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        return value
+    
+    if writer:
+        writer.writerow(columns)
+    
+    pending = 0
+    for row in rows:
+        values = [serialize(value) for value in row]
+        if writer:
+            writer.writerow(values)
+        else:
+            buffer.write(json.dumps(dict(zip(columns, values))) + '\n')
+        
+        pending += 1
+        if pending >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+    
+    if buffer.getvalue():
+        yield buffer.getvalue()
+
+def export_response(rows, columns, export_format, filename):
+    """Build a streaming download response for stream_export()"""
+    if export_format not in ('csv', 'ndjson'):
+        export_format = 'csv'
+    
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(stream_export(rows, columns, export_format)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}.{export_format}'}
+    )
+
+class KeysetPage:
+    """One page of keyset-paginated results plus cursors for its neighbours"""
+    
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+    
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+    
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+def like_contains(column, text):
+    """`column` contains `text` literally: %, _ and \\ in user input aren't wildcards"""
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return column.like(f'%{escaped}%', escape='\\')
+
+def encode_cursor(values):
+    """Opaque URL-safe cursor for a row's sort key"""
+    raw = json.dumps([v.isoformat() if isinstance(v, (datetime, date)) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, columns):
+    """Inverse of encode_cursor(), restoring datetimes for DateTime columns"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if len(values) != len(columns):
+            return None
+        return [
+            datetime.fromisoformat(value) if value is not None and column.type.python_type is datetime else value
+            for column, value in zip(columns, values)
+        ]
+    except (ValueError, TypeError, NotImplementedError):
+        return None
+
+def keyset_paginate(query, columns, after=None, before=None, per_page=20):
+    """
+    Newest-first keyset pagination over `columns` (the last must be unique)
+    
+    Seeks with a row-value comparison instead of OFFSET, so deep pages cost
+    the same as the first one. `after` pages forwards, `before` backwards.
+    """
+    key = tuple_(*columns)
+    cursor_values = decode_cursor(before or after, columns) if (before or after) else None
+    backwards = bool(before) and cursor_values is not None
+    
+    if cursor_values is not None:
+        query = query.filter(key > tuple_(*cursor_values) if backwards else key < tuple_(*cursor_values))
+    
+    ordering = [column.asc() if backwards else column.desc() for column in columns]
+    rows = query.order_by(*ordering).limit(per_page + 1).all()
+    
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+    
+    def cursor_for(row):
+        return encode_cursor([getattr(row, column.key) for column in columns])
+    
+    next_cursor = prev_cursor = None
+    if rows:
+        if more or backwards:
+            next_cursor = cursor_for(rows[-1])
+        if (more and backwards) or (cursor_values is not None and not backwards):
+            prev_cursor = cursor_for(rows[0])
+    
+    return KeysetPage(rows, next_cursor, prev_cursor)
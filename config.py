@@ -7,6 +7,18 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///marketplace.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Cold storage for closed orders (see `flask archive-orders`)
+    ARCHIVE_DATABASE_URL = os.environ.get('ARCHIVE_DATABASE_URL') or 'sqlite:///archive.db'
+    SQLALCHEMY_BINDS = {'archive': ARCHIVE_DATABASE_URL}
+    
+    # Read replica for reporting views (@read_replica); unset = everything on the primary.
+    # Locally: point it at a copy of the SQLite file (`flask refresh-replica`) or a second Postgres
+    READ_REPLICA_URL = os.environ.get('READ_REPLICA_URL')
+    if READ_REPLICA_URL:
+        SQLALCHEMY_BINDS['reader'] = READ_REPLICA_URL
+    REPLICA_MAX_LAG_SECONDS = 30  # staler than this and reads fall back to the primary
+    REPLICA_LAG_CHECK_SECONDS = 5
+    
     # Session config
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
     SESSION_COOKIE_HTTPONLY = True
@@ -20,9 +32,39 @@ class Config:
     # API Keys
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
     
+    # Shared local store (cache/counters visible to all workers on this host)
+    LOCAL_STORE_PATH = os.environ.get('LOCAL_STORE_PATH')  # default: instance/local_store.db
+    ADMIN_DASHBOARD_CACHE_SECONDS = 60
+    
+    # Order archival: delivered/cancelled orders older than this move to the archive bind
+    # (keep it longer than COHORT_MONTHS so first orders stay visible to cohort analytics)
+    ARCHIVE_AFTER_DAYS = 400
+    ARCHIVE_BATCH_SIZE = 500
+    ARCHIVE_ORDER_STATUSES = ('delivered', 'cancelled')
+    
+    # Retailer cohort analytics (nightly job, cached for the admin page)
+    COHORT_MONTHS = 12
+    COHORT_CACHE_SECONDS = 26 * 60 * 60
+    
+    # Live ops counters (admin widget / JSON endpoint)
+    OPS_METRICS_WINDOW_MINUTES = 60
+    OPS_DRIVER_COUNT_CACHE_SECONDS = 15
+    
     # Pagination
     ITEMS_PER_PAGE = 20
     
+    # Streaming exports (rows fetched per server-side cursor batch)
+    EXPORT_BATCH_SIZE = 1000
+    
+    # Inventory
+    LOW_STOCK_THRESHOLD = 10
+    
+    # Demand forecasting (nightly job)
+    FORECAST_HISTORY_DAYS = 28
+    FORECAST_SMOOTHING_ALPHA = 0.3
+    FORECAST_COVER_DAYS = 3
+    FORECAST_SAFETY_Z = 1.65  # ~95% service level
+    
     # MOQ defaults
     DEFAULT_MOQ_RATE_PER_KG = 10.0
     
@@ -33,6 +75,37 @@ class Config:
     # Driver config
     DRIVER_RATE_PER_KG = 10.0
     
+    # Dispatch: drivers are bucketed in a lat/lng grid and searched ring by ring around the pickup
+    DISPATCH_GRID_CELL_DEG = 0.02  # ~2.2 km
+    DISPATCH_SEARCH_RINGS = 4  # give up beyond ~9 km
+    DISPATCH_MIN_CANDIDATES = 5  # stop widening once this many drivers are in range
+    DISPATCH_BATCH_WINDOW_SECONDS = 30  # batch mode: collect paid orders this long between matchings
+    DISPATCH_BATCH_MAX_ORDERS = 200
+    DISPATCH_TRIP_MAX_STOPS = 6  # multi-drop trips
+    DISPATCH_AVG_SPEED_KMH = 20  # city traffic, for per-stop ETAs
+    DISPATCH_STOP_MINUTES = 5  # hand-over time at each drop
+    DRIVER_REGISTRY_RECONCILE_SECONDS = 60  # flask reconcile-drivers --watch
+    DRIVER_REGISTRY_MAX_AGE_SECONDS = 600  # dispatch falls back to DB queries if not reconciled this recently
+    DISPATCH_ACCEPT_WINDOW_SECONDS = 180  # unaccepted offers are re-offered to the next best driver
+    DISPATCH_MAX_ATTEMPTS = 3  # offers per order before it is escalated to admins
+    DISPATCH_SWEEP_SECONDS = 30  # flask sweep-offers --watch
+    
+    # Learned delivery ETAs (nightly job over pickup/delivered tracking events)
+    ETA_HISTORY_DAYS = 56  # eight samples of every hour of the week
+    ETA_MIN_SAMPLES = 5  # thinner cells fall back to the whole area pair, then the area's fixed time
+    ETA_QUANTILE = 0.8  # promise the time 80% of past trips made
+    ETA_MAX_MINUTES = 480  # longer pickup-to-delivered gaps are forgotten taps, not trips
+    ETA_CACHE_SECONDS = 300  # each worker reloads the tables this often
+    
+    # Driven distance from GPS traces (actual_distance_km)
+    GPS_MIN_MOVE_METERS = 30  # shorter moves from the last kept fix are jitter while stopped
+    GPS_MAX_SPEED_KMH = 100  # fixes implying faster travel are bad fixes
+    DISTANCE_BACKFILL_BATCH_SIZE = 500  # trips per transaction in flask backfill-distances
+    
+    # Logistics rates cached in every worker (invalidated on commits that change LogisticsCost)
+    RATE_TABLE_CHECK_SECONDS = 5  # how often a worker checks the shared version
+    RATE_TABLE_MAX_AGE_SECONDS = 300  # reload anyway, for edits made on another host
+    
     # Credit system
     CREDIT_SCORE_MAX = 1000
     CREDIT_TIERS = {
@@ -1,5 +1,6 @@
 import os
 from app import create_app, db
+from app.schema import upgrade_schema
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -10,8 +11,12 @@ app = create_app(os.environ.get('FLASK_ENV', 'development'))
 
 # Create tables
 with app.app_context():
-    db.create_all()
+    changes, skipped = upgrade_schema()
     print("+ Database tables created")
+    if changes:
+        print(f"+ Schema upgraded: {', '.join(changes)}")
+    if skipped:
+        print(f"! Needs a manual migration (NOT NULL without a default): {', '.join(skipped)}")
 
 if __name__ == '__main__':
     print("="*70)
@@ -11,6 +11,20 @@ from app.models_logistics import (
 from datetime import datetime
 import random
 
+# (area, rate per kg, multiplier, minimum charge, delivery minutes, centre lat, centre lng)
+AREAS = [
+    ('North Koyambedu', 10.0, 1.1, 50.0, 45, 13.0780, 80.1950),
+    ('South Koyambedu', 10.0, 1.15, 50.0, 50, 13.0610, 80.1950),
+    ('Central Koyambedu', 10.0, 1.0, 50.0, 30, 13.0694, 80.1948),
+    ('East Koyambedu', 10.0, 1.2, 50.0, 60, 13.0694, 80.2040),
+    ('West Koyambedu', 10.0, 1.05, 50.0, 40, 13.0694, 80.1860),
+    ('Anna Nagar', 10.0, 1.25, 50.0, 55, 13.0850, 80.2101),
+    ('T Nagar', 10.0, 1.3, 50.0, 60, 13.0418, 80.2341),
+    ('Porur', 10.0, 1.15, 50.0, 50, 13.0382, 80.1565),
+    ('Vadapalani', 10.0, 1.2, 50.0, 55, 13.0500, 80.2121),
+    ('Ambattur', 10.0, 1.35, 50.0, 70, 13.1143, 80.1548),
+]
+
 
 def seed_logistics():
     """Seed logistics configuration and enhanced drivers"""
@@ -25,21 +39,10 @@ def seed_logistics():
         # 1. Create Logistics Cost Configuration
         print("[1/3] Creating logistics cost configuration...")
         
-        areas_data = [
-            ('North Koyambedu', 10.0, 1.1, 50.0, 45),
-            ('South Koyambedu', 10.0, 1.15, 50.0, 50),
-            ('Central Koyambedu', 10.0, 1.0, 50.0, 30),
-            ('East Koyambedu', 10.0, 1.2, 50.0, 60),
-            ('West Koyambedu', 10.0, 1.05, 50.0, 40),
-            ('Anna Nagar', 10.0, 1.25, 50.0, 55),
-            ('T Nagar', 10.0, 1.3, 50.0, 60),
-            ('Porur', 10.0, 1.15, 50.0, 50),
-            ('Vadapalani', 10.0, 1.2, 50.0, 55),
-            ('Ambattur', 10.0, 1.35, 50.0, 70),
-        ]
-        
-        for area_name, rate, multiplier, min_charge, time in areas_data:
+        for area_name, rate, multiplier, min_charge, time, lat, lng in AREAS:
             existing = LogisticsCost.query.filter_by(area_name=area_name).first()
+            if existing and existing.center_lat is None:
+                existing.center_lat, existing.center_lng = lat, lng
             if not existing:
                 logistics = LogisticsCost(
                     area_name=area_name,
@@ -47,6 +50,8 @@ def seed_logistics():
                     area_multiplier=multiplier,
                     minimum_charge=min_charge,
                     delivery_time_minutes=time,
+                    center_lat=lat,
+                    center_lng=lng,
                     is_active=True
                 )
                 db.session.add(logistics)
@@ -123,6 +128,10 @@ def seed_logistics():
         db.session.commit()
         print()
         
+        # Place drivers in the dispatch grid (parking area centre until their first GPS fix)
+        from app.driver_service import DriverAssignmentService
+        DriverAssignmentService.index_driver_positions()
+        
         # 3. Summary
         print("[3/3] Summary")
         print("="*70)
@@ -0,0 +1,457 @@
+"""
+Dispatch Simulator - Benchmark driver assignment on a synthetic city
+Builds a scratch database with the logistics areas, a fleet of drivers and
+a day of paid orders, then plays the day through the real dispatch,
+accept/reject, pickup and delivery service methods on a simulated clock:
+while each event runs, the app's datetime.utcnow() (and the models'
+utcnow column defaults) return the simulated time, so acceptance
+timeouts, promised delivery times and tracking timestamps all advance
+with the simulated day rather than the few seconds the run takes
+
+Usage:
+    python simulate_dispatch.py --drivers 2000 --orders 5000 --mode single
+    python simulate_dispatch.py --mode batch
+    python simulate_dispatch.py --mode trips --no-registry
+
+Reports dispatch latency percentiles, queries per assignment, fleet
+utilisation and the on-time rate, so dispatch changes can be compared
+on the same seeded day before and after.
+"""
+
+import argparse
+import heapq
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+VEHICLE_MIX = {'motorcycle': 0.35, 'auto': 0.30, 'van': 0.22, 'truck': 0.10, 'lorry': 0.03}
+ROAD_FACTOR = 1.3  # road distance / great-circle distance
+LOADING_MINUTES = 10  # at the market, per pickup
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Simulate a day of dispatch on a synthetic city')
+    parser.add_argument('--drivers', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=3000)
+    parser.add_argument('--hours', type=float, default=14.0, help='length of the simulated day')
+    parser.add_argument('--mode', choices=('single', 'batch', 'trips'), default='single',
+                        help='one-at-a-time assignment, batch matching or multi-drop trips')
+    parser.add_argument('--reject-rate', type=float, default=0.1, help='share of offers drivers turn down')
+    parser.add_argument('--no-registry', action='store_true', help='read dispatch candidates from the database')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workdir', help='directory for the scratch databases (default: a new temp dir)')
+    return parser.parse_args()
+
+
+def percentile(values, q):
+    """q-th percentile of values (nearest rank), 0 when there are none"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+def travel_minutes(a, b, speed_kmh):
+    """Simulated driving time between two points"""
+    from app.geo import haversine_km
+    return haversine_km(a[0], a[1], b[0], b[1]) * ROAD_FACTOR / speed_kmh * 60
+
+
+def arrival_minutes(count, horizon):
+    """Order arrival times over the day: a morning and an evening peak over a steady base"""
+    arrivals = []
+    while len(arrivals) < count:
+        kind = random.random()
+        if kind < 0.35:
+            t = random.gauss(horizon * 0.2, horizon * 0.08)
+        elif kind < 0.7:
+            t = random.gauss(horizon * 0.75, horizon * 0.1)
+        else:
+            t = random.uniform(0, horizon)
+        if 0 <= t < horizon:
+            arrivals.append(t)
+    return sorted(arrivals)
+
+
+class SimulatedClock:
+    """The simulated time of day, standing in for datetime.utcnow() in the app"""
+
+    def __init__(self, start):
+        self.start = start
+        self.minutes = 0.0
+
+    def utcnow(self):
+        return self.start + timedelta(minutes=self.minutes)
+
+    def install(self, db):
+        """Point every loaded app module's datetime, and utcnow column defaults, at this clock"""
+        clock = self
+
+        class SimulatedDatetime(datetime):
+            @classmethod
+            def utcnow(cls):
+                return clock.utcnow()
+
+        for name, module in list(sys.modules.items()):
+            if (name == 'app' or name.startswith('app.')) and getattr(module, 'datetime', None) is datetime:
+                module.datetime = SimulatedDatetime
+        for metadata in db.metadatas.values():
+            for table in metadata.tables.values():
+                for column in table.columns:
+                    for default in (column.default, column.onupdate):
+                        if default is not None and default.is_callable and default.arg.__name__ == 'utcnow':
+                            default.arg = lambda context: clock.utcnow()
+
+
+class QueryCounter:
+    """Counts statements on the engine while active"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.active = False
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        if self.active:
+            self.count += 1
+
+    def measure(self, func, *args, **kwargs):
+        """Run func counting its queries; returns (result, seconds, queries)"""
+        before = self.count
+        self.active = True
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.active = False
+        return result, elapsed, self.count - before
+
+
+def build_city(args):
+    """Areas, market users and the driver fleet; returns (area centres, product)"""
+    from app import db
+    from app.models import User, Product
+    from app.models_logistics import LogisticsCost, DriverEnhanced
+    from app.driver_service import DriverAssignmentService
+    from app.driver_registry import SYNCED_KEY
+    from app.local_store import local_store
+    from seed_logistics import AREAS
+    from datetime import date
+    from werkzeug.security import generate_password_hash
+
+    for area_name, rate, multiplier, min_charge, minutes, lat, lng in AREAS:
+        db.session.add(LogisticsCost(
+            area_name=area_name, base_rate_per_kg=rate, area_multiplier=multiplier, minimum_charge=min_charge,
+            delivery_time_minutes=minutes, center_lat=lat, center_lng=lng, is_active=True
+        ))
+
+    password_hash = generate_password_hash('simulation')  # hashing is slow; share one across the fleet
+    vendor = User(name='Sim Vendor', email='vendor@sim.local', user_type='vendor', password_hash=password_hash)
+    retailer = User(name='Sim Retailer', email='retailer@sim.local', user_type='retailer', password_hash=password_hash)
+    admin = User(name='Sim Admin', email='admin@sim.local', user_type='admin', password_hash=password_hash)
+    db.session.add_all([vendor, retailer, admin])
+    db.session.flush()
+    product = Product(vendor_id=vendor.id, product_name='Mixed vegetables', category='Vegetables',
+                      price=40.0, quantity=10 ** 9, unit='kg', expiry_date=date.today() + timedelta(days=7))
+    db.session.add(product)
+
+    users = [
+        User(name=f'Sim Driver {i}', email=f'driver{i}@sim.local', user_type='driver', password_hash=password_hash)
+        for i in range(args.drivers)
+    ]
+    db.session.add_all(users)
+    db.session.flush()
+
+    vehicles, weights = zip(*VEHICLE_MIX.items())
+    for i, user in enumerate(users):
+        area_name, *_rest, lat, lng = random.choice(AREAS)
+        vehicle = random.choices(vehicles, weights)[0]
+        db.session.add(DriverEnhanced(
+            user_id=user.id, name=user.name, phone=f'9{i:09d}', vehicle_type=vehicle,
+            vehicle_capacity_kg=DriverAssignmentService.VEHICLE_CAPACITY[vehicle], parking_location=area_name,
+            current_lat=lat + random.gauss(0, 0.01), current_lng=lng + random.gauss(0, 0.01),
+            current_load_kg=0, status='available', rating=round(random.uniform(3.5, 5.0), 1),
+            is_active=True, is_verified=True
+        ))
+    db.session.commit()
+
+    DriverAssignmentService.index_driver_positions()  # grid cells, then a registry reconcile
+    if args.no_registry:
+        local_store.delete(SYNCED_KEY)
+
+    return {area[0]: (area[5], area[6]) for area in AREAS}, product
+
+
+def simulate(args):
+    from app import db
+    from app.models import User, Order, OrderItem
+    from app.models_logistics import DriverEnhanced, DriverAssignmentEnhanced
+    from app.driver_service import DriverAssignmentService
+    from app.dispatch_service import DispatchService
+    from app.reassignment_service import ReassignmentService
+    from flask import current_app
+
+    # The day starts at 06:00 UTC today; learned ETAs are looked up by hour of the week
+    clock = SimulatedClock(datetime.utcnow().replace(hour=6, minute=0, second=0, microsecond=0))
+    clock.install(db)
+
+    config = current_app.config
+    horizon = args.hours * 60
+    centres, product = build_city(args)
+    product_id, price = product.id, product.price
+    retailer_id = db.session.scalar(db.select(User.id).where(User.user_type == 'retailer'))
+    market = centres[DriverAssignmentService.DEFAULT_AREA]
+    areas = list(centres)
+
+    drivers = {
+        driver_id: (user_id, (lat, lng)) for driver_id, user_id, lat, lng in db.session.execute(
+            db.select(DriverEnhanced.id, DriverEnhanced.user_id, DriverEnhanced.current_lat, DriverEnhanced.current_lng)
+        )
+    }
+    position = {driver_id: point for driver_id, (_user_id, point) in drivers.items()}
+
+    counter = QueryCounter(db.engine)
+    timings = {'dispatch': [], 'sweep': [], 'driver': []}  # milliseconds per call
+    queries = {'dispatch': 0, 'sweep': 0, 'driver': 0}
+
+    def measured(kind, func, *call_args):
+        result, seconds, count = counter.measure(func, *call_args)
+        # Batch calls with no waiting orders are no-ops; leave them out of the latency figures
+        if not (isinstance(result, dict) and result.get('pending') == 0):
+            timings[kind].append(seconds * 1000)
+        queries[kind] += count
+        return result
+
+    events, sequence = [], 0
+
+    def schedule(at, kind, payload=None):
+        nonlocal sequence
+        sequence += 1
+        heapq.heappush(events, (at, sequence, kind, payload))
+
+    for n, at in enumerate(arrival_minutes(args.orders, horizon)):
+        weight = round(min(200.0, max(1.0, random.lognormvariate(2.3, 0.8))), 1)
+        schedule(at, 'order', (n, weight, random.choice(areas)))
+    step = (config['DISPATCH_BATCH_WINDOW_SECONDS'] if args.mode != 'single' else config['DISPATCH_SWEEP_SECONDS']) / 60
+    for tick in range(int(horizon / step) + 1):
+        schedule(tick * step, 'tick')
+
+    arrived = {}  # order id -> arrival minute
+    order_area = {}  # order id -> (weight, delivery area)
+    waiting = []  # single mode: orders nobody could take yet
+    offers_seen = set()  # (assignment id, attempt) already handed to the driver model
+    first_offer = {}  # order id -> (minute, promised delivery time)
+    groups = {}  # group key -> {'driver', 'pending', 'accepted', 'started'}
+    busy = {}  # driver id -> [(start, end)]
+    delivered, on_time, rejected, assigned = {}, 0, 0, 0
+
+    def collect_offers(now):
+        """Hand new offers to their drivers: one group per driver per trip (or per order)"""
+        nonlocal assigned
+        offers = db.session.execute(
+            db.select(
+                DriverAssignmentEnhanced.id, DriverAssignmentEnhanced.order_id, DriverAssignmentEnhanced.driver_id,
+                DriverAssignmentEnhanced.offer_attempts, DriverAssignmentEnhanced.trip_id,
+                DriverAssignmentEnhanced.assigned_at, DriverAssignmentEnhanced.estimated_delivery_time
+            ).where(DriverAssignmentEnhanced.assignment_status == 'assigned')
+        ).all()
+        db.session.commit()
+        for offer in offers:
+            if (offer.id, offer.offer_attempts) in offers_seen:
+                continue
+            offers_seen.add((offer.id, offer.offer_attempts))
+            if offer.order_id not in first_offer:
+                assigned += 1
+                first_offer[offer.order_id] = (now, offer.estimated_delivery_time)
+            key = (offer.driver_id, offer.trip_id or f'solo-{offer.id}-{offer.offer_attempts}')
+            group = groups.setdefault(key, {'driver': offer.driver_id, 'pending': 0, 'accepted': [], 'started': now})
+            group['pending'] += 1
+            schedule(now + random.uniform(0.5, 2.0), 'respond', (key, offer.id))
+
+    def assign_waiting():
+        still_waiting = []
+        for order_id in waiting:
+            weight, area = order_area[order_id]
+            ok, _message = measured(
+                'dispatch', DriverAssignmentService.assign_driver_to_order, order_id, weight, area, DriverAssignmentService.DEFAULT_AREA
+            )
+            if not ok:
+                still_waiting.append(order_id)
+        waiting[:] = still_waiting
+
+    started = time.perf_counter()
+    while events:
+        now, _seq, kind, payload = heapq.heappop(events)
+        clock.minutes = now
+
+        if kind == 'order':
+            n, weight, area = payload
+            order = Order(order_id=f'SIM-{n:06d}', retailer_id=retailer_id, total_amount=weight * price,
+                          delivery_address=f'{area} market stall {n}', delivery_city=area,
+                          status='confirmed', payment_status='paid')
+            db.session.add(order)
+            db.session.flush()
+            db.session.add(OrderItem(order_id=order.id, product_id=product_id, quantity=math.ceil(weight), weight=weight,
+                                     price_at_purchase=price, subtotal=weight * price))
+            db.session.commit()
+            arrived[order.id] = now
+            order_area[order.id] = (weight, area)
+            if args.mode == 'single':
+                waiting.append(order.id)
+                assign_waiting()
+                collect_offers(now)
+
+        elif kind == 'tick':
+            if args.mode == 'batch':
+                measured('dispatch', DispatchService.dispatch_batch)
+            elif args.mode == 'trips':
+                measured('dispatch', DispatchService.dispatch_trips)
+            else:
+                assign_waiting()
+            measured('sweep', ReassignmentService.sweep)
+            collect_offers(now)
+
+        elif kind == 'respond':
+            key, assignment_id = payload
+            group = groups[key]
+            user_id = drivers[group['driver']][0]
+            if random.random() < args.reject_rate:
+                measured('driver', DriverAssignmentService.reject_assignment, assignment_id, user_id, 'Simulated rejection')
+                rejected += 1
+                collect_offers(now)
+            else:
+                ok, _message = measured('driver', DriverAssignmentService.accept_assignment, assignment_id, user_id)
+                if ok:
+                    group['accepted'].append(assignment_id)
+            group['pending'] -= 1
+            if not group['pending'] and group['accepted']:
+                speed = config['DISPATCH_AVG_SPEED_KMH'] * random.uniform(0.7, 1.2)
+                schedule(now + travel_minutes(position[group['driver']], market, speed) + LOADING_MINUTES, 'pickup', key)
+
+        elif kind == 'pickup':
+            group = groups[payload]
+            user_id = drivers[group['driver']][0]
+            stops = db.session.execute(
+                db.select(DriverAssignmentEnhanced.id, DriverAssignmentEnhanced.order_id,
+                          DriverAssignmentEnhanced.delivery_location_lat, DriverAssignmentEnhanced.delivery_location_lng)
+                .where(DriverAssignmentEnhanced.id.in_(group['accepted']))
+                .order_by(DriverAssignmentEnhanced.trip_stop, DriverAssignmentEnhanced.id)
+            ).all()
+            db.session.commit()
+            speed = config['DISPATCH_AVG_SPEED_KMH'] * random.uniform(0.7, 1.2)
+            here, at = market, now
+            for stop in stops:
+                measured('driver', DriverAssignmentService.mark_pickup, stop.id, user_id)
+                drop = (stop.delivery_location_lat, stop.delivery_location_lng)
+                if drop[0] is None:
+                    drop = market
+                at += travel_minutes(here, drop, speed) + config['DISPATCH_STOP_MINUTES']
+                schedule(at, 'deliver', (payload, stop.id, stop.order_id, drop))
+                here = drop
+
+        elif kind == 'deliver':
+            key, assignment_id, order_id, drop = payload
+            group = groups[key]
+            user_id = drivers[group['driver']][0]
+            ok, _message = measured('driver', DriverAssignmentService.mark_delivery, assignment_id, user_id)
+            if ok:
+                measured('driver', DriverAssignmentService.update_driver_location, user_id, *drop)
+                position[group['driver']] = drop
+                promised = first_offer[order_id][1]
+                delivered[order_id] = now
+                on_time += promised is not None and clock.utcnow() <= promised
+                busy.setdefault(group['driver'], []).append((group['started'], now))
+
+    wall_seconds = time.perf_counter() - started
+
+    # Busy time: union of each driver's trip intervals, clipped to the day
+    busy_minutes = 0.0
+    for intervals in busy.values():
+        covered_until = 0.0
+        for start, finish in sorted(intervals):
+            start, finish = max(start, covered_until), min(finish, horizon)
+            if finish > start:
+                busy_minutes += finish - start
+                covered_until = finish
+
+    return {
+        'wall_seconds': wall_seconds,
+        'orders': len(arrived),
+        'assigned': assigned,
+        'delivered': len(delivered),
+        'rejected': rejected,
+        'escalated': DriverAssignmentEnhanced.query.filter_by(assignment_status='escalated').count(),
+        'timings': timings,
+        'queries': queries,
+        'waits': [first_offer[order_id][0] - arrived[order_id] for order_id in first_offer],
+        'on_time': on_time,
+        'utilisation': busy_minutes / (len(drivers) * horizon) if drivers else 0.0,
+        'active_drivers': len(busy),
+    }
+
+
+def report(args, results):
+    assigned = results['assigned'] or 1
+
+    print("="*70)
+    print(f"  DISPATCH SIMULATION - {args.mode} mode, {'database' if args.no_registry else 'registry'} candidates")
+    print("="*70)
+    print(f"  Fleet: {args.drivers} driver(s), {results['orders']} order(s) over {args.hours:g}h "
+          f"(simulated in {results['wall_seconds']:.1f}s)")
+    print()
+    print(f"  Assigned:   {results['assigned']}/{results['orders']}  "
+          f"Delivered: {results['delivered']}  Rejected: {results['rejected']}  Escalated: {results['escalated']}")
+    print(f"  Order wait: p50 {percentile(results['waits'], 50):.1f}  p95 {percentile(results['waits'], 95):.1f} "
+          f"simulated min until first offer")
+    print()
+    for kind, label in (('dispatch', 'Dispatch'), ('sweep', 'Sweeps'), ('driver', 'Driver calls')):
+        timings = results['timings'][kind]
+        print(f"  {label} latency ({len(timings)} call(s)): p50 {percentile(timings, 50):.2f}ms  "
+              f"p95 {percentile(timings, 95):.2f}ms  p99 {percentile(timings, 99):.2f}ms  "
+              f"max {max(timings, default=0):.2f}ms")
+    print(f"  Dispatch time per assignment: {sum(results['timings']['dispatch']) / assigned:.2f}ms")
+    print(f"  Queries per assignment: {results['queries']['dispatch'] / assigned:.1f} dispatch, "
+          f"{(results['queries']['dispatch'] + results['queries']['sweep']) / assigned:.1f} with sweeps")
+    print(f"  Queries per driver call: {results['queries']['driver'] / (len(results['timings']['driver']) or 1):.1f}")
+    print()
+    print(f"  Fleet utilisation: {results['utilisation'] * 100:.1f}% of driver-hours "
+          f"({results['active_drivers']} driver(s) worked)")
+    print(f"  On-time rate: {results['on_time'] / (results['delivered'] or 1) * 100:.1f}% of deliveries "
+          f"by their promised delivery time")
+    print("="*70)
+
+
+def main():
+    args = parse_args()
+    random.seed(args.seed)
+
+    # Config reads the environment at import time, so point it at scratch databases first
+    workdir = args.workdir or tempfile.mkdtemp(prefix='dispatch-sim-')
+    os.makedirs(workdir, exist_ok=True)
+    for name in ('dispatch.db', 'archive.db', 'local_store.db'):
+        if os.path.exists(os.path.join(workdir, name)):
+            os.remove(os.path.join(workdir, name))
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'dispatch.db')}"
+    os.environ['ARCHIVE_DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'archive.db')}"
+    os.environ['LOCAL_STORE_PATH'] = os.path.join(workdir, 'local_store.db')
+    os.environ.pop('READ_REPLICA_URL', None)
+
+    from app import create_app
+    from app.schema import upgrade_schema
+
+    app = create_app()
+    with app.app_context():
+        upgrade_schema()
+        print(f"+ Scratch databases in {workdir}")
+        results = simulate(args)
+        report(args, results)
+
+
+if __name__ == '__main__':
+    main()